@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.api'
+
+    def ready(self):
+        # Optional: import and compile the analysis libraries in the background once the server is up
+        if getattr(settings, "ENGINE_WARMUP", False):
+            from backend.server_handler import warmup
+            if warmup.is_server_process():
+                warmup.start()
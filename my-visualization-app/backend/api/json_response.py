@@ -0,0 +1,157 @@
+import datetime
+import decimal
+import json
+import math
+
+import numpy as np
+import pandas as pd
+from django.http import HttpResponse
+
+# orjson is optional, the standard library encoder is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RECORDS_LAYOUT = "records"
+COLUMNAR_LAYOUT = "columnar"
+LAYOUTS = (RECORDS_LAYOUT, COLUMNAR_LAYOUT)
+LAYOUT_PARAM = "layout"
+
+JSON_CONTENT_TYPE = "application/json"
+NULL = "null"
+# Largest precision pandas' encoder accepts
+DOUBLE_PRECISION = 15
+DATE_FORMAT = "iso"
+
+INVALID_LAYOUT = "Invalid layout: {}, expected one of " + ", ".join(LAYOUTS)
+NOT_SERIALIZABLE = "Object of type {} is not JSON serializable"
+
+
+class _PandasValue(TypeError):
+    """
+    Raised by the fast path when it meets a pandas object, which has to be encoded by pandas itself
+    """
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        raise _PandasValue()
+    raise TypeError(NOT_SERIALIZABLE.format(type(value).__name__))
+
+
+def _fast_dumps(value) -> str:
+    """
+    Encode plain data in one call, raises when `value` holds NaN / inf (stdlib only) or pandas objects
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+        except orjson.JSONEncodeError as e:
+            # orjson wraps exceptions raised by `default`
+            raise _PandasValue() from e
+    return json.dumps(value, default=_default, allow_nan=False, separators=(",", ":"))
+
+
+def _frame_json(df: pd.DataFrame, layout: str) -> str:
+    if layout == COLUMNAR_LAYOUT:
+        columns = [str(column) for column in df.columns]
+        data = ",".join(
+            json.dumps(name) + ":" + _values_json(df.iloc[:, position])
+            for position, name in enumerate(columns)
+        )
+        return '{"columns":' + json.dumps(columns, separators=(",", ":")) + ',"data":{' + data + "}}"
+    return df.to_json(orient="records", date_format=DATE_FORMAT, double_precision=DOUBLE_PRECISION,
+                      default_handler=str)
+
+
+def _values_json(values) -> str:
+    if isinstance(values, pd.Index):
+        values = values.to_series()
+    elif isinstance(values, np.ndarray):
+        try:
+            # Keeps full precision, pandas below rounds to DOUBLE_PRECISION decimals
+            return _fast_dumps(values)
+        except (_PandasValue, ValueError):
+            pass
+        if values.ndim == 2:
+            return pd.DataFrame(values).to_json(orient="values", date_format=DATE_FORMAT,
+                                                double_precision=DOUBLE_PRECISION, default_handler=str)
+        if values.ndim != 1:
+            return _encode(values.tolist(), RECORDS_LAYOUT)
+        values = pd.Series(values)
+    return values.to_json(orient="values", date_format=DATE_FORMAT, double_precision=DOUBLE_PRECISION,
+                          default_handler=str)
+
+
+def _scalar_json(value) -> str:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NaT:
+        return NULL
+    if isinstance(value, float) and not math.isfinite(value):
+        return NULL
+    return _fast_dumps(value)
+
+
+def _encode(value, layout: str) -> str:
+    if isinstance(value, pd.DataFrame):
+        return _frame_json(value, layout)
+    if isinstance(value, (pd.Series, pd.Index, np.ndarray)):
+        return _values_json(value)
+    if isinstance(value, (dict, list, tuple)):
+        try:
+            return _fast_dumps(value)
+        except (_PandasValue, ValueError):
+            # Holds DataFrames or non-finite floats, encode it piece by piece
+            pass
+        if isinstance(value, dict):
+            return "{" + ",".join(json.dumps(str(key)) + ":" + _encode(item, layout) for key, item in value.items()) + "}"
+        return "[" + ",".join(_encode(item, layout) for item in value) + "]"
+    return _scalar_json(value)
+
+
+def dumps(data, layout: str = RECORDS_LAYOUT) -> bytes:
+    """
+    Encode a response payload that may contain DataFrames, Series, NumPy arrays and NumPy scalars.
+
+    DataFrames are encoded by pandas directly (no dict per row); NaN and inf become null.
+
+    :param data: payload, usually a dict
+    :param layout: str, "records" ([{col: value}, ...]) or "columnar" ({"columns": [...], "data": {col: [...]}})
+    :return: bytes, UTF-8 JSON
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(INVALID_LAYOUT.format(layout))
+    return _encode(data, layout).encode("utf-8")
+
+
+def get_layout(request, body: dict = None) -> str:
+    """
+    Layout asked for by the client, as `layout` in the query string or the JSON body (default: records)
+    """
+    layout = request.GET.get(LAYOUT_PARAM) or (body or {}).get(LAYOUT_PARAM) or RECORDS_LAYOUT
+    if layout not in LAYOUTS:
+        raise ValueError(INVALID_LAYOUT.format(layout))
+    return layout
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse counterpart for payloads holding DataFrames and NumPy data, see `dumps`
+    """
+
+    def __init__(self, data, layout: str = RECORDS_LAYOUT, **kwargs):
+        kwargs.setdefault("content_type", JSON_CONTENT_TYPE)
+        super().__init__(content=dumps(data, layout), **kwargs)
@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.server_handler import warmup
+
+API_MODULE = "backend.api.urls"
+MARKER = "--- {} ---".format(API_MODULE)
+IMPORT_TIME_PREFIX = "import time:"
+# Runs in a fresh interpreter: set Django up, then time the import of the API alone
+MEASURE_SCRIPT = """
+import json, sys, time
+import django
+django.setup()
+print({marker!r}, file=sys.stderr, flush=True)
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+OVER_BUDGET_MESSAGE = "Importing {} took {:.3f} s, over the budget of {:.3f} s."
+HEAVY_IMPORT_MESSAGE = "Importing {} loads {}, they should only be imported on first use."
+
+
+class Command(BaseCommand):
+    help = "Measure how long importing the API takes in a fresh process and fail when it is over budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget", type=float, default=settings.API_IMPORT_BUDGET_SECONDS,
+            help="Seconds the import may take",
+        )
+        parser.add_argument("--runs", type=int, default=3, help="Fresh processes to measure, the fastest counts")
+        parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+
+    def handle(self, *args, **options):
+        best = None
+        for _ in range(max(1, options["runs"])):
+            result = self.measure()
+            if best is None or result["elapsed"] < best["elapsed"]:
+                best = result
+
+        self.stdout.write(f"Importing {API_MODULE} took {best['elapsed']:.3f} s (budget {options['budget']:.3f} s).")
+        self.stdout.write("Slowest imports (cumulative microseconds):")
+        for micros, name in best["slowest"][:options["top"]]:
+            self.stdout.write(f"  {micros:>10}  {name}")
+
+        heavy = [name for name in warmup.HEAVY_MODULES if name in best["modules"]]
+        if heavy:
+            raise CommandError(HEAVY_IMPORT_MESSAGE.format(API_MODULE, ", ".join(heavy)))
+        if best["elapsed"] > options["budget"]:
+            raise CommandError(OVER_BUDGET_MESSAGE.format(API_MODULE, best["elapsed"], options["budget"]))
+
+    @staticmethod
+    def measure() -> dict:
+        """
+        Import the API in a new interpreter with -X importtime
+
+        :return: dict, elapsed seconds, the loaded module names and the modules imported by the API
+            as (cumulative microseconds, name), slowest first
+        """
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+        script = MEASURE_SCRIPT.format(marker=MARKER, module=API_MODULE)
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", script],
+                                   capture_output=True, text=True, env=env)
+        if completed.returncode != 0:
+            raise CommandError(completed.stderr.strip())
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        slowest = []
+        lines = completed.stderr.splitlines()
+        for line in lines[lines.index(MARKER) + 1:]:
+            if not line.startswith(IMPORT_TIME_PREFIX):
+                continue
+            _, cumulative, name = line[len(IMPORT_TIME_PREFIX):].split("|")
+            if cumulative.strip().isdigit():  # skips the header line
+                slowest.append((int(cumulative), name.rstrip()))
+        result["slowest"] = sorted(slowest, reverse=True)
+        return result
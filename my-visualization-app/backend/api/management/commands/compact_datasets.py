@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from backend.api.models import Dataset, UploadedFile
+from backend.server_handler import column_store, model_store
+
+
+class Command(BaseCommand):
+    help = "Drop deleted features from the column store, remove column files no dataset references and unused models"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age", type=float, default=column_store.GARBAGE_MIN_AGE_SECONDS,
+            help="Only delete unreferenced files older than this many seconds",
+        )
+
+    def handle(self, *args, **options):
+        referenced_keys = set()
+        for dataset in Dataset.objects.all():
+            dataset.compact_storage()
+            referenced_keys |= column_store.manifest_keys(dataset.column_manifest)
+        # Parsed uploads keep their columns so that identical uploads can reuse them
+        for uploaded_file in UploadedFile.objects.all():
+            referenced_keys |= column_store.manifest_keys(uploaded_file.column_manifest)
+
+        removed = column_store.collect_garbage(referenced_keys, min_age_seconds=options["min_age"])
+        self.stdout.write(f"Removed {removed} unreferenced column file(s).")
+        removed = model_store.collect_garbage()
+        self.stdout.write(f"Removed {removed} unused model(s).")
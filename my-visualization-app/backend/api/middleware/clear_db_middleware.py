@@ -1,16 +1,21 @@
+from django.urls import Resolver404, resolve
 from django.utils.deprecation import MiddlewareMixin
 from django.db import connection
 
+# GET requests that must leave the database alone: polling a background upload
+# would otherwise delete the job (and the dataset it is writing) it asks about
+PRESERVING_URL_NAMES = {"upload_job"}
+
 
 class ClearDatabaseMiddleware(MiddlewareMixin):
     # """Clear database only when get_csrf_token request is made"""
 
     def process_request(self, request):
         # Empty the database only on GET requests with path /api/get_csrf_token/.
-        if request.method == "GET":
+        if request.method == "GET" and not self._preserves_database(request):
             #  if request.method == "GET" and request.path == "/api/get_csrf_token/":
 
-            tables_to_clear = ["api_uploadedfile", "api_dataset", "api_auditlog", "api_analysisresult"]
+            tables_to_clear = ["api_ingestionjob", "api_analysisresult", "api_uploadedfile", "api_dataset", "api_auditlog"]
 
             with connection.cursor() as cursor:
                 for table in tables_to_clear:
@@ -18,3 +23,10 @@ class ClearDatabaseMiddleware(MiddlewareMixin):
                     cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table}';")  # Reset ID Count
 
         return None
+
+    @staticmethod
+    def _preserves_database(request):
+        try:
+            return resolve(request.path_info).url_name in PRESERVING_URL_NAMES
+        except Resolver404:
+            return False
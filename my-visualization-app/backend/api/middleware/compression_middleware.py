@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+# brotli and zstandard are optional, gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP = "gzip"
+BROTLI = "br"
+ZSTD = "zstd"
+ANY_ENCODING = "*"
+
+DEFAULT_MIN_BYTES = 1024
+# Payload size buckets: below SMALL use the slow/strong level, above LARGE the fastest one
+SMALL_PAYLOAD_BYTES = 256 * 1024
+LARGE_PAYLOAD_BYTES = 8 * 1024 * 1024
+# Above this load average per CPU every response uses the fastest level
+HIGH_CPU_LOAD = 0.75
+# (small, medium, large) compression levels per encoding
+LEVELS = {
+    ZSTD: (6, 3, 1),
+    BROTLI: (6, 4, 1),
+    GZIP: (6, 4, 1),
+}
+MEDIUM_LEVEL_INDEX = 1
+FASTEST_LEVEL_INDEX = 2
+
+# Formats that are compressed already
+SKIPPED_CONTENT_TYPES = (
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "application/vnd.apache.parquet",
+    "application/zip",
+    "image/",
+)
+
+
+class _GzipEncoder(object):
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush_block(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _BrotliEncoder(object):
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush_block(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdEncoder(object):
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush_block(self):
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+def available_encoders():
+    """
+    Supported encodings in order of preference
+    """
+    encoders = {}
+    if zstandard is not None:
+        encoders[ZSTD] = _ZstdEncoder
+    if brotli is not None:
+        encoders[BROTLI] = _BrotliEncoder
+    encoders[GZIP] = _GzipEncoder
+    return encoders
+
+
+def negotiate_encoding(accept_encoding: str):
+    """
+    Pick the preferred encoding the client accepts (q > 0), None when it accepts none of them
+    """
+    accepted = {}
+    for part in accept_encoding.split(","):
+        pieces = part.strip().split(";")
+        name = pieces[0].strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in pieces[1:]:
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    for encoding in available_encoders():
+        if accepted.get(encoding, accepted.get(ANY_ENCODING, 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _cpu_load():
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return 0.0
+
+
+def choose_level(encoding: str, size: int = None) -> int:
+    """
+    Compression level for a payload: strong for small payloads, fast for big ones or a busy CPU.
+    Streaming responses (unknown size) use the medium level.
+    """
+    levels = LEVELS[encoding]
+    if _cpu_load() > HIGH_CPU_LOAD:
+        return levels[FASTEST_LEVEL_INDEX]
+    if size is None:
+        return levels[MEDIUM_LEVEL_INDEX]
+    if size < SMALL_PAYLOAD_BYTES:
+        return levels[0]
+    if size < LARGE_PAYLOAD_BYTES:
+        return levels[MEDIUM_LEVEL_INDEX]
+    return levels[FASTEST_LEVEL_INDEX]
+
+
+class CompressionStats(object):
+    """
+    Per endpoint counters: responses compressed, bytes before / after and time spent compressing
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, encoding, bytes_in, bytes_out, seconds):
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                "responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0, "encodings": {},
+            })
+            stats["responses"] += 1
+            stats["bytes_in"] += bytes_in
+            stats["bytes_out"] += bytes_out
+            stats["seconds"] += seconds
+            stats["encodings"][encoding] = stats["encodings"].get(encoding, 0) + 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = dict(stats, encodings=dict(stats["encodings"]))
+                result[endpoint]["ratio"] = stats["bytes_out"] / stats["bytes_in"] if stats["bytes_in"] else None
+            return result
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with zstd, brotli or gzip depending on the client's Accept-Encoding.
+
+    Responses under settings.COMPRESSION_MIN_BYTES are sent as they are; streaming responses
+    are compressed chunk by chunk so the first bytes still go out right away.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or not 200 <= response.status_code < 300:
+            return response
+        if response.get("Content-Type", "").startswith(SKIPPED_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        endpoint = self._endpoint(request)
+        encoder_class = available_encoders()[encoding]
+
+        if response.streaming:
+            encoder = encoder_class(choose_level(encoding))
+            response.streaming_content = self._compress_stream(response.streaming_content, encoder, encoding, endpoint)
+            del response["Content-Length"]
+        else:
+            content = response.content
+            if len(content) < getattr(settings, "COMPRESSION_MIN_BYTES", DEFAULT_MIN_BYTES):
+                return response
+            start = time.perf_counter()
+            encoder = encoder_class(choose_level(encoding, len(content)))
+            compressed = encoder.compress(content) + encoder.finish()
+            compression_stats.record(endpoint, encoding, len(content), len(compressed), time.perf_counter() - start)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The body changed, so a strong ETag would be wrong now
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _endpoint(request):
+        match = getattr(request, "resolver_match", None)
+        return match.url_name if match is not None and match.url_name else request.path
+
+    @staticmethod
+    def _compress_stream(chunks, encoder, encoding, endpoint):
+        bytes_in = bytes_out = 0
+        seconds = 0.0
+        for chunk in chunks:
+            start = time.perf_counter()
+            data = encoder.compress(chunk) + encoder.flush_block()
+            seconds += time.perf_counter() - start
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        data = encoder.finish()
+        bytes_out += len(data)
+        compression_stats.record(endpoint, encoding, bytes_in, bytes_out, seconds)
+        yield data
@@ -0,0 +1,108 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:10
+
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db import migrations, models
+
+# The column store format of this migration, frozen here: later changes to
+# server_handler.column_store must not change what the migration writes or reads.
+NPY_KIND = 'npy'
+JSONL_KIND = 'jsonl'
+NPY_DTYPE_KINDS = 'biufM'
+ENCODING = 'utf-8'
+
+
+def _column_path(key, kind):
+    path = str(settings.DATASET_STORAGE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, key + ('.npy' if kind == NPY_KIND else '.jsonl'))
+
+
+def _json_value(value):
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _write_column(series):
+    # Files are named after the digest of their content, so migrating twice writes no new files
+    if isinstance(series.dtype, np.dtype) and series.dtype.kind in NPY_DTYPE_KINDS:
+        values = np.ascontiguousarray(series.to_numpy())
+        digest = hashlib.sha1(values.dtype.str.encode(ENCODING))
+        digest.update(values.reshape(-1).view(np.uint8))
+        kind, dtype = NPY_KIND, values.dtype.str
+        content = None
+    else:
+        content = ''.join(json.dumps(_json_value(value), default=str) + '\n' for value in series.tolist()).encode(ENCODING)
+        digest = hashlib.sha1(JSONL_KIND.encode(ENCODING))
+        digest.update(content)
+        kind, dtype = JSONL_KIND, str(series.dtype)
+
+    entry = {'key': digest.hexdigest(), 'kind': kind, 'dtype': dtype}
+    path = _column_path(entry['key'], kind)
+    if not os.path.exists(path):
+        temp_path = path + '.' + uuid.uuid4().hex + '.tmp'
+        with open(temp_path, 'wb') as f:
+            if content is None:
+                np.save(f, values, allow_pickle=False)
+            else:
+                f.write(content)
+        os.replace(temp_path, path)
+    return entry
+
+
+def _read_column(entry):
+    path = _column_path(entry['key'], entry['kind'])
+    if entry['kind'] == NPY_KIND:
+        return np.load(path, allow_pickle=False)
+    with open(path, encoding=ENCODING) as f:
+        return json.loads('[' + ','.join(line for line in f if line.strip()) + ']')
+
+
+def move_records_to_column_store(apps, schema_editor):
+    Dataset = apps.get_model('api', 'Dataset')
+    for dataset in Dataset.objects.all():
+        records = dataset.records if isinstance(dataset.records, list) else []
+        df = pd.DataFrame(records)
+        dataset.column_manifest = {
+            'num_rows': len(df),
+            'columns': {str(name): _write_column(df[name]) for name in df.columns},
+        }
+        dataset.save(update_fields=['column_manifest'])
+
+
+def move_records_back_to_json(apps, schema_editor):
+    Dataset = apps.get_model('api', 'Dataset')
+    for dataset in Dataset.objects.all():
+        entries = (dataset.column_manifest or {}).get('columns', {})
+        df = pd.DataFrame({name: _read_column(entry) for name, entry in entries.items()}, columns=list(entries))
+        dataset.records = df.astype(object).where(df.notna(), None).to_dict(orient='records')
+        dataset.save(update_fields=['records'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_rename_upload_time_uploadedfile_uploaded_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='column_manifest',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RunPython(move_records_to_column_store, move_records_back_to_json),
+        migrations.RemoveField(
+            model_name='dataset',
+            name='records',
+        ),
+    ]
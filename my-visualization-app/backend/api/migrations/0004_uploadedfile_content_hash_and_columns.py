@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_dataset_column_manifest_remove_dataset_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='features',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='column_manifest',
+            field=models.JSONField(default=dict),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_uploadedfile_content_hash_and_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('name', models.CharField(max_length=255)),
+                ('file_path', models.CharField(max_length=500)),
+                ('file_type', models.CharField(choices=[('csv', 'CSV'), ('xlsx', 'Excel')], max_length=10)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('bytes_total', models.BigIntegerField(default=0)),
+                ('bytes_parsed', models.BigIntegerField(default=0)),
+                ('rows_ingested', models.BigIntegerField(default=0)),
+                ('schema', models.JSONField(default=dict)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dataset', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to='api.dataset')),
+            ],
+        ),
+    ]
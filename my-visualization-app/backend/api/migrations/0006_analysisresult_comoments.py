@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisresult',
+            name='comoments',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,13 +1,25 @@
 from django.db import models
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 
+from backend.server_handler import column_store, comoments, correlation
+from backend.server_handler.dataframe_cache import dataframe_cache
 
-### **Stores uploaded file information (only the file path is recorded, no data is stored)**
+# Cell edits touching more rows than this recompute the co-moments lazily instead of updating them
+MAX_INCREMENTAL_EDIT_ROWS = 10_000
+
+
+### **Stores uploaded file information (the file path, its content hash and the parsed columns)**
 class UploadedFile(models.Model):
     name = models.CharField(max_length=255)  # Name of the document
     file_path = models.CharField(max_length=500)  # file path
     file_type = models.CharField(max_length=10, choices=[("csv", "CSV"), ("xlsx", "Excel")])  # Document type
     uploaded_at = models.DateTimeField(auto_now_add=True)  # Upload time
+    content_hash = models.CharField(max_length=64, blank=True, default="", db_index=True)  # SHA-256 of the uploaded bytes
+    features = models.JSONField(default=list)  # Column names parsed from the file
+    column_manifest = models.JSONField(default=dict)  # Parsed columns in the column store, reused by identical uploads
 
     def __str__(self):
         return self.name
@@ -18,7 +30,7 @@ class Dataset(models.Model):
     name = models.CharField(max_length=255)  # dataset name
     uploaded_file = models.OneToOneField(UploadedFile, on_delete=models.CASCADE, null=True, blank=True, related_name="dataset")  # Associated Upload Files
     features = models.JSONField(default=list)  # Column names, e.g. [‘age’, ‘salary’, ‘city’]
-    records = models.JSONField(default=list)  # Data, e.g. [{‘age’: 25, ‘salary’: 50000}]
+    column_manifest = models.JSONField(default=dict)  # Column files in the column store, e.g. {"num_rows": 2, "columns": {"age": {...}}}
 
     last_dataset = models.OneToOneField(
         "self", on_delete=models.SET_NULL, null=True, blank=True, related_name="next"
@@ -30,25 +42,343 @@ class Dataset(models.Model):
     def __str__(self):
         return self.name
 
-    def get_dataframe(self):
+    @property
+    def records(self):
+        """
+        Rows as a list of dicts, e.g. [{‘age’: 25, ‘salary’: 50000}], for callers of the old JSON storage
+        """
+        df = self.get_dataframe()
+        return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+    @records.setter
+    def records(self, records):
+        if not isinstance(records, list) or not all(isinstance(row, dict) for row in records):
+            raise ValueError("Records must be a list of dictionaries.")
+        self.set_dataframe(pd.DataFrame(records))
+
+    @property
+    def num_rows(self):
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            return len(pending)
+        return (self.column_manifest or {}).get(column_store.NUM_ROWS, 0)
+
+    @property
+    def stored_features(self):
+        """
+        Columns that physically exist in the column store, including deleted features not compacted yet
+        """
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            return [str(col) for col in pending.columns]
+        return list((self.column_manifest or {}).get(column_store.COLUMNS, {}))
+
+    @property
+    def fingerprint(self):
+        """
+        Version of the dataset content, changes whenever the visible features or column files change
+        """
+        # Column files are never modified, so their keys stand for their content
+        entries = (self.column_manifest or {}).get(column_store.COLUMNS, {})
+        keys = [[name, entry[column_store.KEY]] for name, entry in entries.items()]
+        content = json.dumps([self.features, keys])
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    @property
+    def profile(self):
+        """
+        Statistics of every visible feature, read from the manifest without touching the data
+        """
+        entries = (self.column_manifest or {}).get(column_store.COLUMNS, {})
+        return {name: column_store.profile(entries[name]) for name in self.features if name in entries}
+
+    def summary(self, approximate=False):
+        """
+        Mean and standard deviation of every visible feature (None for non-numeric ones), from the profile
+
+        :param approximate: bool, also give the median, quantiles and distinct counts estimated by the
+            column sketches, with their error bounds (relative for distinct counts, in rank for quantiles)
+        """
+        profile = self.profile
+        summary = {
+            "columns": list(profile),
+            "mean": [stats["mean"] for stats in profile.values()],
+            "std": [stats["std"] for stats in profile.values()],
+        }
+        if approximate:
+            quantiles = [stats.get("quantiles") or {} for stats in profile.values()]
+            summary.update({
+                "median": [values.get("0.5") for values in quantiles],
+                "quantiles": quantiles,
+                "distinct": [stats["distinct"] for stats in profile.values()],
+                "error_bounds": {
+                    "distinct_relative_error": [stats["distinct_error"] for stats in profile.values()],
+                    "quantile_rank_error": [stats.get("quantile_error") for stats in profile.values()],
+                },
+            })
+        return summary
+
+    @property
+    def numeric_features(self):
+        """
+        Visible numeric features, the ones covered by the co-moments (correlation matrix)
+        """
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            numeric = pending.select_dtypes(include="number").columns
+            return [col for col in self.features if col in numeric][:comoments.COMOMENT_MAX_COLUMNS]
+        return comoments.numeric_columns(self.column_manifest, self.features)
+
+    def column_keys(self, columns):
+        """
+        Keys of the column files behind `columns`, they change exactly when the data of a column changes
+        """
+        entries = (self.column_manifest or {}).get(column_store.COLUMNS, {})
+        return [entries[name][column_store.KEY] for name in columns]
+
+    def typed_features(self, dtype_kinds):
+        """
+        Visible features stored as typed arrays of the given numpy dtype kinds, e.g. "iuf" for numbers
+        """
+        entries = (self.column_manifest or {}).get(column_store.COLUMNS, {})
+        return [
+            name for name in self.features
+            if name in entries and entries[name][column_store.KIND] == column_store.NPY_KIND
+            and np.dtype(entries[name][column_store.DTYPE]).kind in dtype_kinds
+        ]
+
+    def _stored_comoments(self, columns):
+        """
+        Co-moments of `columns` kept for this version, or for the previous one when it has the same column files
+        """
+        candidates = [getattr(self, "_pending_comoments", None)]
+        if self.pk is not None:
+            candidates.append(AnalysisResult.objects.filter(dataset=self).values_list("comoments", flat=True).first())
+        if self.last_dataset_id is not None:
+            candidates.append(AnalysisResult.objects.filter(dataset_id=self.last_dataset_id)
+                              .values_list("comoments", flat=True).first())
+        for stored in candidates:
+            moments = comoments.CoMoments.from_dict(stored, self.column_manifest, columns)
+            if moments is not None:
+                return moments
+        return None
+
+    def get_comoments(self, columns=None):
+        """
+        Pairwise co-moments of numeric features (see CoMoments), computed on first use and kept
+        in the AnalysisResult, then updated on appends and cell edits instead of rescanning the data
+
+        :param columns: list, subset of `numeric_features`, default: all of them
+        """
+        columns = self.numeric_features if columns is None else list(columns)
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            return comoments.CoMoments.from_frame(pending, columns)
+
+        moments = self._stored_comoments(columns)
+        if moments is None:
+            moments = comoments.compute(self.column_manifest, self.numeric_features)
+            AnalysisResult.objects.filter(dataset=self).update(comoments=moments.to_dict(self.column_manifest))
+            moments = moments.subset(columns)
+        return moments
+
+    def get_ranks(self, columns):
+        """
+        Ranks of numeric features (see correlation.rank_values), computed once per column file and kept
+        next to it, so Spearman correlations never re-rank a column whose data did not change
+
+        :param columns: list, subset of `numeric_features`
+        """
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            return pd.DataFrame({name: correlation.rank_values(pending[name]) for name in columns}, columns=columns)
+        entries = self.column_manifest[column_store.COLUMNS]
+        return pd.DataFrame({name: column_store.rank_index(entries[name]) for name in columns}, columns=columns)
+
+    def refresh_analysis(self):
+        """
+        Store the shape, missing values, means and the still valid co-moments of this version in its AnalysisResult
+        """
+        profile = self.profile
+        moments = self._stored_comoments(self.numeric_features)
+        AnalysisResult.objects.update_or_create(dataset=self, defaults={
+            "columns": list(profile),
+            "shape": str((self.num_rows, len(profile))),
+            "missing_values": {name: stats["nulls"] for name, stats in profile.items()},
+            "mean_values": {name: stats["mean"] for name, stats in profile.items()},
+            "comoments": {} if moments is None else moments.to_dict(self.column_manifest),
+        })
+        self._pending_comoments = None
+
+    def set_dataframe(self, df):
+        """
+        Replace the data of this dataset, the column files are written on the next save()
+        """
+        self._pending_frame = df
+        self._pending_comoments = None
+
+    def append_records(self, records):
+        """
+        Add rows at the end, e.g. [{‘age’: 25, ‘salary’: 50000}]; missing values for absent features.
+        The column statistics and co-moments of the stored rows are updated with the new rows only.
+        """
+        df = pd.DataFrame(records)
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            self._pending_frame = pd.concat([pending, df], ignore_index=True)
+            return
+
+        stored = self._stored_comoments(self.numeric_features)
+        self.column_manifest = column_store.append_rows(self.column_manifest, df)
+        if stored is not None:
+            moments = stored.merge(comoments.CoMoments.from_frame(df.reindex(columns=stored.columns), stored.columns))
+            self._pending_comoments = moments.to_dict(self.column_manifest)
+
+    def update_columns(self, columns):
+        """
+        Replace or add whole columns, e.g. {‘salary’: [50000, 62000]}.
+        The other columns keep sharing their files with the previous versions.
+        """
+        df = pd.DataFrame(columns)
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            pending = pending.copy(deep=False)
+            pending[df.columns] = df
+            self._pending_frame = pending
+        else:
+            self.column_manifest = column_store.replace_columns(self.column_manifest, df)
+        self.features = self.features + [str(col) for col in df.columns if str(col) not in self.features]
+
+    def update_cells(self, cells):
+        """
+        Change single values, e.g. [{‘row’: 3, ‘column’: ‘age’, ‘value’: 26}]; only the touched columns are rewritten
+        """
+        changes = {}
+        for cell in cells:
+            rows, values = changes.setdefault(cell["column"], ([], []))
+            rows.append(int(cell["row"]))
+            values.append(cell["value"])
+
+        pending = getattr(self, "_pending_frame", None)
+        for column, (rows, values) in changes.items():
+            if pending is not None:
+                pending = pending.copy(deep=False)
+                pending[column] = pending[column].copy()
+                pending.iloc[rows, pending.columns.get_loc(column)] = values
+                self._pending_frame = pending
+            else:
+                self._update_stored_cells(column, rows, values)
+
+    def _update_stored_cells(self, column, rows, values):
+        # Small edits move the co-moments from the old to the new values of the touched rows
+        stored = None
+        touched = list(dict.fromkeys(rows))
+        if len(touched) <= MAX_INCREMENTAL_EDIT_ROWS:
+            stored = self._stored_comoments(self.numeric_features)
+        if stored is not None and column in stored.columns:
+            before = column_store.read_positions(self.column_manifest, stored.columns, touched)
+        self.column_manifest = column_store.update_cells(self.column_manifest, column, rows, values)
+        if stored is None:
+            return
+        if column in stored.columns:
+            after = column_store.read_positions(self.column_manifest, stored.columns, touched)
+            stored = stored.remove(comoments.CoMoments.from_frame(before, stored.columns))
+            stored = stored.merge(comoments.CoMoments.from_frame(after, stored.columns))
+        self._pending_comoments = stored.to_dict(self.column_manifest)
+
+    def compact_storage(self):
+        """
+        Forget the column files of deleted features, after this they can no longer be restored
+        """
+        manifest = column_store.keep_columns(self.column_manifest, self.features)
+        if manifest != self.column_manifest:
+            self.column_manifest = manifest
+            self.save(update_fields=["column_manifest"])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The manifest as stored, save() only refreshes the analysis when it changes
+        instance._saved_manifest = instance.__dict__.get("column_manifest")
+        return instance
+
+    def save(self, *args, **kwargs):
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            self.column_manifest = column_store.write_frame(pending)
+            self._pending_frame = None
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = list(kwargs["update_fields"]) + ["column_manifest"]
+        update_fields = kwargs.get("update_fields")
+        manifest_changed = (update_fields is None or "column_manifest" in update_fields) and \
+            self.column_manifest != getattr(self, "_saved_manifest", None)
+        super().save(*args, **kwargs)
+        dataframe_cache.invalidate(self.id)
+        # Saving other fields (e.g. features when deleting one) leaves the column statistics as they are
+        if manifest_changed:
+            self._saved_manifest = self.column_manifest
+            self.refresh_analysis()
+
+    def delete(self, *args, **kwargs):
+        dataframe_cache.invalidate(self.id)
+        return super().delete(*args, **kwargs)
+
+    def get_dataframe(self, columns=None, mmap=False):
         """
-        Securely convert records to Pandas DataFrame
+        Load the dataset as a Pandas DataFrame straight from the column files
+
+        :param columns: list, optional subset of columns to load (others are never read from disk)
+        :param mmap: bool, memory-map numeric columns instead of reading them; the frame is read-only
         """
-        if not isinstance(self.records, list) or not all(isinstance(row, dict) for row in self.records):
-            print("Error: Invalid records format!")
-            return pd.DataFrame()  # Avoid reporting errors by returning an empty DataFrame
+        # Deleted features stay in the column store until compaction, never hand them out
+        if columns is not None and self.features:
+            columns = [col for col in columns if col in self.features]
 
-        df = pd.DataFrame(self.records)
+        pending = getattr(self, "_pending_frame", None)
+        if pending is not None:
+            df = pending if columns is None else pending[[col for col in dict.fromkeys(columns) if col in pending.columns]]
+        else:
+            # Repeated requests on the same dataset version are served from the process-local cache
+            cache_key = (self.id, self.fingerprint, None if columns is None else tuple(columns), mmap)
+            df = dataframe_cache.get(cache_key)
+            if df is None:
+                df = column_store.read_frame(self.column_manifest, columns, mmap=mmap)
+                dataframe_cache.put(cache_key, df)
 
         # Ensure that the DataFrame contains the fields from features.
-        if self.features and all(col in df.columns for col in self.features):
+        if columns is None and self.features and all(col in df.columns for col in self.features):
             return df[self.features]
         return df
 
+    def iter_batches(self, columns=None, batch_rows=column_store.DEFAULT_BATCH_ROWS):
+        """
+        Yield the visible features (or `columns`) as DataFrames of at most `batch_rows` rows
+        """
+        columns = self.features if columns is None else [col for col in columns if col in self.features]
+        return column_store.iter_batches(self.column_manifest, columns, batch_rows)
+
+    def get_window(self, offset=0, limit=None, columns=None, sort_by=None, descending=False):
+        """
+        Read `limit` rows starting at `offset` without loading the rest of the dataset
+
+        :param offset: int, position of the first row (in `sort_by` order when given)
+        :param limit: int, maximum number of rows, default: up to the end
+        :param columns: list, optional subset of the visible features
+        :param sort_by: str, optional feature to order the rows by
+        :param descending: bool, sort in descending order
+        :return: pandas.DataFrame indexed by row position
+        """
+        columns = self.features if columns is None else [col for col in columns if col in self.features]
+        if sort_by is not None and sort_by not in self.features:
+            raise ValueError(column_store.UNKNOWN_COLUMN_MESSAGE.format(sort_by))
+        stop = None if limit is None else offset + limit
+        return column_store.read_window(self.column_manifest, columns, offset, stop, sort_by, descending)
+
     def copy_dataset(self, new_name=None):
         """
         Create a copy of the current Dataset and establish the relationship 
         between last_dataset and next_dataset.
+        Column files are immutable, so the copy only references them.
         """
         if not new_name:
             new_name = f"{self.name}_copy"
@@ -58,7 +388,7 @@ class Dataset(models.Model):
             name=new_name,
             uploaded_file=self.uploaded_file,  # Copy the reference to the uploaded file
             features=self.features,  # Copy the feature list
-            records=self.records,  # Copy the data records
+            column_manifest=self.column_manifest,  # Share the column files
             last_dataset=self  # Set the new dataset's last_dataset to the current dataset
         )
 
@@ -69,6 +399,33 @@ class Dataset(models.Model):
         return new_dataset
 
 
+### **Background parsing of an uploaded file**
+class IngestionJob(models.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    status = models.CharField(max_length=10, choices=[
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ], default=PENDING)
+    name = models.CharField(max_length=255)  # Name of the uploaded document
+    file_path = models.CharField(max_length=500)  # Where the upload was saved
+    file_type = models.CharField(max_length=10, choices=[("csv", "CSV"), ("xlsx", "Excel")])
+    content_hash = models.CharField(max_length=64, blank=True, default="")  # SHA-256 of the uploaded bytes
+    bytes_total = models.BigIntegerField(default=0)  # Size of the file
+    bytes_parsed = models.BigIntegerField(default=0)  # Progress through the file
+    rows_ingested = models.BigIntegerField(default=0)  # Rows written to the column store so far
+    schema = models.JSONField(default=dict)  # Inferred dtype per column so far, e.g. {‘age’: ‘int64’}
+    dataset = models.ForeignKey(Dataset, on_delete=models.SET_NULL, null=True, blank=True, related_name="ingestion_jobs")  # Set once the job is done
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 ### **Recording the results of data analysis**
 class AnalysisResult(models.Model):
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, null=True, blank=True)  # Allowed to be empty to avoid migration errors
@@ -76,6 +433,7 @@ class AnalysisResult(models.Model):
     shape = models.CharField(max_length=50)  # Shape information
     missing_values = models.JSONField()  # Missing value statistics
     mean_values = models.JSONField()  # Mean value statistics
+    comoments = models.JSONField(default=dict, blank=True)  # Mergeable pairwise statistics for correlations
     created_at = models.DateTimeField(auto_now_add=True)  # Record analysis time
 
 
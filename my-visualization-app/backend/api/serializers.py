@@ -2,6 +2,9 @@ from rest_framework import serializers
 from .models import Dataset
 
 class DatasetSerializer(serializers.ModelSerializer):
+    # Rows live in the column store, `Dataset.records` converts them to/from a list of dicts
+    records = serializers.ListField(child=serializers.DictField(), required=False)
+
     class Meta:
         model = Dataset
         fields = ['id', 'name', 'features', 'records']
@@ -1,3 +1,794 @@
-from django.test import TestCase
+import gzip
+import importlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from backend.api import json_response
+from backend.api.management.commands.check_import_time import Command as CheckImportTimeCommand
+from backend.api.middleware import compression_middleware
+from backend.api.models import AnalysisResult, Dataset, IngestionJob, UploadedFile
+from backend.server_handler import (column_store, comoments, correlation, downsampling, knn_index, model_store,
+                                    sketches, warmup)
+from backend.server_handler.column_store import FrameWriter
+from backend.server_handler.dataframe_cache import DataFrameCache
+from backend.server_handler.engine import Engine
+from backend.server_handler.ingestion import create_dataset_from_upload, ingest_file
+
+# Every other GET empties the database, see ClearDatabaseMiddleware
+keep_database = override_settings(
+    MIDDLEWARE=[name for name in settings.MIDDLEWARE if not name.endswith("ClearDatabaseMiddleware")])
+
+
+class StorageTestCase(TestCase):
+    """
+    Keep the column files and fitted models of a test out of the real storage directories
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = tempfile.mkdtemp()
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_dir, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        overrides = override_settings(DATASET_STORAGE_DIR=self.storage_dir, MODEL_STORAGE_DIR=self.model_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class ColumnStoreTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.frame = pd.DataFrame({
+            "f": [1.5, np.nan, -2.0, 4.25],
+            "i": [1, 2, 3, 4],
+            "b": [True, False, True, True],
+            "t": pd.to_datetime(["2024-01-01", "2024-01-02", None, "2024-01-04"]),
+            "s": ["a", None, "c", "d"],
+        })
+
+    def test_round_trip(self):
+        manifest = column_store.write_frame(self.frame)
+
+        self.assertEqual(manifest[column_store.NUM_ROWS], 4)
+        kinds = {name: entry[column_store.KIND] for name, entry in manifest[column_store.COLUMNS].items()}
+        self.assertEqual(kinds, {"f": "npy", "i": "npy", "b": "npy", "t": "npy", "s": "jsonl"})
+        pd.testing.assert_frame_equal(column_store.read_frame(manifest), self.frame)
+
+    def test_memory_mapped_columns(self):
+        manifest = column_store.write_frame(self.frame)
+
+        pd.testing.assert_frame_equal(column_store.read_frame(manifest, ["s", "f"], mmap=True), self.frame[["s", "f"]])
+
+    def test_identical_columns_share_a_file(self):
+        first = column_store.write_frame(self.frame)
+        second = column_store.write_frame(self.frame.rename(columns={"f": "g"}))
+
+        self.assertEqual(first[column_store.COLUMNS]["f"][column_store.KEY], second[column_store.COLUMNS]["g"][column_store.KEY])
+
+    def test_replaced_columns_leave_the_others_in_place(self):
+        manifest = column_store.write_frame(self.frame)
+
+        replaced = column_store.replace_columns(manifest, pd.DataFrame({"i": [5, 6, 7, 8], "new": list("wxyz")}))
+
+        old, new = manifest[column_store.COLUMNS], replaced[column_store.COLUMNS]
+        self.assertEqual([name for name in old if old[name] == new[name]], ["f", "b", "t", "s"])
+        self.assertEqual(column_store.read_frame(replaced, ["i", "new"]).to_dict("list"),
+                         {"i": [5, 6, 7, 8], "new": ["w", "x", "y", "z"]})
+        pd.testing.assert_frame_equal(column_store.read_frame(manifest), self.frame)
+
+    def test_batches(self):
+        manifest = column_store.write_frame(self.frame)
+
+        pd.testing.assert_frame_equal(pd.concat(column_store.iter_batches(manifest, batch_rows=3)), self.frame)
+
+    def test_windows(self):
+        manifest = column_store.write_frame(self.frame)
+
+        window = column_store.read_window(manifest, ["f", "s"], 1, 3)
+        pd.testing.assert_frame_equal(window, self.frame[["f", "s"]].iloc[1:3].set_axis(np.array([1, 2])))
+        ordered = column_store.read_window(manifest, ["i"], 0, 2, sort_by="f", descending=True)
+        self.assertEqual(ordered["i"].tolist(), [4, 1])
+
+    def test_appended_rows_resume_the_profiles(self):
+        manifest = column_store.write_frame(self.frame[["f", "s"]])
+        extra = pd.DataFrame({"f": [10.0], "s": ["e"]})
+
+        appended = column_store.append_rows(manifest, extra)
+
+        expected = pd.concat([self.frame[["f", "s"]], extra], ignore_index=True)
+        pd.testing.assert_frame_equal(column_store.read_frame(appended), expected)
+        stats = column_store.profile(appended[column_store.COLUMNS]["f"])
+        self.assertEqual((stats["count"], stats["nulls"]), (4, 1))
+        self.assertAlmostEqual(stats["mean"], expected["f"].mean())
+        self.assertAlmostEqual(stats["std"], expected["f"].std())
+
+
+class RecordsMigrationTests(StorageTestCase):
+
+    def test_frozen_writer_is_read_by_the_column_store(self):
+        migration = importlib.import_module("backend.api.migrations.0003_dataset_column_manifest_remove_dataset_records")
+        frame = pd.DataFrame({"x": [1.5, None, 3.0], "name": ["a", None, "c"], "n": [1, 2, 3]})
+
+        entries = {name: migration._write_column(frame[name]) for name in frame.columns}
+
+        manifest = {column_store.NUM_ROWS: 3, column_store.COLUMNS: entries}
+        pd.testing.assert_frame_equal(column_store.read_frame(manifest), frame)
+        self.assertEqual(migration._read_column(entries["name"]), ["a", None, "c"])
+
+
+class DataFrameCacheTests(StorageTestCase):
+
+    def test_least_recently_used_frames_are_evicted(self):
+        frame = pd.DataFrame({"x": np.zeros(100)})
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        cache = DataFrameCache(max_bytes=2 * size)
+
+        cache.put((1, "a"), frame)
+        cache.put((2, "a"), frame)
+        cache.get((1, "a"))
+        cache.put((3, "a"), frame)
+
+        self.assertIsNotNone(cache.get((1, "a")))
+        self.assertIsNone(cache.get((2, "a")))
+        cache.invalidate(1)
+        self.assertIsNone(cache.get((1, "a")))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_fingerprint_follows_the_features_and_the_column_files(self):
+        dataset = Dataset(name="d", features=["x", "y"])
+        dataset.set_dataframe(pd.DataFrame({"x": [1.0, 2.0], "y": ["a", "b"]}))
+        dataset.save()
+        fingerprint = dataset.fingerprint
+
+        dataset.features = ["x"]
+        self.assertNotEqual(dataset.fingerprint, fingerprint)
+        dataset.features = ["x", "y"]
+        self.assertEqual(dataset.fingerprint, fingerprint)
+        dataset.set_dataframe(pd.DataFrame({"x": [1.0, 3.0], "y": ["a", "b"]}))
+        dataset.save()
+        self.assertNotEqual(dataset.fingerprint, fingerprint)
+
+
+class DatasetVersionTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset(name="d", features=["x", "y"])
+        self.dataset.set_dataframe(pd.DataFrame({"x": [1.0, 2.0, 3.0], "y": ["a", "b", "c"]}))
+        self.dataset.save()
+
+    def test_copies_share_the_column_files(self):
+        copy = self.dataset.copy_dataset()
+
+        self.assertEqual(copy.column_manifest, self.dataset.column_manifest)
+        self.assertEqual(copy.last_dataset_id, self.dataset.id)
+        self.assertEqual(Dataset.objects.get(id=self.dataset.id).next_dataset_id, copy.id)
+
+    def test_edits_only_rewrite_the_touched_column(self):
+        copy = self.dataset.copy_dataset()
+
+        copy.update_cells([{"row": 0, "column": "x", "value": 10.0}])
+        copy.save()
+
+        old, new = self.dataset.column_manifest[column_store.COLUMNS], copy.column_manifest[column_store.COLUMNS]
+        self.assertEqual(old["y"], new["y"])
+        self.assertNotEqual(old["x"][column_store.KEY], new["x"][column_store.KEY])
+        self.assertEqual(Dataset.objects.get(id=self.dataset.id).get_dataframe()["x"].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(copy.get_dataframe()["x"].tolist(), [10.0, 2.0, 3.0])
+
+    def test_deleted_features_are_hidden_until_compaction(self):
+        self.dataset.features = ["x"]
+        self.dataset.save(update_fields=["features"])
+
+        self.assertEqual(list(self.dataset.get_dataframe().columns), ["x"])
+        self.assertEqual(self.dataset.stored_features, ["x", "y"])
+        self.dataset.compact_storage()
+        self.assertEqual(self.dataset.stored_features, ["x"])
+
+
+class GarbageCollectionTests(StorageTestCase):
+
+    def age_files(self, seconds):
+        for name in os.listdir(self.storage_dir):
+            path = os.path.join(self.storage_dir, name)
+            stamp = os.path.getmtime(path) - seconds
+            os.utime(path, (stamp, stamp))
+
+    def test_reused_column_files_are_kept(self):
+        frame = pd.DataFrame({"x": [1.0, 2.0], "name": ["a", "b"]})
+        column_store.write_frame(frame)
+        self.age_files(2 * column_store.GARBAGE_MIN_AGE_SECONDS)
+
+        # A new dataset is being written with the same columns, it is not saved (referenced) yet
+        column_store.write_frame(frame)
+
+        self.assertEqual(column_store.collect_garbage(set()), 0)
+
+    def test_old_unreferenced_files_are_removed(self):
+        manifest = column_store.write_frame(pd.DataFrame({"x": [1.0, 2.0], "y": [3.0, 4.0]}))
+        self.age_files(2 * column_store.GARBAGE_MIN_AGE_SECONDS)
+        kept = manifest[column_store.COLUMNS]["x"][column_store.KEY]
+
+        self.assertGreater(column_store.collect_garbage({kept}), 0)
+
+        self.assertEqual(column_store.read_column(manifest[column_store.COLUMNS]["x"]).tolist(), [1.0, 2.0])
+        self.assertFalse(os.path.exists(column_store.column_path(manifest[column_store.COLUMNS]["y"])))
+
+
+class ChunkedIngestionTests(StorageTestCase):
+
+    def test_columns_are_promoted_across_chunks(self):
+        path = os.path.join(self.storage_dir, "mixed.csv")
+        with open(path, "w") as f:
+            # int chunk, float chunk, text chunk
+            f.write("a,b\n1,1\n2,2\n3,2.5\n4,3.5\n5,text\n6,x\n")
+
+        features, manifest = ingest_file(path, "csv", chunk_rows=2)
+
+        self.assertEqual(features, ["a", "b"])
+        frame = column_store.read_frame(manifest)
+        self.assertEqual(frame["a"].tolist(), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(frame["b"].tolist(), [1.0, 2.0, 2.5, 3.5, "text", "x"])
+        self.assertFalse([name for name in os.listdir(self.storage_dir) if name.endswith(column_store.TEMP_SUFFIX)])
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "needs /proc to count open files")
+    def test_wide_tables_do_not_keep_a_file_open_per_column(self):
+        chunk = pd.DataFrame(np.ones((3, 500)), columns=[f"c{i}" for i in range(500)])
+        open_before = len(os.listdir("/proc/self/fd"))
+
+        writer = FrameWriter()
+        writer.append(chunk)
+        writer.append(chunk)
+        self.assertLess(len(os.listdir("/proc/self/fd")) - open_before, 10)
+        manifest = writer.finish()
+
+        pd.testing.assert_frame_equal(column_store.read_frame(manifest), pd.concat([chunk, chunk], ignore_index=True))
+
+
+class UploadReuseTests(StorageTestCase):
+
+    def test_identical_uploads_reuse_the_parsed_columns(self):
+        path = os.path.join(self.storage_dir, "small.csv")
+        with open(path, "w") as f:
+            f.write("x,name\n1,a\n2,b\n")
+
+        first = create_dataset_from_upload(path, "small.csv", "csv", "digest")
+        with mock.patch("backend.server_handler.ingestion.ingest_file") as ingest:
+            second = create_dataset_from_upload(path, "copy.csv", "csv", "digest")
+
+        ingest.assert_not_called()
+        self.assertEqual(second.column_manifest, first.column_manifest)
+        self.assertEqual(second.get_dataframe().to_dict("list"), {"x": [1, 2], "name": ["a", "b"]})
+        self.assertEqual(UploadedFile.objects.filter(content_hash="digest").count(), 2)
+
+
+class AsyncUploadTests(StorageTestCase):
+
+    def test_uploads_with_the_same_name_get_their_own_file(self):
+        with mock.patch("backend.api.views.upload_view.BASE_DIR", self.storage_dir), \
+                mock.patch("backend.api.views.upload_view.submit_ingestion_job") as submit:
+            for content in (b"x\n1\n", b"x\n2\n"):
+                response = self.client.post("/api/upload/?async=true", {"file": SimpleUploadedFile("data.csv", content)})
+                self.assertEqual(response.status_code, 202)
+
+        self.assertEqual(submit.call_count, 2)
+        jobs = list(IngestionJob.objects.order_by("id"))
+        for job, content in zip(jobs, (b"x\n1\n", b"x\n2\n")):
+            with open(job.file_path, "rb") as f:
+                self.assertEqual(f.read(), content)
+        upload_dir = os.path.join(self.storage_dir, "uploads")
+        self.assertEqual(sorted(os.listdir(upload_dir)), sorted(os.path.basename(job.file_path) for job in jobs))
+
+    def test_polling_a_job_keeps_it(self):
+        job = IngestionJob.objects.create(name="big.csv", file_path="big.csv", file_type="csv", bytes_total=10)
+
+        for _ in range(2):
+            response = self.client.get(f"/api/upload_jobs/{job.id}/")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["job_id"], job.id)
+        self.assertTrue(IngestionJob.objects.filter(id=job.id).exists())
+
+
+@keep_database
+class DownloadViewTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        frame = pd.DataFrame({"x": [1.5, np.nan, 3.0], "name": ["a", None, "c"]})
+        self.dataset = Dataset(name="d", features=list(frame.columns))
+        self.dataset.set_dataframe(frame)
+        self.dataset.save()
+
+    def test_csv_export(self):
+        response = self.client.get(f"/api/download/{self.dataset.id}/csv/")
+
+        self.assertEqual(b"".join(response.streaming_content).decode(), "x,name\n1.5,a\n,\n3.0,c\n")
+
+    def test_xlsx_export_removes_its_file_when_closed(self):
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir, ignore_errors=True)
+        with mock.patch.object(tempfile, "tempdir", export_dir):
+            response = self.client.get(f"/api/download/{self.dataset.id}/xlsx/")
+        self.assertEqual(len(os.listdir(export_dir)), 1)
+
+        # The test client closes the response once its content has been read
+        content = b"".join(response.streaming_content)
+
+        self.assertEqual(os.listdir(export_dir), [])
+        frame = pd.read_excel(io.BytesIO(content))
+        self.assertEqual(frame["name"].tolist()[::2], ["a", "c"])
+
+
+@override_settings(COMPRESSION_MIN_BYTES=1024)
+class CompressionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.request = RequestFactory().get("/api/series/", HTTP_ACCEPT_ENCODING="gzip")
+        self.middleware = compression_middleware.CompressionMiddleware(lambda request: None)
+
+    def test_encoding_negotiation(self):
+        self.assertEqual(compression_middleware.negotiate_encoding("gzip;q=0.5, identity"), "gzip")
+        self.assertIsNone(compression_middleware.negotiate_encoding("gzip;q=0, identity"))
+        self.assertIsNone(compression_middleware.negotiate_encoding(""))
+
+    def test_responses_are_compressed(self):
+        body = json.dumps({"values": list(range(2000))}).encode()
+
+        response = self.middleware.process_response(self.request, HttpResponse(body, content_type="application/json"))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_streaming_responses_are_compressed_chunk_by_chunk(self):
+        chunks = [b"x,y\n"] + [b"1,2\n" * 100] * 3
+
+        response = self.middleware.process_response(self.request, StreamingHttpResponse(iter(chunks)))
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertFalse(response.has_header("Content-Length"))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), b"".join(chunks))
+
+    def test_small_responses_are_sent_as_they_are(self):
+        response = self.middleware.process_response(self.request, HttpResponse(b'{"x": 1}'))
+
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, b'{"x": 1}')
+
+
+class ResponseEncodingTests(TestCase):
+
+    def test_frames_are_encoded_without_nan(self):
+        frame = pd.DataFrame({"x": [1.5, np.nan], "name": ["a", None]})
+
+        records = json.loads(json_response.dumps({"data": frame, "n": np.int64(2)}))
+        columnar = json.loads(json_response.dumps({"data": frame}, "columnar"))
+
+        self.assertEqual(records, {"data": [{"x": 1.5, "name": "a"}, {"x": None, "name": None}], "n": 2})
+        self.assertEqual(columnar["data"]["data"], {"x": [1.5, None], "name": ["a", None]})
+
+
+class DownsamplingTests(TestCase):
+
+    def setUp(self):
+        x = np.arange(10_000, dtype=np.float64)
+        y = np.sin(x / 100)
+        y[4321] = 50.0
+        self.frame = pd.DataFrame({"x": x, "y": y})
+
+    def test_lttb_keeps_the_requested_points_and_the_peaks(self):
+        reduced = downsampling.downsample(self.frame, "x", "y", 500)
+
+        self.assertEqual(len(reduced), 500)
+        self.assertEqual((reduced["x"].iloc[0], reduced["x"].iloc[-1]), (0.0, 9999.0))
+        self.assertIn(50.0, reduced["y"].tolist())
+
+    def test_minmax_keeps_at_most_the_requested_points(self):
+        reduced = downsampling.downsample(self.frame, "x", "y", 500, downsampling.MINMAX_METHOD)
+
+        self.assertLessEqual(len(reduced), 500)
+        self.assertIn(50.0, reduced["y"].tolist())
+
+    def test_small_inputs_are_returned_as_they_are(self):
+        small = self.frame.iloc[:10]
+
+        self.assertIs(downsampling.downsample(small, "x", "y", 500), small)
+        with self.assertRaises(ValueError):
+            downsampling.downsample(self.frame, "x", "y", 2)
+
+
+@keep_database
+class DatasetDetailViewTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dataset = Dataset(name="d", features=["x", "name"])
+        self.dataset.set_dataframe(pd.DataFrame({"x": [3.0, 1.0, 2.0, 4.0], "name": ["c", "a", "b", "d"]}))
+        self.dataset.save()
+
+    def test_window_envelope(self):
+        response = self.client.get(f"/api/datasets/{self.dataset.id}/",
+                                   {"offset": 1, "limit": 2, "columns": "name", "sort_by": "x", "order": "desc"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Total-Count"], "4")
+        body = response.json()
+        self.assertEqual((body["total_rows"], body["offset"], body["limit"], body["order"]), (4, 1, 2, "desc"))
+        self.assertEqual(list(body["schema"]), ["name"])
+        self.assertEqual(body["row_positions"], [0, 2])
+        self.assertEqual(body["records"], [{"name": "c"}, {"name": "b"}])
+
+    def test_invalid_window(self):
+        response = self.client.get(f"/api/datasets/{self.dataset.id}/", {"limit": -1})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.has_header("X-Total-Count"))
+
+
+class SketchTests(TestCase):
+
+    def test_distinct_count_is_within_its_error(self):
+        hll = sketches.HyperLogLog()
+        hll.add(np.arange(50_000) % 20_000)
+
+        self.assertLess(abs(hll.estimate() - 20_000) / 20_000, 3 * hll.relative_error)
+
+    def test_quantiles_are_within_their_rank_error(self):
+        values = np.random.default_rng(6).normal(size=100_000)
+        kll = sketches.KLLSketch()
+        for start in range(0, len(values), 10_000):
+            kll.add(values[start:start + 10_000])
+
+        estimates = kll.quantiles([0.1, 0.5, 0.9])
+
+        ranks = np.searchsorted(np.sort(values), estimates) / len(values)
+        np.testing.assert_allclose(ranks, [0.1, 0.5, 0.9], atol=2 * kll.rank_error)
+
+
+class DatasetSaveTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        dataset = Dataset(name="d", features=["x", "y"])
+        dataset.set_dataframe(pd.DataFrame({"x": [1.0, 2.0, 4.0], "y": [1, 0, 1]}))
+        dataset.save()
+        self.dataset = Dataset.objects.get(id=dataset.id)
+
+    def test_analysis_is_stored_with_the_columns(self):
+        analysis = AnalysisResult.objects.get(dataset=self.dataset)
+
+        self.assertEqual(analysis.shape, "(3, 2)")
+        self.assertAlmostEqual(analysis.mean_values["x"], 7 / 3)
+
+    def test_saving_features_only_skips_the_analysis(self):
+        with mock.patch.object(Dataset, "refresh_analysis") as refresh:
+            self.dataset.features = ["x"]
+            self.dataset.save(update_fields=["features"])
+            self.dataset.save()
+
+        refresh.assert_not_called()
+
+    def test_changed_columns_refresh_the_analysis(self):
+        self.dataset.append_records([{"x": 8.0, "y": 0}])
+        self.dataset.save()
+
+        self.assertEqual(AnalysisResult.objects.get(dataset=self.dataset).shape, "(4, 2)")
+
+
+class CoMomentsTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(4)
+        self.frame = pd.DataFrame(rng.normal(size=(300, 4)) + [0, 1e6, 0, 5], columns=list("abcd"))
+        self.frame.iloc[::5, 0] = np.nan
+        self.frame.iloc[::7, 2] = np.nan
+
+    def test_matches_pandas(self):
+        moments = comoments.CoMoments.from_frame(self.frame, list(self.frame.columns))
+
+        pd.testing.assert_frame_equal(moments.correlation(), self.frame.corr())
+
+    def test_merged_and_removed_chunks(self):
+        columns = list(self.frame.columns)
+        head, tail = self.frame.iloc[:120], self.frame.iloc[120:]
+
+        merged = comoments.CoMoments.from_frame(head, columns).merge(comoments.CoMoments.from_frame(tail, columns))
+        removed = merged.remove(comoments.CoMoments.from_frame(tail, columns))
+
+        pd.testing.assert_frame_equal(merged.correlation(), self.frame.corr())
+        pd.testing.assert_frame_equal(removed.correlation(), head.corr())
+
+    def test_dataset_keeps_them_current_on_appends_and_edits(self):
+        dataset = Dataset(name="d", features=list(self.frame.columns))
+        dataset.set_dataframe(self.frame)
+        dataset.save()
+        dataset.get_comoments()
+
+        dataset.append_records([{"a": 1.0, "b": 2.0, "c": 3.0, "d": 4.0}])
+        dataset.save()
+        dataset.update_cells([{"row": 3, "column": "b", "value": 7.5}])
+        dataset.save()
+
+        expected = dataset.get_dataframe().corr()
+        pd.testing.assert_frame_equal(Dataset.objects.get(id=dataset.id).get_comoments().correlation(), expected)
+
+
+class UpdateCellsTests(StorageTestCase):
+
+    def test_clearing_a_cell_keeps_a_float_column_typed(self):
+        dataset = Dataset(name="d", features=["x", "y"])
+        dataset.set_dataframe(pd.DataFrame({"x": [1.5, 2.5, 3.5], "y": [1, 2, 3]}))
+        dataset.save()
+
+        dataset.update_cells([{"row": 1, "column": "x", "value": None}])
+        dataset.save()
+
+        entry = dataset.column_manifest[column_store.COLUMNS]["x"]
+        self.assertEqual(entry[column_store.KIND], column_store.NPY_KIND)
+        self.assertIn("x", dataset.numeric_features)
+        np.testing.assert_array_equal(dataset.get_dataframe()["x"].to_numpy(), [1.5, np.nan, 3.5])
+
+    def test_clearing_a_cell_of_an_int_column_gives_floats(self):
+        manifest = column_store.write_frame(pd.DataFrame({"y": [1, 2, 3]}))
+
+        manifest = column_store.update_cells(manifest, "y", [0], [None])
+
+        values = column_store.read_column(manifest[column_store.COLUMNS]["y"])
+        self.assertEqual(values.dtype.kind, "f")
+        np.testing.assert_array_equal(values, [np.nan, 2.0, 3.0])
+
+
+class IncrementalPcaTests(TestCase):
+
+    def test_short_batches_are_merged_for_fitting(self):
+        values = np.random.default_rng(0).normal(size=(43, 12))
+        frame = pd.DataFrame(values)
+
+        def batches():
+            # Every batch has fewer rows than the components to fit
+            return (frame.iloc[start:start + 8] for start in range(0, len(frame), 8))
+
+        reduced = Engine.incremental_pca(batches, 10)
+
+        self.assertEqual(reduced.shape, (43, 10))
+
+
+class PcaReuseTests(StorageTestCase):
+
+    def test_fewer_rows_than_stored_components(self):
+        frame = pd.DataFrame(np.random.default_rng(1).normal(size=(6, 12)))
+
+        reduced, _ = Engine.reduce_pca_batches(lambda: iter([frame.iloc[:4], frame.iloc[4:]]), 2)
+
+        self.assertEqual(reduced.shape, (6, 2))
+
+    def test_stored_decomposition_is_sliced_for_fewer_components(self):
+        frame = pd.DataFrame(np.random.default_rng(7).normal(size=(100, 6)))
+        key = model_store.model_key("pca", ["columns"], {"solver": "full"})
+
+        first, summary = Engine.reduce_pca(frame, 3, "full", key)
+        with mock.patch.object(Engine, "_decomposition") as fit:
+            second, cached_summary = Engine.reduce_pca(frame, 2, "full", key)
+
+        fit.assert_not_called()
+        self.assertFalse(summary["cached_model"])
+        self.assertTrue(cached_summary["cached_model"])
+        np.testing.assert_allclose(second.to_numpy(), first.to_numpy()[:, :2])
+
+
+class TsneLandmarkTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.values = np.random.default_rng(8).normal(size=(300, 5))
+
+    def test_rows_besides_the_landmarks_are_placed_by_their_neighbours(self):
+        embedding, summary = Engine.reduce_tsne(pd.DataFrame(self.values), 2, landmarks=100)
+
+        self.assertEqual(embedding.shape, (300, 2))
+        self.assertTrue(np.isfinite(embedding.to_numpy()).all())
+        self.assertEqual(summary["landmarks"], len(Engine.landmark_sample(self.values, 100)))
+
+    def test_landmarks_are_drawn_from_every_stratum(self):
+        strata = np.array(["a"] * 290 + ["b"] * 10)
+
+        sample = Engine.landmark_sample(self.values, 30, strata)
+
+        self.assertEqual(pd.Series(strata[sample]).value_counts().to_dict(), {"a": 29, "b": 1})
+
+    def test_unknown_stratify_by_feature(self):
+        dataset = Dataset(name="d", features=["a", "b"])
+        dataset.set_dataframe(pd.DataFrame(self.values[:, :2], columns=["a", "b"]))
+        dataset.save()
+
+        response = self.client.post("/api/dimensional_reduction/", json.dumps(
+            {"dataset_id": dataset.id, "method": "tsne", "stratify_by": "label"}), content_type="application/json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("label", response.json()["error"])
+
+
+class UmapReuseTests(StorageTestCase):
+
+    def test_appended_rows_are_projected_with_the_stored_model(self):
+        frame = pd.DataFrame(np.random.default_rng(9).normal(size=(120, 4)))
+        key = model_store.model_key("umap", ["dataset"], {"n_components": 2})
+
+        first, summary = Engine.reduce_umap(frame.iloc[:100], 2, 10, [key])
+        with mock.patch.object(Engine, "_fit_umap") as fit:
+            second, appended = Engine.reduce_umap(frame, 2, 10, [key])
+
+        fit.assert_not_called()
+        self.assertFalse(summary["cached_model"])
+        self.assertTrue(appended["cached_model"])
+        self.assertEqual((appended["fitted_rows"], appended["transformed_rows"]), (100, 20))
+        self.assertEqual(second.shape, (120, 2))
+        np.testing.assert_array_equal(second.to_numpy()[:100], first.to_numpy())
+
+
+class NeighborGraphTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.values = np.random.default_rng(10).normal(size=(200, 3))
+
+    def test_stored_graph_is_cut_to_fewer_neighbours(self):
+        graph = knn_index.neighbor_graph(self.values, 10, inputs=["columns"])
+        with mock.patch.object(knn_index, "build") as build:
+            fewer = knn_index.neighbor_graph(self.values, 5, inputs=["columns"])
+
+        build.assert_not_called()
+        np.testing.assert_array_equal(graph[knn_index.INDICES][:, 0], np.arange(200))
+        np.testing.assert_array_equal(fewer[knn_index.INDICES], graph[knn_index.INDICES][:, :5])
+
+    def test_tsne_graph_is_reused_for_oversampling(self):
+        from sklearn.neighbors import NearestNeighbors
+
+        Engine.reduce_tsne(pd.DataFrame(self.values), 2, perplexity=5)
+        with mock.patch.object(knn_index, "build") as build:
+            neighbors = knn_index.GraphNeighbors(n_neighbors=6).fit(self.values)
+            distances, indices = neighbors.kneighbors()
+
+        build.assert_not_called()
+        expected_distances, expected_indices = NearestNeighbors(n_neighbors=5).fit(self.values).kneighbors()
+        np.testing.assert_array_equal(indices, expected_indices)
+        np.testing.assert_allclose(distances, expected_distances)
+
+
+class WarmupTests(TestCase):
+
+    def test_only_serving_processes_warm_up(self):
+        self.assertTrue(warmup.is_server_process(["gunicorn"]))
+        self.assertFalse(warmup.is_server_process(["manage.py", "migrate"]))
+        self.assertTrue(warmup.is_server_process(["manage.py", "runserver", "--noreload"]))
+        with mock.patch.dict(os.environ, {"RUN_MAIN": ""}):
+            self.assertFalse(warmup.is_server_process(["manage.py", "runserver"]))
+
+    def test_failed_warm_up_is_logged(self):
+        with mock.patch.object(warmup, "preload", side_effect=ImportError("no umap")), \
+                self.assertLogs(warmup.logger, "ERROR"):
+            warmup.warm_up()
+
+    def test_api_imports_within_the_budget(self):
+        output = io.StringIO()
+
+        call_command("check_import_time", runs=1, budget=60.0, stdout=output)
+
+        self.assertIn("Importing backend.api.urls took", output.getvalue())
+
+    def test_heavy_imports_fail_the_check(self):
+        measured = {"elapsed": 0.1, "modules": ["umap.umap_"], "slowest": []}
+        with mock.patch.object(CheckImportTimeCommand, "measure", return_value=measured):
+            with self.assertRaisesMessage(CommandError, "umap.umap_"):
+                call_command("check_import_time", runs=1, stdout=io.StringIO())
+
+
+class SuggestFeatureViewsTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        x = np.arange(20, dtype=np.float64)
+        frame = pd.DataFrame({"x": x, "twice_x": 2 * x, "noise": np.sin(x), "label": ["a", "b"] * 10})
+        self.dataset = Dataset(name="d", features=list(frame.columns))
+        self.dataset.set_dataframe(frame)
+        self.dataset.save()
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type="application/json")
+
+    def test_dropping_reads_the_dataset(self):
+        response = self.post("/api/suggest_feature_dropping/", {"dataset_id": self.dataset.id})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["features_to_drop"], ["twice_x"])
+
+    def test_combining_reads_the_dataset(self):
+        response = self.post("/api/suggest_feature_combining/", {"dataset_id": self.dataset.id})
+
+        self.assertEqual(response.status_code, 200)
+        combinations = response.json()["feature_combinations"]
+        self.assertEqual([pair["features"] for pair in combinations], [["x", "twice_x"]])
+        self.assertAlmostEqual(combinations[0]["correlation"], 1.0)
+
+    def test_unknown_dataset(self):
+        response = self.post("/api/suggest_feature_dropping/", {"dataset_id": self.dataset.id + 1})
+
+        self.assertEqual(response.status_code, 404)
+
+
+class CorrelationTests(StorageTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(5)
+        x = rng.normal(size=200)
+        self.frame = pd.DataFrame({"a": x, "b": x + rng.normal(scale=0.1, size=200), "c": rng.normal(size=200),
+                                   "d": np.round(x * 2), "e": -x})
+        self.frame.iloc[::9, 2] = np.nan
+
+    def test_correlated_pairs_match_pandas(self):
+        expected = self.frame.corr().abs().to_numpy()
+        first, second, values = correlation.correlated_pairs(self.frame, 0.9, block_columns=2)
+
+        pairs = list(zip(first.tolist(), second.tolist()))
+        self.assertEqual(pairs, [(i, j) for i in range(5) for j in range(i + 1, 5) if expected[i, j] > 0.9])
+        np.testing.assert_allclose(np.abs(values), [expected[i, j] for i, j in pairs])
+
+    def test_top_k_keeps_the_strongest_pairs(self):
+        first, second, values = correlation.correlated_pairs(self.frame, 0.5, top_k=1)
+
+        self.assertEqual((first.tolist(), second.tolist()), ([0], [4]))
+        self.assertAlmostEqual(values[0], -1.0)
+
+    def test_spearman_from_stored_ranks_matches_pandas(self):
+        dataset = Dataset(name="d", features=list(self.frame.columns))
+        dataset.set_dataframe(self.frame)
+        dataset.save()
+
+        matrix = correlation.spearman_matrix(dataset.get_ranks(list(self.frame.columns)))
+
+        pd.testing.assert_frame_equal(matrix, self.frame.corr(method="spearman"))
+
+
+class KendallTests(TestCase):
+
+    def test_matches_pandas(self):
+        rng = np.random.default_rng(2)
+        frame = pd.DataFrame(rng.integers(0, 5, size=(200, 4)).astype(np.float64), columns=list("abcd"))
+        frame.iloc[::7, 1] = np.nan
+
+        pd.testing.assert_frame_equal(correlation.kendall_matrix(frame), frame.corr(method="kendall"))
+
+    def test_matches_scipy_tau_b(self):
+        from scipy.stats import kendalltau
+
+        rng = np.random.default_rng(3)
+        x, y = rng.integers(0, 4, size=500).astype(np.float64), rng.normal(size=500).round(1)
+
+        matrix = correlation.kendall_matrix(pd.DataFrame({"x": x, "y": y}), n_jobs=1)
+
+        self.assertAlmostEqual(matrix.loc["x", "y"], kendalltau(x, y, variant="b").statistic)
+
+    def test_worker_count_is_clamped_to_the_cpus(self):
+        cpus = os.cpu_count() or 1
+
+        self.assertEqual(correlation.worker_count(None), cpus)
+        self.assertEqual(correlation.worker_count("100000"), cpus)
+        self.assertEqual(correlation.worker_count(0), 1)
+        with self.assertRaises(ValueError):
+            correlation.worker_count("all")
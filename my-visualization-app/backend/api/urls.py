@@ -2,7 +2,8 @@ from django.urls import path
 from .views import DataVisualizationView, OversampleDataView, SuggestFeatureCombiningView, SuggestFeatureDroppingView, \
     ApplyPcaView, HandleUserActionView, ExportLogView, ExtrapolateView, FitCurveView, InterpolateView, \
     CorrelationView, DimensionalReductionView, DatasetDetailView, DatasetColumnsView, \
-    DeleteFeatureView, UploadView, ChangeDataView, DownloadView, RecommendDimReductionView
+    DeleteFeatureView, RestoreFeatureView, UploadView, IngestionJobView, ChangeDataView, DownloadView, RecommendDimReductionView, StatsView, \
+    SeriesView, AddDataView
 from backend.api.views.dataset_views import CreateDatasetView
 from .views.read_views import FindLettersView
 
@@ -10,8 +11,9 @@ from .views.read_views import FindLettersView
 urlpatterns = [
     path('visualize/', DataVisualizationView.as_view(), name='visualize'),
     path('upload/', UploadView.as_view(), name='upload'),
+    path('upload_jobs/<int:job_id>/', IngestionJobView.as_view(), name='upload_job'),
     path('download/<int:dataset_id>/<str:file_format>/', DownloadView.as_view(), name='download_dataset'),
-    # path("add_data/", AddDataView.as_view(), name = "add_data"),
+    path("add_data/", AddDataView.as_view(), name = "add_data"),
     path("apply_pca/", ApplyPcaView.as_view(), name = "apply_pca"),
     path("suggest_feature_dropping/", SuggestFeatureDroppingView.as_view(), name = "suggest_feature_dropping"),
     path("suggest_feature_combining/", SuggestFeatureCombiningView.as_view(), name = "suggest_feature_combining"),
@@ -21,6 +23,7 @@ urlpatterns = [
     path('interpolate/', InterpolateView.as_view(), name='interpolate'),
     path('extrapolate/', ExtrapolateView.as_view(), name='extrapolate'),
     path('correlation/', CorrelationView.as_view(), name='correlation'),
+    path('series/', SeriesView.as_view(), name='series'),
     path('dimensional_reduction/', DimensionalReductionView.as_view(), name='dimensional_reduction'),
     path('recommend_dim_reduction/', RecommendDimReductionView.as_view(), name='recommend_dim_reduction'),
     path('oversample_data/', OversampleDataView.as_view(), name='oversample_data'),
@@ -29,6 +32,8 @@ urlpatterns = [
     path('dataset/<int:dataset_id>/columns/', DatasetColumnsView.as_view(), name='dataset-columns'),
     path('change_data/', ChangeDataView.as_view(), name='change-data'),
     path('delete_feature/', DeleteFeatureView.as_view(), name='delete_feature'),
+    path('restore_feature/', RestoreFeatureView.as_view(), name='restore_feature'),
     path('create_dataset/', CreateDatasetView.as_view(), name = 'creat_dataset'),
     path('find-letters/', FindLettersView.as_view(), name='find_letters'),
+    path('stats/', StatsView.as_view(), name='stats'),
 ]
@@ -1,22 +1,26 @@
 from .data_visualization_view import DataVisualizationView
 from .handle_user_action_view import HandleUserActionView
-from .upload_view import UploadView
+from .upload_view import UploadView, IngestionJobView
 from .download_view import DownloadView
-from .dataset_views import DatasetColumnsView, DatasetDetailView, DeleteFeatureView, ChangeDataView
+from .dataset_views import DatasetColumnsView, DatasetDetailView, DeleteFeatureView, RestoreFeatureView, ChangeDataView, \
+    AddDataView
 from .upload_dataset_view import UploadDatasetView
 from .export_log_view import ExportLogView
+from .stats_view import StatsView
 from .processing_views import (InterpolateView, ExtrapolateView, CorrelationView, FitCurveView,
                                DimensionalReductionView, OversampleDataView, ApplyPcaView, SuggestFeatureCombiningView,
-                               SuggestFeatureDroppingView, RecommendDimReductionView)
+                               SuggestFeatureDroppingView, RecommendDimReductionView, SeriesView)
 
 __all__ = [
     "UploadDatasetView",
     "HandleUserActionView",
     "DataVisualizationView",
     "UploadView",
+    "IngestionJobView",
     "DatasetDetailView",
     "DatasetColumnsView",
     "DeleteFeatureView",
+    "RestoreFeatureView",
     "ChangeDataView",
     "DimensionalReductionView",
     "RecommendDimReductionView",
@@ -24,11 +28,13 @@ __all__ = [
     "OversampleDataView",
     "SuggestFeatureCombiningView",
     "SuggestFeatureDroppingView",
-    # "AddDataView",
+    "AddDataView",
     "ExtrapolateView",
     "InterpolateView",
     "CorrelationView",
+    "SeriesView",
     "FitCurveView",
     "ExportLogView",
     "DownloadView",
+    "StatsView",
 ]
\ No newline at end of file
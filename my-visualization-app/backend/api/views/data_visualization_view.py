@@ -1,9 +1,22 @@
+from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.views import APIView
 import pandas as pd
 
+from backend.api.models import Dataset
+
+APPROXIMATE_VALUES = ("1", "true")
+
 class DataVisualizationView(APIView):
     def post(self, request):
+        # A stored dataset is summarised from its precomputed profile, without reading its rows
+        dataset_id = request.data.get("dataset_id")
+        if dataset_id:
+            dataset = get_object_or_404(Dataset, id=dataset_id)
+            # approximate=true adds sketch based quantiles and distinct counts with their error bounds
+            approximate = str(request.data.get("approximate", "")).lower() in APPROXIMATE_VALUES
+            return Response(dataset.summary(approximate=approximate))
+
         # Getting data
         data = request.data.get("data", [])
         if not data:
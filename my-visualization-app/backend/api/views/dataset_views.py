@@ -4,25 +4,74 @@ from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
 
 from backend.api.serializers import DatasetSerializer
+from backend.api.json_response import FastJsonResponse, get_layout
+from backend.server_handler import column_store
 from django.http import JsonResponse
 from backend.api.models import Dataset
 from rest_framework.views import APIView
 import json
 
+WINDOW_PARAMS = ("offset", "limit", "columns", "sort_by")
+DEFAULT_WINDOW_LIMIT = 100
+MAX_WINDOW_LIMIT = 10_000
+TOTAL_COUNT_HEADER = "X-Total-Count"
+INVALID_WINDOW = "offset must be >= 0 and limit between 0 and {}"
+
 
 class DatasetDetailView(APIView):
     """
-    Get full dataset (data + column names)
+    Get full dataset (data + column names).
+
+    With any of `offset`, `limit`, `columns` (comma separated) or `sort_by` (+ `order=desc`) in the
+    query string, only that window of rows is read and returned in an envelope with the total row
+    count and the schema; the total is also sent as the X-Total-Count header.
     """
 
     def get(self, request, dataset_id):
         try:
             dataset = Dataset.objects.get(id=dataset_id)
-            serializer = DatasetSerializer(dataset)
-            print("this works")
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            if not any(param in request.GET for param in WINDOW_PARAMS):
+                serializer = DatasetSerializer(dataset)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._window(request, dataset)
         except Dataset.DoesNotExist:
             return Response({"error": "Dataset not found7"}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+    @staticmethod
+    def _window(request, dataset):
+        offset = int(request.GET.get("offset", 0))
+        limit = int(request.GET.get("limit", DEFAULT_WINDOW_LIMIT))
+        if offset < 0 or not 0 <= limit <= MAX_WINDOW_LIMIT:
+            raise ValueError(INVALID_WINDOW.format(MAX_WINDOW_LIMIT))
+        columns = None
+        if "columns" in request.GET:
+            columns = [name for value in request.GET.getlist("columns") for name in value.split(",") if name]
+        sort_by = request.GET.get("sort_by") or None
+        descending = request.GET.get("order", "asc").lower() == "desc"
+        layout = get_layout(request)
+
+        window = dataset.get_window(offset, limit, columns=columns, sort_by=sort_by, descending=descending)
+        schema = column_store.manifest_schema(dataset.column_manifest)
+        total_rows = dataset.num_rows
+
+        response = FastJsonResponse({
+            "id": dataset.id,
+            "name": dataset.name,
+            "features": dataset.features,
+            "total_rows": total_rows,
+            "schema": {name: schema.get(name) for name in window.columns},
+            "offset": offset,
+            "limit": limit,
+            "sort_by": sort_by,
+            "order": "desc" if descending else "asc",
+            # Position of every returned row in the stored table, e.g. for editing cells
+            "row_positions": window.index.to_numpy(),
+            "records": window
+        }, layout=layout)
+        response[TOTAL_COUNT_HEADER] = str(total_rows)
+        return response
         
 
 
@@ -65,6 +114,15 @@ class ChangeDataView(APIView):
         if "records" in modifications:
             new_dataset.records = modifications["records"]
 
+        # Modify single columns or cells, the untouched columns stay shared with the previous version
+        try:
+            if "columns" in modifications:
+                new_dataset.update_columns(modifications["columns"])
+            if "cells" in modifications:
+                new_dataset.update_cells(modifications["cells"])
+        except (KeyError, IndexError, ValueError) as e:
+            return JsonResponse({"error": f"Invalid modifications: {e}"}, status=400)
+
         new_dataset.save()
 
         return JsonResponse({
@@ -93,17 +151,12 @@ class DeleteFeatureView(APIView):
         # Copy the dataset to maintain modification history
         #new_dataset = original_dataset.copy_dataset(new_name=f"{original_dataset.name}_modified")
 
-        # Keep only the features that are not being removed
+        # Keep only the features that are not being removed.
+        # The column files stay untouched (so the feature can be restored) until `compact_datasets` runs.
         original_dataset.features = [f for f in original_dataset.features if f not in features_to_remove]
 
-        # Remove the corresponding feature values from records
-        original_dataset.records = [
-            {k: v for k, v in record.items() if k in original_dataset.features}  # Keep only the remaining features
-            for record in original_dataset.records
-        ]
-
          # Save the modified dataset
-        original_dataset.save()
+        original_dataset.save(update_fields=["features"])
 
 
         return JsonResponse({
@@ -111,6 +164,70 @@ class DeleteFeatureView(APIView):
             "dataset_id": original_dataset.id
         })
 
+
+class RestoreFeatureView(APIView):
+    def post(self, request):
+        """
+        Undo a feature deletion, as long as the column has not been compacted away.
+        """
+        data = json.loads(request.body)
+        dataset_id = data.get("dataset_id")
+        features_to_restore = data.get("features_to_restore", [])
+
+        if not dataset_id or not features_to_restore:
+            return JsonResponse({"error": "Missing dataset_id or features_to_restore"}, status=400)
+
+        dataset = get_object_or_404(Dataset, id=dataset_id)
+
+        missing = [f for f in features_to_restore if f not in dataset.stored_features]
+        if missing:
+            return JsonResponse({"error": f"Feature(s) no longer stored: {missing}"}, status=400)
+
+        # Put the features back in their original column order
+        restored = set(dataset.features) | set(features_to_restore)
+        dataset.features = [f for f in dataset.stored_features if f in restored]
+        dataset.save(update_fields=["features"])
+
+        return JsonResponse({
+            "message": "Feature(s) restored successfully",
+            "dataset_id": dataset.id,
+            "features": dataset.features
+        })
+
+class AddDataView(APIView):
+    def post(self, request):
+        """
+        Append rows to a dataset, e.g. {"dataset_id": 1, "records": [{"age": 25, "salary": 50000}]}.
+        Features missing from a record get a missing value; the statistics are updated with the new rows only.
+        """
+        data = json.loads(request.body)
+        dataset_id = data.get("dataset_id")
+        records = data.get("records", [])
+        if isinstance(records, dict):
+            records = [records]
+
+        if not dataset_id or not records:
+            return JsonResponse({"error": "Missing dataset_id or records"}, status=400)
+        if not isinstance(records, list) or not all(isinstance(row, dict) for row in records):
+            return JsonResponse({"error": "Records must be a list of dictionaries."}, status=400)
+
+        dataset = get_object_or_404(Dataset, id=dataset_id)
+        unknown = [name for row in records for name in row if name not in dataset.features]
+        if unknown:
+            return JsonResponse({"error": f"Unknown feature(s): {list(dict.fromkeys(unknown))}"}, status=400)
+
+        try:
+            dataset.append_records(records)
+        except ValueError as e:
+            return JsonResponse({"error": f"Invalid records: {e}"}, status=400)
+        dataset.save(update_fields=["column_manifest"])
+
+        return JsonResponse({
+            "message": "The data is added",
+            "dataset_id": dataset.id,
+            "num_rows": dataset.num_rows
+        })
+
 class CreateDatasetView(APIView):
     def post(self, request):
         try:
@@ -1,53 +1,207 @@
 import io
+import json
+import os
+import tempfile
+
 from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
 
+from backend.server_handler import column_store
 from backend.server_handler.log_manager import export_logs
-from django.http import JsonResponse, HttpResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
 from backend.api.models import Dataset
 from rest_framework.views import APIView
-import json
+import numpy as np
 import pandas as pd
+import xlsxwriter
+
+# pyarrow is optional, only the parquet and arrow exports need it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+DEFAULT_EXPORT_BATCH_ROWS = 50_000
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class _StreamSink(object):
+    """
+    Write-only file object for pyarrow writers; the generator drains what was written after each batch
+    """
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _TemporaryExport(io.FileIO):
+    """
+    Read-only handle of a generated export file, the file is removed once the handle is closed.
+    FileResponse closes it after the response is sent, so this also works where open files cannot be deleted.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, "rb")
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if os.path.exists(self.name):
+                os.remove(self.name)
+
+
+def _arrow_schema(dataset):
+    # Typed columns keep their numpy dtype, JSON line columns are exported as strings
+    fields = []
+    for name, dtype in column_store.manifest_schema(dataset.column_manifest).items():
+        if name not in dataset.features:
+            continue
+        arrow_type = pa.string() if dtype == "object" else pa.from_numpy_dtype(np.dtype(dtype))
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_batch(batch, schema):
+    for field in schema:
+        if pa.types.is_string(field.type):
+            batch[field.name] = [value if value is None or isinstance(value, str) else json.dumps(value, default=str)
+                                 for value in batch[field.name]]
+    return pa.RecordBatch.from_pandas(batch, schema=schema, preserve_index=False)
 
 
 class DownloadView(APIView):
+    """
+    Stream a dataset as csv, json, ndjson, xlsx, parquet or arrow (IPC stream), batch by batch
+    """
+
     def get(self, request, dataset_id, file_format, *args, **kwargs):
 
         # Get the specified dataset
         dataset = get_object_or_404(Dataset, id=dataset_id)
-
-        # Ensure that `features` and `records` exist.
-        features = dataset.features if hasattr(dataset, "features") else []
-        records = dataset.records if hasattr(dataset, "records") else []
-
-        df = pd.DataFrame(records, columns=features)
+        batch_rows = getattr(settings, "EXPORT_BATCH_ROWS", DEFAULT_EXPORT_BATCH_ROWS)
 
         if file_format == "csv":
-            response = HttpResponse(content_type='text/csv')
-            response['Content-Disposition'] = f'attachment; filename="{dataset.name}.csv"'
-            df.to_csv(response, index=False)
+            response = StreamingHttpResponse(self._csv_stream(dataset, batch_rows), content_type=CONTENT_TYPES["csv"])
         elif file_format == "json":
-            response = HttpResponse(json.dumps(records, indent=2), content_type='application/json')
-            response['Content-Disposition'] = f'attachment; filename="{dataset.name}.json"'
+            response = StreamingHttpResponse(self._json_stream(dataset, batch_rows), content_type=CONTENT_TYPES["json"])
+        elif file_format == "ndjson":
+            response = StreamingHttpResponse(self._ndjson_stream(dataset, batch_rows), content_type=CONTENT_TYPES["ndjson"])
         elif file_format == "xlsx":
             try:
-                # Use `BytesIO()` as Excel file buffer
-                output = io.BytesIO()
-                with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                    df.to_excel(writer, index=False, sheet_name="Data")
-
-                # Returning the stream to its starting position
-                output.seek(0)
-
-                # Generate HttpResponse
-                response = HttpResponse(output.getvalue(),
-                                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                response['Content-Disposition'] = f'attachment; filename="{dataset.name}.xlsx"'
-                return response
+                response = FileResponse(self._xlsx_file(dataset, batch_rows), content_type=CONTENT_TYPES["xlsx"])
             except Exception as e:
                 print(f"Excel generation error: {e}")
                 return JsonResponse({"error": f"Failed to generate Excel file: {str(e)}"}, status=500)
+        elif file_format in ("parquet", "arrow"):
+            if pa is None:
+                return JsonResponse({"error": f"Exporting {file_format} requires pyarrow to be installed"}, status=501)
+            stream = self._parquet_stream if file_format == "parquet" else self._arrow_stream
+            response = StreamingHttpResponse(stream(dataset, batch_rows), content_type=CONTENT_TYPES[file_format])
         else:
             return JsonResponse({"error": "Unsupported format"}, status=400)
 
+        response['Content-Disposition'] = f'attachment; filename="{dataset.name}.{file_format}"'
         return response
+
+    @staticmethod
+    def _csv_stream(dataset, batch_rows):
+        header = True
+        for batch in dataset.iter_batches(batch_rows=batch_rows):
+            yield batch.to_csv(index=False, header=header)
+            header = False
+        if header:
+            # Empty dataset: still send the column names
+            yield pd.DataFrame(columns=dataset.features).to_csv(index=False)
+
+    @staticmethod
+    def _json_stream(dataset, batch_rows):
+        # One JSON array of records, written a batch at a time
+        yield "["
+        separator = ""
+        for batch in dataset.iter_batches(batch_rows=batch_rows):
+            records = batch.to_json(orient="records", date_format="iso", double_precision=15)
+            yield separator + records[1:-1]
+            separator = ","
+        yield "]"
+
+    @staticmethod
+    def _ndjson_stream(dataset, batch_rows):
+        for batch in dataset.iter_batches(batch_rows=batch_rows):
+            yield batch.to_json(orient="records", lines=True, date_format="iso", double_precision=15).rstrip("\n") + "\n"
+
+    @staticmethod
+    def _xlsx_file(dataset, batch_rows):
+        # constant_memory flushes every row to disk as soon as it is written
+        handle = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+        handle.close()
+        try:
+            workbook = xlsxwriter.Workbook(handle.name, {"constant_memory": True, "remove_timezone": True})
+            worksheet = workbook.add_worksheet("Data")
+            worksheet.write_row(0, 0, dataset.features)
+            row_number = 1
+            for batch in dataset.iter_batches(batch_rows=batch_rows):
+                batch = batch.astype(object).where(batch.notna(), None)
+                for row in batch.itertuples(index=False, name=None):
+                    worksheet.write_row(row_number, 0, row)
+                    row_number += 1
+            workbook.close()
+        except Exception:
+            os.remove(handle.name)
+            raise
+        # The file is removed when the response closes the handle
+        return _TemporaryExport(handle.name)
+
+    @staticmethod
+    def _parquet_stream(dataset, batch_rows):
+        sink = _StreamSink()
+        schema = _arrow_schema(dataset)
+        with pq.ParquetWriter(sink, schema) as writer:
+            for batch in dataset.iter_batches(batch_rows=batch_rows):
+                # Each batch becomes its own row group, so it can be sent right away
+                writer.write_batch(_arrow_batch(batch, schema))
+                yield sink.drain()
+        yield sink.drain()
+
+    @staticmethod
+    def _arrow_stream(dataset, batch_rows):
+        sink = _StreamSink()
+        schema = _arrow_schema(dataset)
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in dataset.iter_batches(batch_rows=batch_rows):
+                writer.write_batch(_arrow_batch(batch, schema))
+                yield sink.drain()
+        yield sink.drain()
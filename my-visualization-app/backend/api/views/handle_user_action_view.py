@@ -1,10 +1,14 @@
 
 from django.utils.decorators import method_decorator
 from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from backend.api.models import Dataset
 from rest_framework.views import APIView
 import json
 import pandas as pd
 
+APPROXIMATE_VALUES = ("1", "true")
+
 
 class HandleUserActionView(APIView):
     def post(self, request):
@@ -27,6 +31,14 @@ class HandleUserActionView(APIView):
                 }
                 return JsonResponse(summary, status=200)
             elif action == "process_data":
+                # A stored dataset is summarised from its precomputed profile
+                dataset_id = parameters.get("dataset_id")
+                if dataset_id:
+                    dataset = get_object_or_404(Dataset, id=dataset_id)
+                    approximate = str(parameters.get("approximate", "")).lower() in APPROXIMATE_VALUES
+                    return JsonResponse({"message": "Data processed successfully",
+                                         "result": dataset.summary(approximate=approximate)}, status=200)
+
                 data = parameters.get("data", [])
                 if not data:
                     return JsonResponse({"error": "No data provided for processing"}, status=400)
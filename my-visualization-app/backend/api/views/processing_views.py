@@ -1,14 +1,23 @@
 
 from django.utils.decorators import method_decorator
 from django.shortcuts import get_object_or_404
-from backend.server_handler.engine import Engine
+from backend.server_handler.engine import Engine, PCA_METHOD, PCA_SOLVER_AUTO, PCA_SOLVER_INCREMENTAL, ERROR_NUMERIC_DATA, \
+    TSNE_METHOD, TSNE_PERPLEXITY, TSNE_GRADIENT_AUTO, TSNE_PCA_COMPONENTS, UMAP_METHOD, UMAP_N_NEIGHBOR, \
+    UMAP_DEFAULT_NEIGHBORS
+from backend.server_handler import model_store, correlation
+from backend.server_handler.downsampling import downsample, LTTB_METHOD
 from django.http import JsonResponse
-from backend.api.models import UploadedFile, Dataset
+from backend.api.json_response import FastJsonResponse, get_layout
+from backend.api.models import Dataset
 from rest_framework.views import APIView
 import json
+import time
 import pandas as pd
 import numpy as np
 
+# Column dtypes the dimensionality reductions work on, the ones select_dtypes("number") keeps
+REDUCTION_DTYPE_KINDS = "iufc"
+
 
 class FitCurveView(APIView):
     def post(self, request):
@@ -22,7 +31,9 @@ class FitCurveView(APIView):
             degree = params.get("degree", 2)
             initial_params = params.get("initial_params", None)
             dataset_id = params.get("datasetId")
-            print(dataset_id)
+            max_points = params.get("max_points")  # Optional, downsample original_data to this many points
+            downsample_method = params.get("downsample_method", LTTB_METHOD)
+            layout = get_layout(request, body)
             # Ensure dataset_id is provided
             if not dataset_id:
                 return JsonResponse({"error": "Dataset ID is required"}, status=400)
@@ -32,8 +43,8 @@ class FitCurveView(APIView):
                 #dataset = Dataset.objects.order_by("-id").first()
             #else:
             dataset = get_object_or_404(Dataset, id=dataset_id)
-            # Convert dataset to Pandas DataFrame
-            dataset_df = dataset.get_dataframe()
+            # Memory-map only the two columns used by the fit
+            dataset_df = dataset.get_dataframe(columns=[x_feature, y_feature], mmap=True)
             # Ensure required features exist in the dataset
             if x_feature not in dataset_df.columns or y_feature not in dataset_df.columns:
                 return JsonResponse({"error": "Specified features not found in dataset"}, status=400)
@@ -46,15 +57,18 @@ class FitCurveView(APIView):
                 degree=degree,
                 initial_params=initial_params
             )
+            if params is None:
+                return JsonResponse({"error": "Curve fitting failed"}, status=400)
             # Create original data array with x_feature and y_feature values
-            original_data = dataset_df[[x_feature, y_feature]].rename(columns={x_feature: 'x', y_feature: 'y'}).to_dict(
-                orient='records')
-            return JsonResponse({
-                "params": params.tolist(),
-                "covariance": covariance.tolist() if covariance is not None else None,
-                "generated_data": fitted_data.to_dict(orient='records'),
+            original_data = dataset_df[[x_feature, y_feature]].rename(columns={x_feature: 'x', y_feature: 'y'})
+            if max_points:
+                original_data = downsample(original_data, 'x', 'y', max_points, method=downsample_method)
+            return FastJsonResponse({
+                "params": params,
+                "covariance": covariance,
+                "generated_data": fitted_data,
                 "original_data": original_data
-            })
+            }, layout=layout)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
 
@@ -73,6 +87,7 @@ class InterpolateView(APIView):
             min_value = body.get("minValue", None)  # Minimum x value for interpolation (optional)
             max_value = body.get("maxValue", None)  # Maximum x value for interpolation (optional)
             new_dataset_name = body.get("new_dataset_name", "Interpolated Dataset")
+            layout = get_layout(request, body)
 
             # Ensure dataset_id is provided
             if not dataset_id:
@@ -81,8 +96,8 @@ class InterpolateView(APIView):
             # Get the dataset object
             dataset = get_object_or_404(Dataset, id=dataset_id)
 
-            # Convert dataset to Pandas DataFrame
-            dataset_df = dataset.get_dataframe()
+            # Memory-map only the two columns used by the interpolation
+            dataset_df = dataset.get_dataframe(columns=[x_feature, y_feature], mmap=True)
             # Perform interpolation
             interpolated_data = Engine.interpolate(
                 dataset_df,
@@ -107,9 +122,9 @@ class InterpolateView(APIView):
             )
             """
             # Return the interpolated data in JSON format
-            return JsonResponse({"interpolated_data": interpolated_data.to_dict(orient='records')
+            return FastJsonResponse({"interpolated_data": interpolated_data
             #, "new_dataset_id": new_dataset.id
-            })
+            }, layout=layout)
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -128,6 +143,9 @@ class ExtrapolateView(APIView):
             method = request_data.get('kind')
             extrapolate_range = request_data.get('params', {}).get('extrapolateRange', [])
             new_dataset_name = request_data.get("new_dataset_name", "Extrapolated Dataset")
+            max_points = request_data.get("max_points")  # Optional, downsample original_data to this many points
+            downsample_method = request_data.get("downsample_method", LTTB_METHOD)
+            layout = get_layout(request, request_data)
 
             # Ensure that the request data is valid
             if not dataset_id or not x_feature or not y_feature or not method or not extrapolate_range:
@@ -135,9 +153,8 @@ class ExtrapolateView(APIView):
 
             # Retrieve the dataset
             dataset = Dataset.objects.get(id=dataset_id)
-            # Convert dataset to Pandas DataFrame
-            dataset_df = dataset.get_dataframe()
-            print(1)
+            # Convert dataset to Pandas DataFrame, memory-mapped since the whole table goes back as original_data
+            dataset_df = dataset.get_dataframe(mmap=True)
 
             # Call the extrapolate function to perform extrapolation
             extrapolated_data = Engine.extrapolate(
@@ -164,13 +181,15 @@ class ExtrapolateView(APIView):
             )
             """
 
-            # Convert the DataFrame to a dictionary and return it to the frontend
-            result = extrapolated_data.to_dict(orient='records')
+            original_data = dataset_df
+            if max_points:
+                original_data = downsample(dataset_df, x_feature, y_feature, max_points, method=downsample_method)
 
-            return JsonResponse({"original_data": dataset_df.to_dict(orient='records'),
-                "extrapolated_data": result,
+            # The DataFrames are encoded directly, without a dict per row
+            return FastJsonResponse({"original_data": original_data,
+                "extrapolated_data": extrapolated_data,
                 #"new_dataset_id": new_dataset.id
-            })
+            }, layout=layout)
 
         except Exception as e:
             # Catch exceptions and return an error message
@@ -178,6 +197,47 @@ class ExtrapolateView(APIView):
 
 
 
+class SeriesView(APIView):
+    """
+    The (x, y) points of two columns for a chart, optionally downsampled to `max_points` (LTTB or min/max)
+    """
+
+    def get(self, request):
+        try:
+            dataset_id = request.GET.get("dataset_id")
+            x_feature = request.GET.get("x_feature")
+            y_feature = request.GET.get("y_feature")
+            max_points = request.GET.get("max_points")
+            method = request.GET.get("method", LTTB_METHOD)
+            layout = get_layout(request)
+
+            if not dataset_id or not x_feature or not y_feature:
+                return JsonResponse({"error": "dataset_id, x_feature and y_feature are required"}, status=400)
+
+            dataset = get_object_or_404(Dataset, id=dataset_id)
+            # Memory-map only the two plotted columns
+            dataset_df = dataset.get_dataframe(columns=[x_feature, y_feature], mmap=True)
+            if x_feature not in dataset_df.columns or y_feature not in dataset_df.columns:
+                return JsonResponse({"error": "Specified features not found in dataset"}, status=400)
+
+            series = dataset_df[[x_feature, y_feature]]
+            if max_points:
+                series = downsample(series, x_feature, y_feature, max_points, method=method)
+
+            return FastJsonResponse({
+                "x_feature": x_feature,
+                "y_feature": y_feature,
+                "total_points": len(dataset_df),
+                "returned_points": len(series),
+                "data": series
+            }, layout=layout)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=500)
+
+
+
 class CorrelationView(APIView):
     def post(self, request):
         try:
@@ -194,23 +254,31 @@ class CorrelationView(APIView):
             # Getting the dataset object
             dataset = get_object_or_404(Dataset, id=dataset_id)  # 用 `id` 代替 `dataset_id`
 
-            # Converting a dataset to a Pandas DataFrame
-            df = dataset.get_dataframe()
-
-            # Ensure that the selected columns are in the DataFrame
-            if not all(feature in df.columns for feature in selected_features):
+            # Ensure that the selected columns are in the dataset
+            if not all(feature in dataset.features for feature in selected_features):
                 return JsonResponse({"error": "One or more selected features are missing from the dataset"}, status=400)
 
-            # Calculate the correlation matrix
-            correlation_matrix = df[selected_features].corr(method=method)
+            numeric = all(feature in dataset.numeric_features for feature in selected_features)
+            # Pearson on numeric features comes from the stored co-moments, without reading the data
+            if method == "pearson" and numeric:
+                correlation_matrix = dataset.get_comoments(selected_features).correlation()
+            # Spearman on numeric features is a Pearson on the ranks stored next to each column
+            elif method == "spearman" and numeric:
+                correlation_matrix = correlation.spearman_matrix(dataset.get_ranks(selected_features))
+            elif method == "kendall":
+                df = dataset.get_dataframe(columns=selected_features)
+                correlation_matrix = correlation.kendall_matrix(df[selected_features], n_jobs=body.get("n_jobs"))
+            else:
+                df = dataset.get_dataframe(columns=selected_features)
+                correlation_matrix = df[selected_features].corr(method=method)
 
             # Convert correlation matrix to JSON format
             result = {
                 "columns": correlation_matrix.columns.tolist(),  # Column names for X/Y axis
-                "values": correlation_matrix.values.tolist(),  # Value of the correlation matrix
+                "values": correlation_matrix.values,  # Value of the correlation matrix
             }
 
-            return JsonResponse({"correlation_matrix": result})
+            return FastJsonResponse({"correlation_matrix": result})
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
@@ -226,6 +294,8 @@ class DimensionalReductionView(APIView):
             method = body.get("method", "pca").lower()
             n_components = body.get("n_components", 2)
             new_dataset_name = body.get("new_dataset_name", "Reduced Dataset")
+            solver = body.get("solver", PCA_SOLVER_AUTO).lower()  # PCA only: auto, full, randomized or incremental
+            layout = get_layout(request, body)
 
             # Ensure dataset_id exists
             if not dataset_id:
@@ -237,28 +307,73 @@ class DimensionalReductionView(APIView):
                 return JsonResponse({"error": f"Dataset with ID {dataset_id} not found or invalid."}, status=404)
 
             # Get DataFrame
-            if not dataset.features or not dataset.records:
+            if not dataset.features or not dataset.num_rows:
                 return JsonResponse({"error": "Dataset is empty or invalid."}, status=400)
 
-            dataset_df = pd.DataFrame(dataset.records, columns=dataset.features)
-
-            # do dim reduction
-            reduced_data = Engine.dimensional_reduction(
-                dataset_df,
-                method=method,
-                n_components=n_components
-            )
+            # The solver is chosen from the stored shape, before anything is loaded
+            numeric_features = dataset.typed_features(REDUCTION_DTYPE_KINDS)
+            if method in (PCA_METHOD, TSNE_METHOD, UMAP_METHOD) and not numeric_features:
+                return JsonResponse({"error": ERROR_NUMERIC_DATA}, status=400)
+            if method != PCA_METHOD:
+                solver = None
+            elif solver == PCA_SOLVER_AUTO:
+                solver = Engine.choose_pca_solver(dataset.num_rows, len(numeric_features), n_components)
+
+            summary = {}
+            start = time.perf_counter()
+            if method == PCA_METHOD:
+                # The decomposition is kept per set of column files: other n_components on the same data
+                # (or another version sharing the columns) slice it instead of fitting again
+                model_key = model_store.model_key(PCA_METHOD, dataset.column_keys(numeric_features), {"solver": solver})
+                if solver == PCA_SOLVER_INCREMENTAL:
+                    # Too big for memory: stream the numeric columns from the column store
+                    reduced_data, summary = Engine.reduce_pca_batches(
+                        lambda: dataset.iter_batches(numeric_features), n_components, model_key, dataset.num_rows)
+                else:
+                    reduced_data, summary = Engine.reduce_pca(
+                        dataset.get_dataframe(columns=numeric_features), n_components, solver, model_key)
+            elif method == TSNE_METHOD:
+                stratify_by = body.get("stratify_by")
+                if stratify_by and stratify_by not in dataset.features:
+                    return JsonResponse({"error": f"stratify_by: feature '{stratify_by}' not found in dataset."}, status=400)
+                # The neighbour graph is shared with UMAP through the column files it was built on
+                reduced_data, summary = Engine.reduce_tsne(
+                    dataset.get_dataframe(columns=numeric_features), n_components,
+                    knn_inputs=dataset.column_keys(numeric_features), **self._tsne_options(body, dataset))
+            elif method == UMAP_METHOD:
+                # One model per dataset and settings, kept across appends; a new version starts from the
+                # model of the previous one and only projects the rows it does not know
+                n_neighbors = int(body.get(UMAP_N_NEIGHBOR, UMAP_DEFAULT_NEIGHBORS))
+                params = {"features": numeric_features, "n_components": n_components, UMAP_N_NEIGHBOR: n_neighbors}
+                model_keys = [model_store.model_key(UMAP_METHOD, [dataset_pk], params)
+                              for dataset_pk in (dataset.pk, dataset.last_dataset_id) if dataset_pk is not None]
+                reduced_data, summary = Engine.reduce_umap(
+                    dataset.get_dataframe(columns=numeric_features), n_components, n_neighbors, model_keys,
+                    knn_inputs=dataset.column_keys(numeric_features))
+            else:
+                dataset_df = dataset.get_dataframe(columns=dataset.features)
+
+                # do dim reduction
+                reduced_data = Engine.dimensional_reduction(
+                    dataset_df,
+                    method=method,
+                    n_components=n_components,
+                    solver=solver
+                )
+            elapsed = time.perf_counter() - start
             
             # Generate new features and records
             reduced_features = [f"dim{i+1}" for i in range(n_components)]
-            reduced_records = reduced_data.to_dict(orient="records")
             
-            return JsonResponse({
+            return FastJsonResponse({
                 "message": "Dimensionality reduction successful.",
                 #"new_dataset_id": new_dataset.id,
                 "reduced_features": reduced_features,
-                "reduced_records": reduced_records
-            }, status=200)
+                "solver": solver,
+                "elapsed_seconds": round(elapsed, 6),
+                **summary,
+                "reduced_records": reduced_data
+            }, layout=layout, status=200)
 
         except json.JSONDecodeError:
             return JsonResponse({"error": "Invalid JSON format."}, status=400)
@@ -266,6 +381,27 @@ class DimensionalReductionView(APIView):
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
 
+    @staticmethod
+    def _tsne_options(body, dataset):
+        """
+        t-SNE settings of the request: perplexity (default: the recommended one), gradient_method,
+        n_jobs, pca_components, landmarks and stratify_by (a feature the landmarks are stratified by)
+        """
+        perplexity = body.get("perplexity")
+        if perplexity is None:
+            _, parameters = Engine.recommend_dim_reduction_for(len(dataset.features))
+            perplexity = parameters.get(TSNE_METHOD, {}).get(TSNE_PERPLEXITY)
+        landmarks = body.get("landmarks")
+        stratify_by = body.get("stratify_by")
+        return {
+            "perplexity": perplexity,
+            "gradient_method": body.get("gradient_method", TSNE_GRADIENT_AUTO).lower(),
+            "n_jobs": body.get("n_jobs"),
+            "pca_components": int(body.get("pca_components", TSNE_PCA_COMPONENTS)),
+            "landmarks": None if landmarks is None else int(landmarks),
+            "strata": dataset.get_dataframe(columns=[stratify_by])[stratify_by].to_numpy() if stratify_by else None,
+        }
+
 
 
 class RecommendDimReductionView(APIView):
@@ -276,9 +412,9 @@ class RecommendDimReductionView(APIView):
                 return JsonResponse({"error": "Dataset ID is required"}, status=400)
 
             dataset = get_object_or_404(Dataset, id=dataset_id)
-            dataset_df = dataset.get_dataframe()
 
-            recommendations, parameters = Engine.recommend_dim_reduction(dataset_df)
+            # Only the number of features matters, the rows are never loaded
+            recommendations, parameters = Engine.recommend_dim_reduction_for(len(dataset.features))
 
             return JsonResponse({
                 "recommendations": recommendations,
@@ -301,6 +437,7 @@ class OversampleDataView(APIView):
             y_feature = params.get("yColumn")  # get y column from params
             method = params.get("method", "smote")  # Oversample method (default: smote)
             oversample_factor = params.get("num_samples", 1)  # Oversampling factor (default: 1)
+            layout = get_layout(request, body)
 
             # Ensure dataset_id is provided
             if not dataset_id:
@@ -309,8 +446,8 @@ class OversampleDataView(APIView):
             # Get the dataset object
             dataset = get_object_or_404(Dataset, id=dataset_id)
 
-            # Convert dataset to Pandas DataFrame
-            dataset_df = dataset.get_dataframe()
+            # Memory-map only the two columns used by the oversampler
+            dataset_df = dataset.get_dataframe(columns=[x_feature, y_feature], mmap=True)
 
             # Perform oversampling (data interpolation)
             oversampled_data = Engine.oversample_data(
@@ -321,16 +458,14 @@ class OversampleDataView(APIView):
                 oversample_factor=oversample_factor
             )
 
-            # Convert the oversampled data to a dictionary for easy JSON response
             oversampled_features = list(oversampled_data.columns)
-            oversampled_records = oversampled_data.to_dict(orient="records")
 
             # Return the oversampled data as a JSON response
-            return JsonResponse({
+            return FastJsonResponse({
                 "message": "Oversampling successful.",
                 "oversampled_features": oversampled_features,
-                "oversampled_records": oversampled_records
-            }, status=200)
+                "oversampled_records": oversampled_data
+            }, layout=layout, status=200)
         except Exception as e:
             # If any error occurs, return an error response with the exception message
             return JsonResponse({"error": str(e)}, status=400)
@@ -342,16 +477,21 @@ class ApplyPcaView(APIView):
             body = json.loads(request.body)
             dataset = body.get("dataset", [])
             n_components = body.get("n_components", 2)
+            solver = body.get("solver", PCA_SOLVER_AUTO).lower()
+            layout = get_layout(request, body)
 
             if not dataset:
                 return JsonResponse({"error": "dataset empty"}, status=400)
 
             dataset_df = pd.DataFrame(dataset)
-            transformed_df = Engine.apply_pca(dataset_df, n_components=n_components)
+            # Posted rows are not versioned, their decomposition is keyed by their content
+            model_key = model_store.model_key(PCA_METHOD, [model_store.frame_digest(dataset_df)], {"solver": solver})
+            transformed_df, pca_summary = Engine.reduce_pca(dataset_df, n_components, solver, model_key)
 
-            return JsonResponse({
-                "pca_result": transformed_df.to_dict(orient="records")
-            })
+            return FastJsonResponse({
+                "pca_result": transformed_df,
+                **pca_summary
+            }, layout=layout)
 
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=400)
@@ -364,22 +504,24 @@ class SuggestFeatureDroppingView(APIView):
             dataset_id = body.get("dataset_id")
             correlation_threshold = float(body.get("correlation_threshold", 0.95))
             variance_threshold = float(body.get("variance_threshold", 0.01))
+            dtype = correlation.correlation_dtype(body.get("dtype", "float64"))  # float32 for very wide tables
 
             if not dataset_id:
                 return JsonResponse({"error": "Missing dataset_id"}, status=400)
 
-            uploaded_file = UploadedFile.objects.get(id=dataset_id)
-            df = Engine.data_to_panda(uploaded_file)
+            dataset = Dataset.objects.get(id=dataset_id)
+            df = dataset.get_dataframe(columns=dataset.numeric_features)
 
             features_to_drop = Engine.suggest_feature_dropping(
                 df,
                 correlation_threshold=correlation_threshold,
-                variance_threshold=variance_threshold
+                variance_threshold=variance_threshold,
+                dtype=dtype
             )
 
             return JsonResponse({"features_to_drop": features_to_drop})
 
-        except UploadedFile.DoesNotExist:
+        except Dataset.DoesNotExist:
             return JsonResponse({"error": "Dataset not found3"}, status=404)
         except ValueError as ve:
             return JsonResponse({"error": f"Invalid parameter: {str(ve)}"}, status=400)
@@ -393,22 +535,26 @@ class SuggestFeatureCombiningView(APIView):
             body = json.loads(request.body)
             dataset_id = body.get("dataset_id")
             correlation_threshold = body.get("correlation_threshold", 0.9)
+            top_k = body.get("top_k")  # only the k most correlated pairs, strongest first
+            dtype = correlation.correlation_dtype(body.get("dtype", "float64"))
 
             if not dataset_id:
                 return JsonResponse({"error": "Missing dataset_id"}, status=400)
 
-            # get file
+            # get dataset
             try:
-                data_file = UploadedFile.objects.get(id=dataset_id)
-            except UploadedFile.DoesNotExist:
+                dataset = Dataset.objects.get(id=dataset_id)
+            except Dataset.DoesNotExist:
                 return JsonResponse({"error": "Dataset not found4"}, status=404)
 
-            # read file
-            dataset_df = Engine.data_to_panda(data_file)
+            # read the numeric columns only
+            dataset_df = dataset.get_dataframe(columns=dataset.numeric_features)
 
             feature_combinations = Engine.suggest_feature_combining(
                 dataset_df,
-                correlation_threshold=correlation_threshold
+                correlation_threshold=correlation_threshold,
+                top_k=None if top_k is None else int(top_k),
+                dtype=dtype
             )
 
             return JsonResponse({"feature_combinations": feature_combinations})
@@ -0,0 +1,18 @@
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from backend.api.middleware.compression_middleware import compression_stats
+from backend.server_handler.dataframe_cache import dataframe_cache
+
+
+class StatsView(APIView):
+    """
+    Runtime counters of this server process
+    """
+
+    def get(self, request):
+        return Response({
+            "dataframe_cache": dataframe_cache.stats(),
+            "compression": compression_stats.stats(),
+        }, status=status.HTTP_200_OK)
@@ -1,19 +1,22 @@
+import hashlib
 import os
+import uuid
 from pathlib import Path
 
-import numpy as np
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from django.utils.decorators import method_decorator
 
-from backend.api.models import UploadedFile, Dataset
+from backend.api.models import IngestionJob
+from backend.server_handler.ingestion import create_dataset_from_upload, submit_ingestion_job
 from rest_framework.views import APIView
-import pandas as pd
 
 
 # Define BASE_DIR to point to the project root directory.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
+ASYNC_VALUES = ("1", "true")
+TEMP_SUFFIX = ".part"
 
 class UploadView(APIView):
     """
@@ -33,37 +36,40 @@ class UploadView(APIView):
         file_path = os.path.join(UPLOAD_DIR, file.name)
 
         try:
-            # Saving files to the backend
-            with open(file_path, "wb") as f:
-                for chunk in file.chunks():
-                    f.write(chunk)
-
-            # Parsing CSV / Excel files
+            # Parsing CSV / Excel files chunk by chunk, straight into the column store
             if file.name.lower().endswith(".csv"):
-                df = pd.read_csv(file_path)
                 file_type = "csv"
             elif file.name.lower().endswith(".xlsx"):
-                df = pd.read_excel(file_path)
                 file_type = "xlsx"
             else:
                 return Response({"error": "Only CSV and XLSX files are supported"}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Extract Column Names & Data Records
-            features = list(df.columns)
-            df = df.replace({np.nan: None})
-            records = df.to_dict(orient="records")
+            # Saving files to the backend, hashing the bytes as they arrive
+            digest = hashlib.sha256()
+            temp_path = os.path.join(UPLOAD_DIR, uuid.uuid4().hex + TEMP_SUFFIX)
+            with open(temp_path, "wb") as f:
+                for chunk in file.chunks():
+                    digest.update(chunk)
+                    f.write(chunk)
+            content_hash = digest.hexdigest()
 
-            # Stored in database Dataset
-            dataset = Dataset.objects.create(
-                name=file.name,
-                features=features,
-                records=records
-            )
+            # Large files can be parsed in the background: answer with a job id right away
+            if str(request.query_params.get("async", request.data.get("async", ""))).lower() in ASYNC_VALUES:
+                # Named by content, so a later upload with the same file name cannot overwrite it mid-parse
+                file_path = os.path.join(UPLOAD_DIR, f"{content_hash}.{file_type}")
+                os.replace(temp_path, file_path)
+                job = IngestionJob.objects.create(
+                    name=file.name, file_path=file_path, file_type=file_type,
+                    content_hash=content_hash, bytes_total=os.path.getsize(file_path)
+                )
+                submit_ingestion_job(job)
+                return Response(
+                    {"message": f"File '{file.name}' uploaded, parsing in the background.", "job_id": job.id, "status": job.status},
+                    status=status.HTTP_202_ACCEPTED
+                )
 
-            # Optional: Deposit to UploadedFile record
-            file_instance = UploadedFile.objects.create(
-                file_path=file_path, name=file.name, file_type=file_type
-            )
+            os.replace(temp_path, file_path)
+            dataset = create_dataset_from_upload(file_path, file.name, file_type, content_hash)
 
             return Response(
                 {"message": f"File '{file.name}' uploaded and stored successfully.", "dataset_id": dataset.id, "name": file.name},
@@ -72,4 +78,28 @@ class UploadView(APIView):
 
         except Exception as e:
             print("error:", str(e))
-            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class IngestionJobView(APIView):
+    """
+    Progress of a background upload: bytes parsed, rows ingested and the schema inferred so far
+    """
+
+    def get(self, request, job_id):
+        try:
+            job = IngestionJob.objects.get(id=job_id)
+        except IngestionJob.DoesNotExist:
+            return Response({"error": "Ingestion job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "job_id": job.id,
+            "name": job.name,
+            "status": job.status,
+            "bytes_total": job.bytes_total,
+            "bytes_parsed": job.bytes_parsed,
+            "rows_ingested": job.rows_ingested,
+            "schema": job.schema,
+            "dataset_id": job.dataset_id,
+            "error": job.error or None,
+        }, status=status.HTTP_200_OK)
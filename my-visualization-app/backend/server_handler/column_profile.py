@@ -0,0 +1,291 @@
+import numpy as np
+import pandas as pd
+
+from backend.server_handler.sketches import HyperLogLog, KLLSketch
+
+# Bins kept while streaming (even, so neighbouring bins can be merged pairwise when the range grows);
+# the stored histogram drops the empty bins at both ends and is merged down to at most HISTOGRAM_BINS
+STREAMING_HISTOGRAM_BINS = 256
+HISTOGRAM_BINS = 32
+HISTOGRAM_GROWTH = 2
+# Quantiles kept in the profile, read from the KLL sketch
+PROFILE_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+NUMERIC_KINDS = "biuf"
+DATETIME_KIND = "M"
+NUMERIC_PROFILE = "numeric"
+DATETIME_PROFILE = "datetime"
+OTHER_PROFILE = "other"
+
+
+def _finite(value):
+    # JSON has no NaN / inf
+    return float(value) if value is not None and np.isfinite(value) else None
+
+
+class StreamingHistogram(object):
+    """
+    Equal width histogram over a range that is not known in advance.
+
+    The range starts at the first chunk; when a later value falls outside it, the bin width is
+    doubled (neighbouring bins are merged) until it fits, so the bin count never changes.
+    """
+
+    def __init__(self, bins: int = STREAMING_HISTOGRAM_BINS):
+        self.bins = bins
+        self.low = None
+        self.width = None
+        self.counts = np.zeros(bins, dtype=np.int64)
+
+    def update(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        if self.low is None:
+            self.low = low
+            self.width = (high - low) / self.bins if high > low else 1.0
+            if high == low:
+                # One distinct value so far, centre it in the middle bin
+                self.low = low - self.width * self.bins / 2
+        while low < self.low or high >= self.low + self.width * self.bins:
+            self._grow(downwards=low < self.low)
+
+        self.counts += np.bincount(self._positions(values), minlength=self.bins)
+
+    def remove(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if self.low is None or not len(values):
+            return
+        inside = (values >= self.low) & (values < self.low + self.width * self.bins)
+        self.counts -= np.bincount(self._positions(values[inside]), minlength=self.bins)
+        np.maximum(self.counts, 0, out=self.counts)
+
+    def _positions(self, values: np.ndarray) -> np.ndarray:
+        return np.minimum(((values - self.low) / self.width).astype(np.int64), self.bins - 1)
+
+    def _grow(self, downwards: bool):
+        merged = self.counts.reshape(-1, HISTOGRAM_GROWTH).sum(axis=1)
+        empty = np.zeros(self.bins - len(merged), dtype=np.int64)
+        if downwards:
+            self.low -= self.width * self.bins
+            self.counts = np.concatenate([empty, merged])
+        else:
+            self.counts = np.concatenate([merged, empty])
+        self.width *= HISTOGRAM_GROWTH
+
+    @classmethod
+    def from_dict(cls, histogram: dict):
+        """
+        Resume from a stored histogram, its bins become the streaming bins
+        """
+        counts = np.asarray(histogram["counts"], dtype=np.int64)
+        counts = np.append(counts, np.zeros(len(counts) % HISTOGRAM_GROWTH, dtype=np.int64))
+        restored = cls(bins=len(counts))
+        restored.low = histogram["edges"][0]
+        restored.width = histogram["edges"][1] - histogram["edges"][0]
+        restored.counts = counts
+        return restored
+
+    def to_dict(self, max_bins: int = HISTOGRAM_BINS):
+        if self.low is None or not self.counts.any():
+            return None
+        used = np.flatnonzero(self.counts)
+        counts = self.counts[used[0]:used[-1] + 1]
+        low, width = self.low + used[0] * self.width, self.width
+        while len(counts) > max_bins:
+            counts = np.append(counts, np.zeros(len(counts) % HISTOGRAM_GROWTH, dtype=np.int64))
+            counts = counts.reshape(-1, HISTOGRAM_GROWTH).sum(axis=1)
+            width *= HISTOGRAM_GROWTH
+        return {
+            "edges": (low + width * np.arange(len(counts) + 1)).tolist(),
+            "counts": counts.tolist(),
+        }
+
+
+class ColumnProfiler(object):
+    """
+    Column statistics gathered chunk by chunk in a single pass: counts, min / max,
+    mean and variance (Chan et al. merge of Welford accumulators), a HyperLogLog
+    distinct estimate, a KLL quantile sketch and a streaming histogram.
+
+    A stored profile can be resumed with `from_dict` to add appended rows, or to remove and
+    re-add edited values. The distinct estimate cannot forget removed values, after edits it
+    may be slightly too high; the quantile sketch cannot either and is rebuilt (`refresh`).
+    """
+
+    def __init__(self):
+        self.kind = None
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = StreamingHistogram()
+        self.distinct = HyperLogLog()
+        self.quantiles = KLLSketch()
+        # Set when a removed value was the min or the max, or when the quantiles include removed values, see `refresh`
+        self.range_stale = False
+        self.quantiles_stale = False
+
+    @classmethod
+    def from_dict(cls, profile: dict, registers: np.ndarray, quantiles: np.ndarray = None):
+        """
+        Resume a profile stored by `to_dict`, with the registers of its distinct count sketch
+        and the serialized quantile sketch (numeric columns)
+        """
+        profiler = cls()
+        profiler.kind = profile["kind"]
+        profiler.count = profile["count"]
+        profiler.nulls = profile["nulls"]
+        profiler.distinct = HyperLogLog(registers=np.array(registers, dtype=np.uint8))
+        if quantiles is not None:
+            profiler.quantiles = KLLSketch.from_array(quantiles)
+        if profiler.kind == NUMERIC_PROFILE and profile["mean"] is not None:
+            profiler.mean = profile["mean"]
+            profiler.m2 = profile["m2"] or 0.0
+            profiler.min, profiler.max = profile["min"], profile["max"]
+            if profile["histogram"] is not None:
+                profiler.histogram = StreamingHistogram.from_dict(profile["histogram"])
+        elif profiler.kind == DATETIME_PROFILE and profile["min"] is not None:
+            profiler.min = pd.Timestamp(profile["min"]).to_datetime64()
+            profiler.max = pd.Timestamp(profile["max"]).to_datetime64()
+        return profiler
+
+    @staticmethod
+    def _present(values):
+        """
+        Kind of a chunk and its non-missing values
+        """
+        if isinstance(values, np.ndarray) and values.dtype.kind in NUMERIC_KINDS:
+            data = values.astype(np.float64, copy=False)
+            return NUMERIC_PROFILE, data[~np.isnan(data)]
+        if isinstance(values, np.ndarray) and values.dtype.kind == DATETIME_KIND:
+            return DATETIME_PROFILE, values[~np.isnat(values)]
+        data = pd.Series(values, dtype=object)
+        return OTHER_PROFILE, data[data.notna()].to_numpy()
+
+    def update(self, values):
+        """
+        Add one chunk of the column, a numpy array or a list (JSON line columns)
+        """
+        kind, present = self._present(values)
+
+        # A column whose chunks disagree (e.g. numbers, then text) only keeps the kind independent statistics
+        if self.kind is None:
+            self.kind = kind
+        elif kind != self.kind:
+            self.kind = OTHER_PROFILE
+
+        self.nulls += len(values) - len(present)
+        self.distinct.add(present)
+        if self.kind == NUMERIC_PROFILE:
+            self._update_numeric(present)
+        elif self.kind == DATETIME_PROFILE:
+            self._update_range(present)
+        self.count += len(present)
+
+    def remove(self, values):
+        """
+        Take values back out, e.g. the old values of edited cells
+        """
+        kind, present = self._present(values)
+        if kind != self.kind:
+            self.kind = OTHER_PROFILE
+        self.nulls -= len(values) - len(present)
+        if self.kind == NUMERIC_PROFILE and len(present):
+            # Reverse of the merge in `_update_numeric`
+            rest = self.count - len(present)
+            if rest > 0:
+                chunk_mean = float(present.mean())
+                chunk_m2 = float(((present - chunk_mean) ** 2).sum())
+                rest_mean = (self.count * self.mean - len(present) * chunk_mean) / rest
+                delta = chunk_mean - rest_mean
+                self.m2 = max(0.0, self.m2 - chunk_m2 - delta * delta * rest * len(present) / self.count)
+                self.mean = rest_mean
+            else:
+                self.mean, self.m2 = 0.0, 0.0
+            self.histogram.remove(present)
+            self.quantiles_stale = True
+        if self.kind in (NUMERIC_PROFILE, DATETIME_PROFILE) and len(present) and self.min is not None:
+            self.range_stale = self.range_stale or bool(present.min() <= self.min or present.max() >= self.max)
+        self.count -= len(present)
+
+    @property
+    def stale(self) -> bool:
+        return self.range_stale or self.quantiles_stale
+
+    def refresh(self, values):
+        """
+        Recompute min / max and the quantile sketch from the whole column after `remove`
+        """
+        kind, present = self._present(values)
+        if self.range_stale:
+            self.min = self.max = None
+            if kind == self.kind:
+                self._update_range(present)
+        if self.quantiles_stale:
+            self.quantiles = KLLSketch(self.quantiles.k)
+            if kind == self.kind == NUMERIC_PROFILE:
+                self.quantiles.add(present)
+        self.range_stale = self.quantiles_stale = False
+
+    def _update_range(self, present):
+        if not len(present):
+            return
+        low, high = present.min(), present.max()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def _update_numeric(self, present: np.ndarray):
+        if not len(present):
+            return
+        self._update_range(present)
+        # Merge the chunk's (count, mean, M2) into the running ones
+        chunk_count = len(present)
+        chunk_mean = float(present.mean())
+        chunk_m2 = float(((present - chunk_mean) ** 2).sum())
+        total = self.count + chunk_count
+        delta = chunk_mean - self.mean
+        self.mean += delta * chunk_count / total
+        self.m2 += chunk_m2 + delta * delta * self.count * chunk_count / total
+        self.histogram.update(present)
+        self.quantiles.add(present)
+
+    def to_dict(self) -> dict:
+        numeric = self.kind == NUMERIC_PROFILE and self.count > 0
+        profile = {
+            "kind": self.kind or OTHER_PROFILE,
+            "count": self.count,
+            "nulls": self.nulls,
+            "min": None,
+            "max": None,
+            "mean": _finite(self.mean) if numeric else None,
+            # Sample standard deviation (ddof=1), like pandas
+            "std": _finite(np.sqrt(self.m2 / (self.count - 1))) if numeric and self.count > 1 else None,
+            "m2": _finite(self.m2) if numeric else None,
+            "distinct": min(self.count, int(round(self.distinct.estimate()))),
+            "distinct_error": float(self.distinct.relative_error),
+            "histogram": self.histogram.to_dict() if numeric else None,
+            "quantiles": None,
+            "quantile_error": None,
+        }
+        if numeric and self.quantiles.n:
+            estimates = self.quantiles.quantiles(PROFILE_QUANTILES)
+            profile["quantiles"] = {str(q): _finite(value) for q, value in zip(PROFILE_QUANTILES, estimates)}
+            profile["quantile_error"] = float(self.quantiles.rank_error)
+        if numeric:
+            profile["min"], profile["max"] = _finite(self.min), _finite(self.max)
+        elif self.kind == DATETIME_PROFILE and self.min is not None:
+            profile["min"], profile["max"] = pd.Timestamp(self.min).isoformat(), pd.Timestamp(self.max).isoformat()
+        return profile
+
+
+def profile_values(values) -> dict:
+    """
+    Profile of a whole column given at once
+    """
+    profiler = ColumnProfiler()
+    profiler.update(values)
+    return profiler.to_dict()
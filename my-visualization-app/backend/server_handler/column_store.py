@@ -0,0 +1,720 @@
+import hashlib
+import itertools
+import json
+import os
+import struct
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from backend.server_handler import column_profile, correlation
+
+NUM_ROWS = "num_rows"
+COLUMNS = "columns"
+KEY = "key"
+KIND = "kind"
+DTYPE = "dtype"
+PROFILE = "profile"
+
+NPY_KIND = "npy"
+JSONL_KIND = "jsonl"
+NPY_SUFFIX = ".npy"
+JSONL_SUFFIX = ".jsonl"
+TEMP_SUFFIX = ".tmp"
+ENCODING = "utf-8"
+MMAP_READ_ONLY = "r"
+
+# Streaming writes: fixed .npy header size, and block sizes used to convert or hash written data
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+NPY_HEADER_LENGTH_BYTES = 2
+NPY_HEADER_BYTES = 128
+CONVERT_BLOCK_ROWS = 1_000_000
+DEFAULT_BATCH_ROWS = 50_000
+DIGEST_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Unreferenced files younger than this may belong to a dataset that is still being saved
+GARBAGE_MIN_AGE_SECONDS = 3600
+
+# numpy dtype kinds that are stored as raw typed arrays (bool, int, uint, float, datetime)
+NPY_DTYPE_KINDS = "biufM"
+
+COLUMN_NOT_FOUND_MESSAGE = "Column file not found: {}"
+ROW_COUNT_MISMATCH_MESSAGE = "Column has {} rows but the dataset has {}."
+UNKNOWN_COLUMN_MESSAGE = "Column '{}' not found in dataset"
+
+# Derived files next to a column, named "<key>.<index>.npy" so they are garbage collected with it
+LINE_OFFSETS_INDEX = "offsets"
+DISTINCT_SKETCH = "hll"
+QUANTILE_SKETCH = "kll"
+ASCENDING_INDEX = "asc"
+DESCENDING_INDEX = "desc"
+RANK_INDEX = "rank"
+NEWLINE = ord("\n")
+
+
+def storage_dir() -> str:
+    """
+    Directory holding the column files, created on first use
+    """
+    path = str(settings.DATASET_STORAGE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def column_path(entry: dict) -> str:
+    """
+    Absolute path of the file backing a manifest column entry
+    """
+    suffix = NPY_SUFFIX if entry[KIND] == NPY_KIND else JSONL_SUFFIX
+    return os.path.join(storage_dir(), entry[KEY] + suffix)
+
+
+def empty_manifest() -> dict:
+    return {NUM_ROWS: 0, COLUMNS: {}}
+
+
+def _is_npy_column(series: pd.Series) -> bool:
+    # Extension dtypes (nullable Int64, string, categorical...) and tz-aware datetimes go through JSON lines
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in NPY_DTYPE_KINDS
+
+
+def _json_value(value):
+    # Keep None for missing values, like the old `df.replace({np.nan: None})` records
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _publish(temp_path: str, path: str):
+    # Files are content addressed: if the same column was already stored, keep the existing file
+    if os.path.exists(path):
+        os.remove(temp_path)
+        # Reused now, so collect_garbage must not take it for an old unreferenced file
+        os.utime(path)
+    else:
+        # Publish the file atomically so readers never see a half written column
+        os.replace(temp_path, path)
+
+
+class ColumnWriter(object):
+    """
+    Write one column chunk by chunk, keeping only the current chunk in memory.
+
+    The stored dtype follows the chunks: int chunks followed by float chunks give a float
+    column, and a numeric column that meets a non-numeric chunk becomes a JSON line column.
+    Already written data is converted block by block, never loaded at once.
+    """
+
+    def __init__(self, profiler: column_profile.ColumnProfiler = None):
+        self.kind = None
+        self.dtype = None
+        self.num_rows = 0
+        # Statistics are gathered while writing, so the column is never read again for them.
+        # A resumed profiler (appends) already covers the rows copied from the previous version.
+        self.profiler = profiler or column_profile.ColumnProfiler()
+        self._temp_path = os.path.join(storage_dir(), uuid.uuid4().hex + TEMP_SUFFIX)
+        # The file is opened per write, not kept open: a wide upload would otherwise hold one
+        # descriptor per column for the whole ingestion and run out of them
+        open(self._temp_path, "wb").close()
+
+    @property
+    def dtype_name(self):
+        # Same notation as the DTYPE of manifest entries
+        if self.dtype is None:
+            return None
+        return self.dtype.str if self.kind == NPY_KIND else str(self.dtype)
+
+    def append(self, series: pd.Series, profile: bool = True):
+        if _is_npy_column(series) and self.kind != JSONL_KIND:
+            dtype = series.dtype if self.dtype is None else _promote(self.dtype, series.dtype)
+            if dtype is not None:
+                if self.kind is None:
+                    self._start_npy(dtype)
+                elif dtype != self.dtype:
+                    self._convert_npy(dtype)
+                values = np.ascontiguousarray(series.to_numpy(dtype=self.dtype))
+                self._write(values.tobytes())
+                if profile:
+                    self.profiler.update(values)
+                self.num_rows += len(series)
+                return
+
+        if self.kind == NPY_KIND:
+            self._convert_to_jsonl()
+        self.kind = JSONL_KIND
+        self.dtype = np.dtype(object)
+        values = series.tolist()
+        self._write_json_lines(values)
+        if profile:
+            self.profiler.update(values)
+        self.num_rows += len(series)
+
+    def _start_npy(self, dtype):
+        self.kind = NPY_KIND
+        self.dtype = dtype
+        # Placeholder header, rewritten with the real length in finish()
+        self._write(_npy_header(dtype, 0))
+
+    def _write(self, data: bytes):
+        with open(self._temp_path, "ab") as f:
+            f.write(data)
+
+    def _write_json_lines(self, values):
+        self._write("".join(
+            json.dumps(_json_value(value), default=str) + "\n" for value in values
+        ).encode(ENCODING))
+
+    def _iter_npy_blocks(self):
+        if not self.num_rows:
+            return
+        data = np.memmap(self._temp_path, dtype=self.dtype, mode=MMAP_READ_ONLY, offset=NPY_HEADER_BYTES, shape=(self.num_rows,))
+        for start in range(0, self.num_rows, CONVERT_BLOCK_ROWS):
+            yield data[start:start + CONVERT_BLOCK_ROWS]
+        del data
+
+    def _rewrite(self, write_blocks):
+        # Stream the existing data into a fresh temp file, then swap the files
+        old_path = self._temp_path
+        new_path = os.path.join(storage_dir(), uuid.uuid4().hex + TEMP_SUFFIX)
+        with open(new_path, "wb") as f:
+            write_blocks(f)
+        os.remove(old_path)
+        self._temp_path = new_path
+
+    def _convert_npy(self, dtype):
+        def write_blocks(f):
+            f.write(_npy_header(dtype, 0))
+            for block in self._iter_npy_blocks():
+                f.write(block.astype(dtype).tobytes())
+        self._rewrite(write_blocks)
+        self.dtype = dtype
+
+    def _convert_to_jsonl(self):
+        def write_blocks(f):
+            for block in self._iter_npy_blocks():
+                f.write("".join(
+                    json.dumps(_json_value(value), default=str) + "\n" for value in pd.Series(block).tolist()
+                ).encode(ENCODING))
+        self._rewrite(write_blocks)
+
+    def finish(self) -> dict:
+        """
+        Close the column and publish it under its content digest, returning its manifest entry
+        """
+        if self.kind is None:
+            self._start_npy(np.dtype(np.float64))
+        if self.kind == NPY_KIND:
+            with open(self._temp_path, "r+b") as f:
+                f.write(_npy_header(self.dtype, self.num_rows))
+
+        digest = hashlib.sha1()
+        with open(self._temp_path, "rb") as f:
+            if self.kind == NPY_KIND:
+                digest.update(self.dtype.str.encode(ENCODING))
+                f.seek(NPY_HEADER_BYTES)
+            else:
+                digest.update(JSONL_KIND.encode(ENCODING))
+            for block in iter(lambda: f.read(DIGEST_BLOCK_BYTES), b""):
+                digest.update(block)
+
+        entry = {KEY: digest.hexdigest(), KIND: self.kind, DTYPE: self.dtype_name}
+        _publish(self._temp_path, column_path(entry))
+        return _with_profile(entry, self.profiler)
+
+    def abort(self):
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+class FrameWriter(object):
+    """
+    Write a table chunk by chunk, see `ColumnWriter`
+    """
+
+    def __init__(self):
+        self.features = None
+        self.num_rows = 0
+        self._writers = []
+
+    def append(self, df: pd.DataFrame):
+        if self.features is None:
+            self.features = [str(name) for name in df.columns]
+            self._writers = [ColumnWriter() for _ in self.features]
+        # Columns by position, so duplicated names in a file header cannot mix up columns
+        for position, writer in enumerate(self._writers):
+            writer.append(df.iloc[:, position])
+        self.num_rows += len(df)
+
+    def schema(self) -> dict:
+        """
+        Dtype of every column inferred from the chunks written so far
+        """
+        return {name: writer.dtype_name for name, writer in zip(self.features or [], self._writers)}
+
+    def finish(self) -> dict:
+        return {
+            NUM_ROWS: self.num_rows,
+            COLUMNS: {name: writer.finish() for name, writer in zip(self.features or [], self._writers)},
+        }
+
+    def abort(self):
+        for writer in self._writers:
+            writer.abort()
+
+
+def _promote(stored, incoming):
+    """
+    Common dtype of two numeric chunks, None when they cannot share a typed array (e.g. dates and numbers)
+    """
+    try:
+        dtype = np.result_type(stored, incoming)
+    except TypeError:
+        return None
+    return dtype if dtype.kind in NPY_DTYPE_KINDS else None
+
+
+def _npy_header(dtype: np.dtype, length: int) -> bytes:
+    # Fixed size .npy (format 1.0) header, padded with spaces so it can be rewritten in place
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (dtype.str, length)
+    header = header.ljust(NPY_HEADER_BYTES - len(NPY_MAGIC) - NPY_HEADER_LENGTH_BYTES - 1) + "\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _with_profile(entry: dict, profiler: column_profile.ColumnProfiler) -> dict:
+    # The profile goes in the manifest entry, the distinct count and quantile sketches next to the column file
+    entry[PROFILE] = profiler.to_dict()
+    _write_index(entry, DISTINCT_SKETCH, profiler.distinct.registers)
+    if profiler.kind == column_profile.NUMERIC_PROFILE:
+        _write_index(entry, QUANTILE_SKETCH, profiler.quantiles.to_array())
+    return entry
+
+
+def write_column(series: pd.Series, profiler: column_profile.ColumnProfiler = None) -> dict:
+    """
+    Write one column to the store and return its manifest entry.
+
+    Numeric, boolean and datetime columns are saved as typed .npy arrays, everything else
+    as one JSON value per line. The file name is the digest of the column content, so
+    versions of a dataset share the files of every column they did not change, and
+    column files are never modified once written.
+
+    :param series: pandas.Series, the column
+    :param profiler: ColumnProfiler already covering the values of `series` (incremental updates), optional
+    """
+    if not _is_npy_column(series):
+        writer = ColumnWriter(profiler)
+        writer.append(series, profile=profiler is None)
+        return writer.finish()
+
+    values = np.ascontiguousarray(series.to_numpy())
+    digest = hashlib.sha1()
+    digest.update(values.dtype.str.encode(ENCODING))
+    digest.update(values.reshape(-1).view(np.uint8))
+    entry = {KEY: digest.hexdigest(), KIND: NPY_KIND, DTYPE: values.dtype.str}
+    path = column_path(entry)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        temp_path = path + "." + uuid.uuid4().hex + TEMP_SUFFIX
+        with open(temp_path, "wb") as f:
+            np.save(f, values, allow_pickle=False)
+        _publish(temp_path, path)
+    if profiler is None:
+        profiler = column_profile.ColumnProfiler()
+        profiler.update(values)
+    return _with_profile(entry, profiler)
+
+
+def write_frame(df: pd.DataFrame) -> dict:
+    """
+    Write every column of a DataFrame and return the manifest describing them
+    """
+    return {
+        NUM_ROWS: len(df),
+        COLUMNS: {str(name): write_column(df[name]) for name in df.columns},
+    }
+
+
+def _iter_column_blocks(entry: dict, batch_rows: int):
+    path = column_path(entry)
+    if entry[KIND] == NPY_KIND:
+        data = np.load(path, mmap_mode=MMAP_READ_ONLY, allow_pickle=False)
+        for start in range(0, len(data), batch_rows):
+            yield data[start:start + batch_rows]
+        return
+
+    with open(path, encoding=ENCODING) as f:
+        while True:
+            lines = list(itertools.islice(f, batch_rows))
+            if not lines:
+                return
+            yield json.loads("[" + ",".join(lines) + "]")
+
+
+def iter_batches(manifest: dict, columns: list = None, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """
+    Yield the table as DataFrames of at most `batch_rows` rows, reading every column file sequentially.
+    Memory use depends on `batch_rows`, not on the size of the dataset.
+    """
+    manifest = manifest or empty_manifest()
+    entries = manifest.get(COLUMNS, {})
+    names = list(entries) if columns is None else [name for name in dict.fromkeys(columns) if name in entries]
+    readers = [_iter_column_blocks(entries[name], batch_rows) for name in names]
+
+    num_rows = manifest.get(NUM_ROWS, 0)
+    for start in range(0, num_rows, batch_rows):
+        data = {name: next(reader) for name, reader in zip(names, readers)}
+        index = pd.RangeIndex(start, min(start + batch_rows, num_rows))
+        yield pd.DataFrame(data, columns=names, index=index, copy=False)
+
+
+def replace_columns(manifest: dict, df: pd.DataFrame, profilers: dict = None) -> dict:
+    """
+    Return a new manifest where the columns of `df` are replaced (or added).
+    Every other column keeps pointing at its existing file, nothing else is copied.
+
+    :param profilers: dict, optional {column: ColumnProfiler} already describing the new values
+    """
+    manifest = manifest or empty_manifest()
+    columns = dict(manifest.get(COLUMNS, {}))
+    num_rows = manifest.get(NUM_ROWS, 0) if columns else len(df)
+    if len(df) != num_rows:
+        raise ValueError(ROW_COUNT_MISMATCH_MESSAGE.format(len(df), num_rows))
+
+    for name in df.columns:
+        columns[str(name)] = write_column(df[name], (profilers or {}).get(name))
+    return {NUM_ROWS: num_rows, COLUMNS: columns}
+
+
+def append_rows(manifest: dict, df: pd.DataFrame) -> dict:
+    """
+    Return a new manifest with the rows of `df` added at the end.
+
+    The stored values are copied block by block into the new column files without being
+    parsed or profiled again; the profiles of the previous version are resumed and only
+    the new rows are added to them. Columns missing from `df` get missing values.
+    """
+    manifest = manifest or empty_manifest()
+    entries = manifest.get(COLUMNS, {})
+    unknown = [str(name) for name in df.columns if str(name) not in entries]
+    if unknown:
+        raise ValueError(UNKNOWN_COLUMN_MESSAGE.format(unknown[0]))
+    df = df.rename(columns=str).reindex(columns=list(entries))
+
+    columns = {}
+    for name, entry in entries.items():
+        writer = ColumnWriter(profiler(entry))
+        try:
+            for block in _iter_column_blocks(entry, CONVERT_BLOCK_ROWS):
+                block = pd.Series(block) if isinstance(block, np.ndarray) else pd.Series(block, dtype=object)
+                writer.append(block, profile=False)
+            writer.append(df[name])
+            columns[name] = writer.finish()
+        except Exception:
+            writer.abort()
+            raise
+    return {NUM_ROWS: manifest.get(NUM_ROWS, 0) + len(df), COLUMNS: columns}
+
+
+def update_cells(manifest: dict, column: str, rows: list, values: list) -> dict:
+    """
+    Return a new manifest where the given cells of one column are changed; only that column is rewritten
+    """
+    entries = (manifest or {}).get(COLUMNS, {})
+    if column not in entries:
+        raise ValueError(UNKNOWN_COLUMN_MESSAGE.format(column))
+
+    series = pd.Series(read_column(entries[column]))
+    touched = list(dict.fromkeys(rows))
+    old_values = _profile_values(series.iloc[touched])
+    # Keep the column typed when the new values fit (None becomes NaN / NaT), instead of falling back to objects
+    incoming = _incoming_values(series, values)
+    dtype = _promote(series.dtype, incoming.dtype) if _is_npy_column(series) and _is_npy_column(incoming) else None
+    if dtype is not None:
+        series = series.astype(dtype, copy=False)
+        incoming = incoming.astype(dtype, copy=False)
+    else:
+        series = series.astype(object)
+    series.iloc[rows] = incoming.to_numpy()
+
+    # Only the edited values go through the profile, the rest of the column is not profiled again
+    column_profiler = profiler(entries[column])
+    column_profiler.remove(old_values)
+    column_profiler.update(_profile_values(series.iloc[touched]))
+    if column_profiler.stale:
+        column_profiler.refresh(_profile_values(series))
+    return replace_columns(manifest, pd.DataFrame({column: series}), {column: column_profiler})
+
+
+def _incoming_values(series: pd.Series, values: list) -> pd.Series:
+    # pd.Series([None]) is an object series, which would turn a typed column into JSON lines
+    if not _is_npy_column(series):
+        return pd.Series(values)
+    missing = pd.NaT if series.dtype.kind == "M" else np.nan
+    return pd.Series([missing if value is None else value for value in values])
+
+
+def _profile_values(series: pd.Series):
+    # The values the way the column is stored: an array for typed columns, a list otherwise
+    return series.to_numpy() if _is_npy_column(series) else series.tolist()
+
+
+def read_column(entry: dict, mmap: bool = False):
+    """
+    Load the values of one column, as a numpy array or a list for JSON line columns
+
+    :param entry: dict, manifest entry of the column
+    :param mmap: bool, memory-map .npy columns read-only instead of reading them into memory
+    """
+    path = column_path(entry)
+    if not os.path.exists(path):
+        raise FileNotFoundError(COLUMN_NOT_FOUND_MESSAGE.format(path))
+
+    if entry[KIND] == NPY_KIND:
+        return np.load(path, mmap_mode=MMAP_READ_ONLY if mmap else None, allow_pickle=False)
+
+    with open(path, encoding=ENCODING) as f:
+        # One json.loads call over the whole file is much faster than decoding line by line
+        return json.loads("[" + ",".join(line for line in f if line.strip()) + "]")
+
+
+def read_frame(manifest: dict, columns: list = None, mmap: bool = False) -> pd.DataFrame:
+    """
+    Build a DataFrame from the column files in `manifest`.
+
+    :param manifest: dict, manifest returned by `write_frame`
+    :param columns: list, optional subset of columns to load; unknown names are skipped
+    :param mmap: bool, back numeric columns by read-only memory maps of their files (zero-copy)
+    :return: pandas.DataFrame with the requested columns in the requested order
+    """
+    entries = (manifest or {}).get(COLUMNS, {})
+    names = list(entries) if columns is None else [name for name in dict.fromkeys(columns) if name in entries]
+    data = {name: read_column(entries[name], mmap=mmap) for name in names}
+    # copy=False keeps every column as its own block, so memory maps are not copied into a 2D block
+    return pd.DataFrame(data, columns=names, copy=False)
+
+
+def _index_path(entry: dict, index_name: str) -> str:
+    return os.path.join(storage_dir(), "{}.{}{}".format(entry[KEY], index_name, NPY_SUFFIX))
+
+
+def _load_index(entry: dict, index_name: str, build) -> np.ndarray:
+    """
+    Memory-map a derived index of a column, building and persisting it on first use.
+    Column files never change, so an index stays valid as long as its column exists.
+    """
+    path = _index_path(entry, index_name)
+    if not os.path.exists(path):
+        _write_index(entry, index_name, build())
+    return np.load(path, mmap_mode=MMAP_READ_ONLY, allow_pickle=False)
+
+
+def _write_index(entry: dict, index_name: str, values: np.ndarray):
+    path = _index_path(entry, index_name)
+    temp_path = path + "." + uuid.uuid4().hex + TEMP_SUFFIX
+    with open(temp_path, "wb") as f:
+        np.save(f, values, allow_pickle=False)
+    _publish(temp_path, path)
+
+
+def _build_line_offsets(path: str) -> np.ndarray:
+    # offsets[i] is where line i starts, offsets[-1] the file size
+    offsets = [np.zeros(1, dtype=np.int64)]
+    position = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(DIGEST_BLOCK_BYTES), b""):
+            offsets.append(np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == NEWLINE) + position + 1)
+            position += len(block)
+    return np.concatenate(offsets).astype(np.int64)
+
+
+def line_offsets(entry: dict) -> np.ndarray:
+    """
+    Byte offset of every line of a JSON line column (plus the file size), so any row can be read with one seek
+    """
+    return _load_index(entry, LINE_OFFSETS_INDEX, lambda: _build_line_offsets(column_path(entry)))
+
+
+def _build_sort_index(entry: dict, descending: bool) -> np.ndarray:
+    series = pd.Series(read_column(entry))
+    try:
+        ordered = series.sort_values(ascending=not descending, kind="stable", na_position="last")
+    except TypeError:
+        # Mixed types in a JSON line column, order them by their text
+        text = series.map(lambda value: None if value is None else str(value))
+        ordered = text.sort_values(ascending=not descending, kind="stable", na_position="last")
+    return ordered.index.to_numpy(dtype=np.int64)
+
+
+def sort_index(entry: dict, descending: bool = False) -> np.ndarray:
+    """
+    Row positions of a column in sorted order (stable, missing values last), persisted next to the column
+    """
+    index_name = DESCENDING_INDEX if descending else ASCENDING_INDEX
+    return _load_index(entry, index_name, lambda: _build_sort_index(entry, descending))
+
+
+def rank_index(entry: dict) -> np.ndarray:
+    """
+    Average ranks of a numeric column (NaN where it is missing or infinite), persisted next to the column.
+    Spearman correlations are Pearson correlations of these; an edited column gets a new key, and new ranks.
+    """
+    return _load_index(entry, RANK_INDEX, lambda: correlation.rank_values(read_column(entry)))
+
+
+def read_rows(entry: dict, rows):
+    """
+    Read only some rows of a column
+
+    :param entry: dict, manifest entry of the column
+    :param rows: slice of row positions, or an array of row positions
+    :return: np.ndarray, or a list for JSON line columns
+    """
+    path = column_path(entry)
+    if not os.path.exists(path):
+        raise FileNotFoundError(COLUMN_NOT_FOUND_MESSAGE.format(path))
+
+    if entry[KIND] == NPY_KIND:
+        # Only the pages holding the requested rows are read
+        return np.array(np.load(path, mmap_mode=MMAP_READ_ONLY, allow_pickle=False)[rows])
+
+    offsets = line_offsets(entry)
+    with open(path, "rb") as f:
+        if isinstance(rows, slice):
+            start, stop, _ = rows.indices(len(offsets) - 1)
+            f.seek(offsets[start])
+            lines = f.read(max(0, offsets[stop] - offsets[start])).decode(ENCODING).splitlines()
+        else:
+            lines = []
+            for row in rows:
+                f.seek(offsets[row])
+                lines.append(f.read(offsets[row + 1] - offsets[row]).decode(ENCODING))
+    return json.loads("[" + ",".join(line.strip() for line in lines) + "]")
+
+
+def read_window(manifest: dict, columns: list = None, start: int = 0, stop: int = None,
+                sort_by: str = None, descending: bool = False) -> pd.DataFrame:
+    """
+    Read rows [start, stop) of the table, optionally in the order of one column.
+
+    The cost depends on the size of the window, not on where it starts: typed columns are
+    memory-mapped, JSON line columns are read through their line offsets index and the sort
+    order comes from a persisted index of the sort column.
+
+    :param manifest: dict, manifest returned by `write_frame`
+    :param columns: list, optional subset of columns to read; unknown names are skipped
+    :param start: int, first row of the window
+    :param stop: int, end of the window (exclusive), default: the end of the table
+    :param sort_by: str, optional column to order the rows by
+    :param descending: bool, sort in descending order
+    :return: pandas.DataFrame indexed by the row positions in the stored table
+    """
+    manifest = manifest or empty_manifest()
+    entries = manifest.get(COLUMNS, {})
+    names = list(entries) if columns is None else [name for name in dict.fromkeys(columns) if name in entries]
+    num_rows = manifest.get(NUM_ROWS, 0)
+    start = min(max(0, start), num_rows)
+    stop = num_rows if stop is None else min(max(start, stop), num_rows)
+
+    if sort_by is not None:
+        if sort_by not in entries:
+            raise ValueError(UNKNOWN_COLUMN_MESSAGE.format(sort_by))
+        return read_positions(manifest, names, sort_index(entries[sort_by], descending)[start:stop])
+
+    data = {name: read_rows(entries[name], slice(start, stop)) for name in names}
+    return pd.DataFrame(data, columns=names, index=np.arange(start, stop))
+
+
+def read_positions(manifest: dict, columns: list, positions) -> pd.DataFrame:
+    """
+    Read the rows at the given positions, indexed by position
+    """
+    entries = (manifest or {}).get(COLUMNS, {})
+    names = [name for name in dict.fromkeys(columns) if name in entries]
+    positions = np.asarray(positions, dtype=np.int64)
+    data = {name: read_rows(entries[name], positions) for name in names}
+    return pd.DataFrame(data, columns=names, index=positions)
+
+
+def keep_columns(manifest: dict, names: list) -> dict:
+    """
+    Return a new manifest that only references the given columns
+    """
+    manifest = manifest or empty_manifest()
+    columns = manifest.get(COLUMNS, {})
+    return {
+        NUM_ROWS: manifest.get(NUM_ROWS, 0),
+        COLUMNS: {name: entry for name, entry in columns.items() if name in names},
+    }
+
+
+def profile(entry: dict) -> dict:
+    """
+    Statistics of a column (count, nulls, min, max, mean, std, distinct estimate, histogram).
+
+    They are computed when the column is written and kept in its manifest entry; columns
+    written before profiles existed are profiled here, block by block.
+    """
+    if PROFILE in entry:
+        return entry[PROFILE]
+    return profiler(entry).to_dict()
+
+
+def profiler(entry: dict) -> column_profile.ColumnProfiler:
+    """
+    Resumable profiler of a stored column, to add or remove values without reading the column
+    """
+    sketches = [DISTINCT_SKETCH]
+    if entry.get(PROFILE, {}).get("kind") == column_profile.NUMERIC_PROFILE:
+        sketches.append(QUANTILE_SKETCH)
+    paths = [_index_path(entry, name) for name in sketches]
+    if PROFILE in entry and all(os.path.exists(path) for path in paths):
+        return column_profile.ColumnProfiler.from_dict(
+            entry[PROFILE], *(np.load(path, allow_pickle=False) for path in paths))
+    # Columns written before profiles (or sketches) existed are profiled once, block by block
+    column_profiler = column_profile.ColumnProfiler()
+    for block in _iter_column_blocks(entry, CONVERT_BLOCK_ROWS):
+        column_profiler.update(block)
+    return column_profiler
+
+
+def manifest_exists(manifest: dict) -> bool:
+    """
+    Whether every column file of the manifest is still in the store
+    """
+    return all(os.path.exists(column_path(entry)) for entry in (manifest or {}).get(COLUMNS, {}).values())
+
+
+def manifest_schema(manifest: dict) -> dict:
+    """
+    Stored dtype of every column, e.g. {"age": "<i8", "city": "object"}
+    """
+    return {name: entry[DTYPE] for name, entry in (manifest or {}).get(COLUMNS, {}).items()}
+
+
+def manifest_keys(manifest: dict) -> set:
+    return {entry[KEY] for entry in (manifest or {}).get(COLUMNS, {}).values()}
+
+
+def collect_garbage(referenced_keys: set, min_age_seconds: float = GARBAGE_MIN_AGE_SECONDS) -> int:
+    """
+    Delete column files that no manifest references any more and return how many were removed.
+
+    Files younger than `min_age_seconds` are kept, they may belong to a dataset that is being
+    written right now and is not saved in the database yet.
+    """
+    removed = 0
+    now = time.time()
+    for file_name in os.listdir(storage_dir()):
+        path = os.path.join(storage_dir(), file_name)
+        key = file_name.split(".", 1)[0]
+        if key in referenced_keys or now - os.path.getmtime(path) < min_age_seconds:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from backend.server_handler import column_store
+
+# Four k x k matrices are kept per dataset version, so only the first columns are covered
+COMOMENT_MAX_COLUMNS = 64
+NUMERIC_DTYPE_KINDS = "biuf"
+
+COLUMNS_KEY = "columns"
+KEYS_KEY = "keys"
+N_KEY = "n"
+MEAN_KEY = "mean"
+M2_KEY = "m2"
+C_KEY = "c"
+
+
+def _divide(numerator, denominator):
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=np.float64), where=denominator > 0)
+
+
+class CoMoments(object):
+    """
+    Mergeable pairwise statistics of numeric columns, enough for a Pearson correlation matrix.
+
+    Entry [i, j] of every matrix covers the rows where both column i and column j are present
+    (pairwise complete, like pandas): `n` counts them, `mean[i, j]` and `m2[i, j]` are the mean and
+    the sum of squared deviations of column i over them, `c[i, j]` the co-moment of i and j.
+    Chunks are combined with the pairwise update of Chan et al., and can be taken out again.
+    """
+
+    def __init__(self, columns, n=None, mean=None, m2=None, c=None):
+        self.columns = list(columns)
+        shape = (len(self.columns), len(self.columns))
+        self.n = np.zeros(shape) if n is None else np.asarray(n, dtype=np.float64)
+        self.mean = np.zeros(shape) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(shape) if m2 is None else np.asarray(m2, dtype=np.float64)
+        self.c = np.zeros(shape) if c is None else np.asarray(c, dtype=np.float64)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: list):
+        """
+        Co-moments of the rows of `df`; non-numeric values count as missing
+        """
+        values = np.column_stack([
+            pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan) for name in columns
+        ]) if len(columns) else np.empty((len(df), 0))
+        present = ~np.isnan(values)
+        weights = present.astype(np.float64)
+        # Shift every column by its mean first, the sums below then do not lose precision to large offsets
+        counts = weights.sum(axis=0)
+        shift = _divide(np.where(present, values, 0.0).sum(axis=0), counts)
+        centred = np.where(present, values - shift, 0.0)
+
+        n = weights.T @ weights
+        sums = centred.T @ weights
+        squares = (centred * centred).T @ weights
+        products = centred.T @ centred
+        return cls(
+            columns,
+            n=n,
+            mean=_divide(sums, n) + shift[:, None],
+            m2=squares - _divide(sums * sums, n),
+            c=products - _divide(sums * sums.T, n),
+        )
+
+    def _combine(self, other, sign: int):
+        if other.columns != self.columns:
+            other = other.subset(self.columns)
+        if sign > 0:
+            n = self.n + other.n
+            delta = other.mean - self.mean
+            mean = self.mean + _divide(delta * other.n, n)
+            factor = _divide(self.n * other.n, n)
+            m2 = self.m2 + other.m2 + delta * delta * factor
+            c = self.c + other.c + delta * delta.T * factor
+        else:
+            # Reverse of the merge: what is left once `other` is taken out
+            n = self.n - other.n
+            mean = _divide(self.n * self.mean - other.n * other.mean, n)
+            delta = other.mean - mean
+            factor = _divide(n * other.n, self.n)
+            m2 = np.maximum(self.m2 - other.m2 - delta * delta * factor, 0.0)
+            c = self.c - other.c - delta * delta.T * factor
+        empty = n <= 0
+        return CoMoments(self.columns, n=np.where(empty, 0.0, n), mean=np.where(empty, 0.0, mean),
+                         m2=np.where(empty, 0.0, m2), c=np.where(empty, 0.0, c))
+
+    def merge(self, other: "CoMoments") -> "CoMoments":
+        return self._combine(other, 1)
+
+    def remove(self, other: "CoMoments") -> "CoMoments":
+        return self._combine(other, -1)
+
+    def subset(self, columns: list) -> "CoMoments":
+        positions = [self.columns.index(name) for name in columns]
+        grid = np.ix_(positions, positions)
+        return CoMoments(columns, n=self.n[grid], mean=self.mean[grid], m2=self.m2[grid], c=self.c[grid])
+
+    def correlation(self, columns: list = None) -> pd.DataFrame:
+        """
+        Pearson correlation matrix (NaN where a pair has fewer than two rows or no variance)
+        """
+        moments = self if columns is None else self.subset(columns)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = moments.c / np.sqrt(moments.m2 * moments.m2.T)
+        matrix[moments.n < 2] = np.nan
+        return pd.DataFrame(np.clip(matrix, -1.0, 1.0), index=moments.columns, columns=moments.columns)
+
+    def to_dict(self, manifest: dict) -> dict:
+        """
+        JSON form, tagged with the column files it was computed from
+        """
+        entries = manifest.get(column_store.COLUMNS, {})
+        return {
+            COLUMNS_KEY: self.columns,
+            KEYS_KEY: {name: entries[name][column_store.KEY] for name in self.columns},
+            N_KEY: self.n.tolist(),
+            MEAN_KEY: self.mean.tolist(),
+            M2_KEY: self.m2.tolist(),
+            C_KEY: self.c.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, manifest: dict, columns: list):
+        """
+        Stored co-moments restricted to `columns`, None unless they cover them with the current column files
+        """
+        if not data or not all(name in data[COLUMNS_KEY] for name in columns):
+            return None
+        entries = manifest.get(column_store.COLUMNS, {})
+        for name in columns:
+            if name not in entries or entries[name][column_store.KEY] != data[KEYS_KEY][name]:
+                return None
+        stored = cls(data[COLUMNS_KEY], n=data[N_KEY], mean=data[MEAN_KEY], m2=data[M2_KEY], c=data[C_KEY])
+        return stored if stored.columns == list(columns) else stored.subset(columns)
+
+
+def numeric_columns(manifest: dict, features: list) -> list:
+    """
+    The visible typed numeric columns covered by co-moments
+    """
+    entries = (manifest or {}).get(column_store.COLUMNS, {})
+    columns = [
+        name for name in features
+        if name in entries and entries[name][column_store.KIND] == column_store.NPY_KIND
+        and np.dtype(entries[name][column_store.DTYPE]).kind in NUMERIC_DTYPE_KINDS
+    ]
+    return columns[:COMOMENT_MAX_COLUMNS]
+
+
+def compute(manifest: dict, columns: list, batch_rows: int = column_store.DEFAULT_BATCH_ROWS) -> CoMoments:
+    """
+    Co-moments of a whole table in one streaming pass
+    """
+    moments = CoMoments(columns)
+    for batch in column_store.iter_batches(manifest, columns, batch_rows):
+        moments = moments.merge(CoMoments.from_frame(batch, columns))
+    return moments
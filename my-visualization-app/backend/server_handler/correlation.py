@@ -0,0 +1,270 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Columns per block: the correlations are computed CORRELATION_BLOCK_COLUMNS x CORRELATION_BLOCK_COLUMNS
+# at a time (8 MB of float64), the full matrix of a wide table never exists
+CORRELATION_BLOCK_COLUMNS = 1024
+CORRELATION_DTYPES = {"float64": np.float64, "float32": np.float32}
+INVALID_CORRELATION_DTYPE = "Unsupported correlation dtype: {}. Choose from 'float64' or 'float32'."
+
+
+def worker_count(n_jobs=None) -> int:
+    """
+    Threads for a request's `n_jobs`: one per CPU by default, never more than the CPUs
+    """
+    cpus = os.cpu_count() or 1
+    if n_jobs is None:
+        return cpus
+    return min(max(int(n_jobs), 1), cpus)
+
+
+def correlation_dtype(name: str):
+    if name not in CORRELATION_DTYPES:
+        raise ValueError(INVALID_CORRELATION_DTYPE.format(name))
+    return CORRELATION_DTYPES[name]
+
+
+def _prepare(values: np.ndarray, dtype):
+    """
+    Block of columns ready for the products: without missing values the columns scaled to unit norm
+    around their mean (the correlations are then one matrix product); with missing values the
+    centred columns with zeros for the gaps, their squares and the masks of present values
+    """
+    values = np.asarray(values, dtype=dtype)
+    mask = ~np.isnan(values)
+    if mask.all():
+        centred = values - values.mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return centred / np.sqrt((centred * centred).sum(axis=0)), None
+    # Centring keeps the sums below small, so that the differences of sums lose no precision
+    centred = np.where(mask, values - np.nanmean(values, axis=0), 0).astype(dtype, copy=False)
+    return centred, (centred * centred, mask.astype(dtype))
+
+
+def _block_correlation(first, second) -> np.ndarray:
+    """
+    Pearson correlations between the columns of two prepared blocks, over the rows where both are
+    present (pairwise complete, like pandas)
+    """
+    values_x, missing_x = first
+    values_y, missing_y = second
+    if missing_x is None and missing_y is None:
+        return np.clip(values_x.T @ values_y, -1.0, 1.0)
+    squares_x, mask_x = missing_x if missing_x is not None else (None, np.ones_like(values_x))
+    squares_y, mask_y = missing_y if missing_y is not None else (None, np.ones_like(values_y))
+    # Unit-norm columns are not centred sums, undo the scaling for the pairwise formulas
+    if missing_x is None:
+        values_x, squares_x = _unscaled(values_x)
+    if missing_y is None:
+        values_y, squares_y = _unscaled(values_y)
+
+    count = mask_x.T @ mask_y
+    sum_x = values_x.T @ mask_y
+    sum_y = mask_x.T @ values_y
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = values_x.T @ values_y - sum_x * sum_y / count
+        variance_x = squares_x.T @ mask_y - sum_x * sum_x / count
+        variance_y = mask_x.T @ squares_y - sum_y * sum_y / count
+        return np.clip(covariance / np.sqrt(variance_x * variance_y), -1.0, 1.0)
+
+
+def _unscaled(values: np.ndarray):
+    # A complete block in a product with an incomplete one: its unit-norm columns serve as centred columns
+    values = np.nan_to_num(values)
+    return values, values * values
+
+
+def iter_blocks(data: pd.DataFrame, dtype=np.float64, block_columns: int = CORRELATION_BLOCK_COLUMNS):
+    """
+    Correlation matrix of the columns of `data` by blocks on and above the diagonal
+
+    :return: generator of (int, int, numpy.ndarray), the positions of the first row and column of the
+        block and its correlations; a block on the diagonal is square and symmetric
+    """
+    num_columns = data.shape[1]
+    starts = range(0, num_columns, block_columns)
+    for row_start in starts:
+        first = _prepare(data.iloc[:, row_start:row_start + block_columns].to_numpy(dtype=dtype), dtype)
+        for column_start in starts:
+            if column_start < row_start:
+                continue
+            second = first if column_start == row_start else \
+                _prepare(data.iloc[:, column_start:column_start + block_columns].to_numpy(dtype=dtype), dtype)
+            yield row_start, column_start, _block_correlation(first, second)
+
+
+def correlated_pairs(data: pd.DataFrame, threshold: float, top_k: int = None, dtype=np.float64,
+                     block_columns: int = CORRELATION_BLOCK_COLUMNS):
+    """
+    Pairs of columns whose absolute correlation is above `threshold`
+
+    Only the pairs above the threshold of every block are kept, and with `top_k` only the k
+    strongest seen so far, so memory stays at one block plus the result.
+
+    :param dtype: numpy dtype the products are computed in, float32 halves the memory and time
+        at about 1e-6 precision
+    :return: (numpy.ndarray, numpy.ndarray, numpy.ndarray), positions of the first and second column
+        (first < second) and the correlation; by position, or strongest first with `top_k`
+    """
+    firsts, seconds, correlations = [], [], []
+    for row_start, column_start, block in iter_blocks(data, dtype, block_columns):
+        strong = np.abs(block) > threshold
+        if row_start == column_start:
+            strong = np.triu(strong, k=1)
+        rows, columns = np.nonzero(strong)
+        firsts.append(rows + row_start)
+        seconds.append(columns + column_start)
+        correlations.append(block[rows, columns].astype(np.float64))
+        if top_k is not None:
+            firsts, seconds, correlations = _strongest(firsts, seconds, correlations, top_k)
+
+    first = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.int64)
+    second = np.concatenate(seconds) if seconds else np.empty(0, dtype=np.int64)
+    correlation = np.concatenate(correlations) if correlations else np.empty(0)
+    order = np.argsort(-np.abs(correlation), kind="stable") if top_k is not None else np.lexsort((second, first))
+    return first[order], second[order], correlation[order]
+
+
+def _strongest(firsts, seconds, correlations, top_k: int):
+    first, second, correlation = np.concatenate(firsts), np.concatenate(seconds), np.concatenate(correlations)
+    if len(correlation) > top_k:
+        keep = np.argpartition(-np.abs(correlation), top_k - 1)[:top_k]
+        first, second, correlation = first[keep], second[keep], correlation[keep]
+    return [first], [second], [correlation]
+
+
+def _tie_pairs(codes: np.ndarray) -> int:
+    """
+    Pairs of equal values, given the dense ranks of the values
+    """
+    counts = np.bincount(codes)
+    return int((counts * (counts - 1) // 2).sum())
+
+
+def rank_column(values: np.ndarray, valid: np.ndarray = None):
+    """
+    What every Kendall pair with this column shares, computed once: dense ranks of the values
+    (-1 where missing), the row order by rank over the present rows and the number of tied pairs
+
+    :param valid: numpy.ndarray of bool, rows taking part, default: the non-missing ones
+    :return: tuple (codes, valid, order, ties, complete)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values) if valid is None else valid
+    codes = np.full(len(values), -1, dtype=np.int64)
+    codes[valid] = np.unique(values[valid], return_inverse=True)[1]
+    order = np.argsort(codes, kind="stable")
+    order = order[valid[order]]
+    return codes, valid, order, _tie_pairs(codes[valid]), bool(valid.all())
+
+
+def kendall_pair(first, second) -> float:
+    """
+    Kendall tau-b of two ranked columns (see rank_column) over the rows where both are present,
+    the same value scipy.stats.kendalltau gives
+    """
+    from backend.server_handler.kendall_kernels import count_inversions
+
+    first_codes, _, first_order, first_ties, first_complete = first
+    second_codes, second_valid, _, second_ties, second_complete = second
+    if first_complete and second_complete:
+        order = first_order
+    else:
+        # The first column's order restricted to the rows present in both is still sorted
+        order = first_order[second_valid[first_order]]
+    x = first_codes[order]
+    y = second_codes[order]
+    if not (first_complete and second_complete):
+        first_ties, second_ties = _tie_pairs(x), _tie_pairs(y)
+
+    size = len(x)
+    total = size * (size - 1) // 2
+    if first_ties == total or second_ties == total:
+        return np.nan
+    if first_ties:
+        # Rows tied in the first column are ordered by the second, so they count as neither concordant nor discordant
+        by_both = np.argsort(x * (int(y.max()) + 1) + y, kind="stable")
+        x, y = x[by_both], y[by_both]
+    boundaries = np.flatnonzero(np.r_[True, (x[1:] != x[:-1]) | (y[1:] != y[:-1]), True])
+    runs = np.diff(boundaries)
+    joint_ties = int((runs * (runs - 1) // 2).sum())
+
+    discordant = count_inversions(y)
+    concordant_minus_discordant = total - first_ties - second_ties + joint_ties - 2 * discordant
+    tau = concordant_minus_discordant / np.sqrt(total - first_ties) / np.sqrt(total - second_ties)
+    return min(1.0, max(-1.0, tau))
+
+
+def kendall_tau(x, y) -> float:
+    """
+    Kendall tau-b of two series over the rows where both are present, like Series.corr(method="kendall")
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    if not valid.any():
+        return np.nan
+    return kendall_pair(rank_column(x[valid]), rank_column(y[valid]))
+
+
+def kendall_matrix(data: pd.DataFrame, n_jobs: int = None) -> pd.DataFrame:
+    """
+    Kendall tau-b matrix with the values of DataFrame.corr(method="kendall"), pairwise over the rows
+    where both columns are finite. Every column is ranked and sorted once for all its pairs,
+    the pairs run in a thread pool.
+
+    :param n_jobs: int, threads, default: one per CPU, clamped to the number of CPUs
+    """
+    values = data.to_numpy(dtype=np.float64)
+    num_columns = values.shape[1]
+    columns = [rank_column(values[:, i], np.isfinite(values[:, i])) for i in range(num_columns)]
+    pairs = [(i, j) for i in range(num_columns) for j in range(i + 1, num_columns)]
+
+    matrix = np.full((num_columns, num_columns), np.nan)
+    for i, column in enumerate(columns):
+        if column[1].any():
+            matrix[i, i] = 1.0
+    with ThreadPoolExecutor(max_workers=worker_count(n_jobs)) as pool:
+        for (i, j), tau in zip(pairs, pool.map(lambda pair: kendall_pair(columns[pair[0]], columns[pair[1]]), pairs)):
+            matrix[i, j] = matrix[j, i] = tau
+    return pd.DataFrame(matrix, index=data.columns, columns=data.columns)
+
+
+def rank_values(values) -> np.ndarray:
+    """
+    Average ranks (from 1) of the finite values and NaN elsewhere, the ranks pandas' Spearman correlation uses
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    ranks = np.full(len(values), np.nan)
+    ranks[finite] = pd.Series(values[finite]).rank(method="average").to_numpy(dtype=np.float64)
+    return ranks
+
+
+def spearman_matrix(ranks: pd.DataFrame) -> pd.DataFrame:
+    """
+    Spearman correlation matrix with the values of DataFrame.corr(method="spearman"), from the
+    ranks of the columns (see rank_values): the Pearson correlation of the ranks. Pairs with
+    missing values are re-ranked over the rows both have, re-ranking the ranks orders those
+    rows exactly as re-ranking the values would.
+    """
+    values = ranks.to_numpy(dtype=np.float64)
+    present = ~np.isnan(values)
+    complete = np.flatnonzero(present.all(axis=0))
+    matrix = np.full((values.shape[1], values.shape[1]), np.nan)
+
+    prepared = _prepare(values[:, complete], np.float64)
+    matrix[np.ix_(complete, complete)] = _block_correlation(prepared, prepared)
+    for i in np.flatnonzero(~present.all(axis=0)):
+        for j in range(values.shape[1]):
+            rows = present[:, i] & present[:, j]
+            if rows.any():
+                pair = np.column_stack([rank_values(values[rows, i]), rank_values(values[rows, j])])
+                prepared = _prepare(pair, np.float64)
+                matrix[i, j] = matrix[j, i] = _block_correlation(prepared, prepared)[0, 1]
+    diagonal = np.diag_indices_from(matrix)
+    matrix[diagonal] = np.where(np.isnan(matrix[diagonal]), np.nan, 1.0)
+    return pd.DataFrame(matrix, index=ranks.columns, columns=ranks.columns)
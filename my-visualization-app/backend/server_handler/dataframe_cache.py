@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from django.conf import settings
+
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DATASET_ID_INDEX = 0
+
+
+class DataFrameCache(object):
+    """
+    Process-local LRU cache of decoded DataFrames.
+
+    Keys start with the dataset id and carry the dataset fingerprint, so an edited dataset is
+    never served from a stale entry, even when the edit happened in another process.
+    """
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is None:
+            return getattr(settings, "DATAFRAME_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)
+        return self._max_bytes
+
+    @staticmethod
+    def _frame_size(df: pd.DataFrame) -> int:
+        return int(df.memory_usage(index=True, deep=True).sum())
+
+    def get(self, key):
+        """
+        Return a shallow copy of the cached DataFrame (None on a miss) and mark it most recently used
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers may add or drop columns on their copy without touching the cached frame
+        return entry[0].copy(deep=False)
+
+    def put(self, key, df: pd.DataFrame):
+        size = self._frame_size(df)
+        with self._lock:
+            if size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            self._entries[key] = (df, size)
+            self.current_bytes += size
+
+            # Evict least recently used frames until we are back under budget
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, dataset_id):
+        """
+        Drop every cached frame of a dataset
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[DATASET_ID_INDEX] == dataset_id]:
+                _, size = self._entries.pop(key)
+                self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+dataframe_cache = DataFrameCache()
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+LTTB_METHOD = "lttb"
+MINMAX_METHOD = "minmax"
+DOWNSAMPLING_METHODS = (LTTB_METHOD, MINMAX_METHOD)
+
+# LTTB always keeps the first and the last point, min/max keeps two points per bucket
+LTTB_MIN_POINTS = 3
+MINMAX_MIN_POINTS = 2
+POINTS_PER_MINMAX_BUCKET = 2
+
+INVALID_DOWNSAMPLING_METHOD = "Invalid downsampling method: {}, expected one of " + ", ".join(DOWNSAMPLING_METHODS)
+INVALID_MAX_POINTS = "max_points must be an integer of at least {}"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: from every bucket keep the point forming the largest triangle with the
+    point kept from the previous bucket and the average of the next bucket, which keeps peaks visible.
+
+    :param x: np.ndarray, x values sorted ascending
+    :param y: np.ndarray, y values
+    :param max_points: int, number of points to keep (>= 3)
+    :return: np.ndarray, sorted positions of the kept points
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    # The first and the last point are buckets of their own, the others share n - 2 points
+    bucket_size = (n - 2) / (max_points - 2)
+    previous = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+
+        # Twice the triangle area, the factor does not change the argmax
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Min/max decimation: split the x range into equal count buckets and keep the lowest and the highest point of each
+
+    :param x: np.ndarray, x values sorted ascending
+    :param y: np.ndarray, y values
+    :param max_points: int, number of points to keep (>= 2)
+    :return: np.ndarray, sorted positions of the kept points
+    """
+    n = len(x)
+    if n <= max_points:
+        return np.arange(n)
+
+    buckets = max_points // POINTS_PER_MINMAX_BUCKET
+    bucket_ids = np.arange(n) * buckets // n
+    # Sorting by (bucket, y) puts the minimum first and the maximum last in every bucket
+    order = np.lexsort((y, bucket_ids))
+    starts = np.searchsorted(bucket_ids, np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def downsample(data: pd.DataFrame, x_feature: str, y_feature: str, max_points: int, method: str = LTTB_METHOD) -> pd.DataFrame:
+    """
+    Reduce `data` to at most `max_points` rows for charting, keeping the shape of the y over x curve.
+
+    Rows are ordered by x and rows with a missing or infinite x / y are dropped (they cannot be drawn).
+    When `data` has no more than `max_points` rows it is returned as it is.
+
+    :param data: pandas.DataFrame, the rows to plot
+    :param x_feature: str, the column on the x axis
+    :param y_feature: str, the column on the y axis
+    :param max_points: int, maximum number of rows returned
+    :param method: str, "lttb" (Largest-Triangle-Three-Buckets) or "minmax" (min/max per bucket)
+    :return: pandas.DataFrame, the kept rows (every column of `data`)
+    """
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(INVALID_DOWNSAMPLING_METHOD.format(method))
+    min_points = LTTB_MIN_POINTS if method == LTTB_METHOD else MINMAX_MIN_POINTS
+    try:
+        max_points = int(max_points)
+    except (TypeError, ValueError):
+        raise ValueError(INVALID_MAX_POINTS.format(min_points))
+    if max_points < min_points:
+        raise ValueError(INVALID_MAX_POINTS.format(min_points))
+    if len(data) <= max_points:
+        return data
+
+    x = pd.to_numeric(data[x_feature], errors="coerce").to_numpy(dtype=np.float64)
+    y = pd.to_numeric(data[y_feature], errors="coerce").to_numpy(dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    order = finite[np.argsort(x[finite], kind="stable")]
+
+    select = lttb_indices if method == LTTB_METHOD else minmax_indices
+    kept = select(x[order], y[order], max_points)
+    return data.iloc[order[kept]]
@@ -1,19 +1,18 @@
 import pandas as pd
 import numpy as np
 import os
+import importlib.util
 
-from sklearn.decomposition import PCA
-from sklearn.linear_model import LinearRegression
-from scipy.optimize import curve_fit, OptimizeWarning
-from imblearn.over_sampling import SMOTE,RandomOverSampler
-from sklearn.manifold import TSNE
-from sklearn.feature_selection import VarianceThreshold
-from scipy.interpolate import interp1d, UnivariateSpline
-from itertools import combinations
 from backend.api.models import UploadedFile
-import umap.umap_ as umap
+from backend.server_handler import model_store, knn_index, correlation
 import warnings
 
+# sklearn, scipy, imblearn and umap (numba) take seconds to import, so every method imports what it
+# uses on first use and starting the API does not pay for them (see warmup.py)
+
+# openTSNE is optional, it adds the FFT accelerated t-SNE gradient
+OPEN_TSNE_AVAILABLE = importlib.util.find_spec("openTSNE") is not None
+
 DEFAULT_DIMREDUCTION_FACTOR = 2
 DEFAULT_POINT_NUMBER = 100
 PCA_RECOMMEND_NUMBER = 50
@@ -40,6 +39,31 @@ AUTO = -1
 FEATURE_DROPPING_CORRELATION_THRESHOLD = 0.95
 FEATURE_DROPPING_VARIANCE_THRESHOLD = 0.01
 FEATURE_COMBING_CORRELATION_THRESHOLD = 0.9
+# PCA solver selection: stream the data through IncrementalPCA from this many cells (about 400 MB of float64),
+# use randomized SVD when both dimensions are large and only few components are wanted
+# (a full SVD of a tall but narrow matrix is cheaper than the randomized iterations)
+PCA_INCREMENTAL_MIN_CELLS = 50_000_000
+PCA_RANDOMIZED_MIN_DIMENSION = 500
+PCA_RANDOMIZED_MAX_COMPONENTS_RATIO = 0.8
+PCA_BATCH_ROWS = 50_000
+# Components kept in a stored PCA decomposition, so that asking for a few more later needs no refit
+PCA_MIN_STORED_COMPONENTS = 10
+PCA_MAX_STORED_COMPONENTS = 50
+# t-SNE: inputs are reduced to this many dimensions by PCA first; tables with more than
+# TSNE_LANDMARK_MIN_ROWS rows embed TSNE_DEFAULT_LANDMARKS landmarks and place the rest by their neighbours
+TSNE_PCA_COMPONENTS = 50
+TSNE_DEFAULT_PERPLEXITY = 30.0
+TSNE_MIN_PERPLEXITY = 1.0
+TSNE_PERPLEXITY_ROWS_FACTOR = 3
+TSNE_BARNES_HUT_MAX_COMPONENTS = 3
+TSNE_FFT_MAX_COMPONENTS = 2
+TSNE_FFT_MIN_ROWS = 10_000
+TSNE_LANDMARK_MIN_ROWS = 20_000
+TSNE_DEFAULT_LANDMARKS = 10_000
+TSNE_LANDMARK_STRATA = 10
+TSNE_LANDMARK_NEIGHBORS = 10
+TSNE_INIT_SCALE = 1e-4
+UMAP_DEFAULT_NEIGHBORS = 15
 
 DEFAULT_FILE_NAME = "unknown.csv"
 DEFAULT_ENGINE = "openpyxl"
@@ -54,10 +78,32 @@ CSV_TYPE = "csv"
 XLSX_TYPE = "xlsx"
 
 PCA_METHOD = "pca"
+PCA_SOLVER_AUTO = "auto"
+PCA_SOLVER_FULL = "full"
+PCA_SOLVER_RANDOMIZED = "randomized"
+PCA_SOLVER_INCREMENTAL = "incremental"
+PCA_SOLVERS = (PCA_SOLVER_AUTO, PCA_SOLVER_FULL, PCA_SOLVER_RANDOMIZED, PCA_SOLVER_INCREMENTAL)
+PCA_COMPONENTS = "components"
+PCA_SINGULAR_VALUES = "singular_values"
+PCA_MEAN = "mean"
+PCA_EXPLAINED_VARIANCE = "explained_variance"
+PCA_EXPLAINED_VARIANCE_RATIO = "explained_variance_ratio"
+PCA_SOLVER = "solver"
 TSNE_METHOD = "tsne"
 UMAP_METHOD = "umap"
 TSNE_PERPLEXITY = "perplexity"
+TSNE_GRADIENT_AUTO = "auto"
+TSNE_GRADIENT_BARNES_HUT = "barnes_hut"
+TSNE_GRADIENT_EXACT = "exact"
+TSNE_GRADIENT_FFT = "fft"
+TSNE_GRADIENTS = (TSNE_GRADIENT_AUTO, TSNE_GRADIENT_BARNES_HUT, TSNE_GRADIENT_EXACT, TSNE_GRADIENT_FFT)
 UMAP_N_NEIGHBOR = "n_neighbors"
+UMAP_METRIC = "euclidean"
+UMAP_MODEL = "model"
+UMAP_EMBEDDING = "embedding"
+UMAP_DIGEST = "digest"
+UMAP_FITTED_ROWS = "fitted_rows"
+UMAP_FITTED_DIGEST = "fitted_digest"
 
 PEARSON_METHOD = "pearson"
 SPEARMAN_METHOD = "spearman"
@@ -90,6 +136,9 @@ INVALID_FILE_TYPE = "Unsupported file type: {}"
 ERROR_LOADING_MESSAGE = "Error loading dataset: {}"
 DATASET_NOT_FOUND_MESSAGE = "Dataset with ID {} not found."
 UNSUPPORTED_DIM_REDUCTION_METHOD = "Unsupported dimensionality reduction method: {}"
+UNSUPPORTED_TSNE_GRADIENT = "Unsupported t-SNE gradient method: {}. Choose from 'auto', 'barnes_hut', 'exact' or 'fft'."
+TSNE_FFT_UNAVAILABLE = "The 'fft' t-SNE gradient needs the openTSNE package."
+UNSUPPORTED_PCA_SOLVER = "Unsupported PCA solver: {}. Choose from 'auto', 'full', 'randomized' or 'incremental'."
 INVALID_FEATURES = "Columns '{}' and/or '{}' not found in dataset"
 COLUMN_NAME = "dim{}"
 
@@ -124,48 +173,451 @@ class Engine:
             raise ValueError(ERROR_LOADING_MESSAGE.format(e))
 
     @staticmethod
-    def apply_pca(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR) -> pd.DataFrame:
+    def choose_pca_solver(num_rows: int, num_features: int, n_components: int) -> str:
+        """
+        Pick the PCA solver for a matrix of the given shape
+
+        :return: str, "incremental" when the matrix is too big to decompose in memory, "randomized"
+            when only a few components of a large and wide matrix are wanted, "full" otherwise
+        """
+        if num_rows * num_features >= PCA_INCREMENTAL_MIN_CELLS:
+            return PCA_SOLVER_INCREMENTAL
+        if (min(num_rows, num_features) > PCA_RANDOMIZED_MIN_DIMENSION
+                and n_components < PCA_RANDOMIZED_MAX_COMPONENTS_RATIO * min(num_rows, num_features)):
+            return PCA_SOLVER_RANDOMIZED
+        return PCA_SOLVER_FULL
+
+    @staticmethod
+    def apply_pca(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, solver: str = PCA_SOLVER_AUTO,
+                  model_key: str = None) -> pd.DataFrame:
         """
         Perform PCA downscaling
+
+        :param solver: str, "full", "randomized" (randomized SVD), "incremental" (mini-batches) or "auto"
+        :param model_key: str, optional model_store key of `data`, to reuse the decomposition across calls
+        """
+        return Engine.reduce_pca(data, n_components, solver, model_key)[0]
+
+    @staticmethod
+    def incremental_pca(batches, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, model_key: str = None,
+                        num_rows: int = None) -> pd.DataFrame:
+        """
+        PCA over data that does not fit in memory, see reduce_pca_batches
+        """
+        return Engine.reduce_pca_batches(batches, n_components, model_key, num_rows)[0]
+
+    @staticmethod
+    def reduce_pca(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, solver: str = PCA_SOLVER_AUTO,
+                   model_key: str = None):
+        """
+        PCA of an in-memory DataFrame
+
+        :return: (pandas.DataFrame, dict), the projected data and the PCA summary (see pca_summary)
         """
+        if solver == PCA_SOLVER_AUTO:
+            solver = Engine.choose_pca_solver(*data.shape, n_components)
+        if solver not in PCA_SOLVERS:
+            raise ValueError(UNSUPPORTED_PCA_SOLVER.format(solver))
+        if solver == PCA_SOLVER_INCREMENTAL:
+            return Engine.reduce_pca_batches(
+                lambda: (data.iloc[start:start + PCA_BATCH_ROWS] for start in range(0, len(data), PCA_BATCH_ROWS)),
+                n_components, model_key, len(data)
+            )
         try:
-            pca = PCA(n_components=n_components)
-            transformed_data = pca.fit_transform(data)
+            from sklearn.decomposition import PCA
+
+            def fit(n_fit):
+                pca = PCA(n_components=n_fit, svd_solver=solver, random_state=RANDOM_STATE)
+                return Engine._decomposition(pca.fit(data), solver)
+
+            # A full SVD finds every component anyway, keep them all (up to PCA_MAX_STORED_COMPONENTS)
+            n_keep = min(data.shape) if solver == PCA_SOLVER_FULL else max(n_components, PCA_MIN_STORED_COMPONENTS)
+            decomposition, cached = Engine.pca_decomposition(fit, n_components, min(data.shape), n_keep, model_key)
+            transformed_data = Engine.project_pca(decomposition, data.to_numpy(dtype=np.float64), n_components)
             columns = [COLUMN_NAME.format(i+COLUMN_INDEX) for i in range(n_components)]
-            return pd.DataFrame(transformed_data, columns=columns)
+            return pd.DataFrame(transformed_data, columns=columns), Engine.pca_summary(decomposition, n_components, cached)
         except Exception as e:
             raise ValueError(ERROR_INFORMATION.format(PCA_METHOD,e))
 
     @staticmethod
-    def apply_tsne(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR) -> pd.DataFrame:
+    def reduce_pca_batches(batches, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, model_key: str = None,
+                           num_rows: int = None):
+        """
+        PCA over data that does not fit in memory: one pass to fit IncrementalPCA batch by batch
+        (skipped when the decomposition is stored), a second one to project every batch
+
+        :param batches: callable returning a new iterator of DataFrames (e.g. Dataset.iter_batches)
+        :param num_rows: int, total number of rows of the batches, counted with an extra pass when not given
+        :return: (pandas.DataFrame, dict), the projected data and the PCA summary (see pca_summary)
+        """
+        try:
+            num_features = None
+            for batch in batches():
+                num_features = batch.shape[COLUMN_INDEX]
+                break
+            if num_rows is None:
+                num_rows = sum(len(batch) for batch in batches())
+
+            from sklearn.decomposition import IncrementalPCA
+
+            def fit(n_fit):
+                pca = IncrementalPCA(n_components=n_fit)
+                for values in Engine._fit_batches(batches, n_fit):
+                    pca.partial_fit(values)
+                return Engine._decomposition(pca, PCA_SOLVER_INCREMENTAL)
+
+            n_keep = max(n_components, PCA_MIN_STORED_COMPONENTS)
+            max_components = min(num_rows, num_features or 0)
+            decomposition, cached = Engine.pca_decomposition(fit, n_components, max_components, n_keep, model_key)
+            transformed_data = [Engine.project_pca(decomposition, batch.to_numpy(dtype=np.float64), n_components)
+                                for batch in batches() if len(batch)]
+            columns = [COLUMN_NAME.format(i+COLUMN_INDEX) for i in range(n_components)]
+            reduced = pd.DataFrame(np.concatenate(transformed_data) if transformed_data else np.empty((0, n_components)),
+                                   columns=columns)
+            return reduced, Engine.pca_summary(decomposition, n_components, cached)
+        except Exception as e:
+            raise ValueError(ERROR_INFORMATION.format(PCA_METHOD,e))
+
+    @staticmethod
+    def _fit_batches(batches, min_rows: int):
+        """
+        Arrays of the batches for IncrementalPCA.partial_fit, which needs at least `min_rows` rows per call:
+        short batches are joined with the following ones, and a short tail is merged into the block before it
+        """
+        ready, short = None, None
+        for batch in batches():
+            if not len(batch):
+                continue
+            values = batch.to_numpy(dtype=np.float64)
+            short = values if short is None else np.concatenate([short, values])
+            if len(short) >= min_rows:
+                # Hold the block back until the next one is complete, the tail may still have to join it
+                if ready is not None:
+                    yield ready
+                ready, short = short, None
+        if short is not None:
+            ready = short if ready is None else np.concatenate([ready, short])
+        if ready is not None:
+            yield ready
+
+    @staticmethod
+    def _decomposition(pca, solver: str) -> dict:
+        return {
+            PCA_COMPONENTS: pca.components_,
+            PCA_SINGULAR_VALUES: pca.singular_values_,
+            PCA_MEAN: pca.mean_,
+            PCA_EXPLAINED_VARIANCE: pca.explained_variance_,
+            PCA_EXPLAINED_VARIANCE_RATIO: pca.explained_variance_ratio_,
+            PCA_SOLVER: np.array(solver),
+        }
+
+    @staticmethod
+    def pca_decomposition(fit, n_components: int, max_components: int, n_keep: int, model_key: str = None):
+        """
+        Fitted PCA decomposition with at least `n_components` components.
+
+        The components of a decomposition are ordered, so the first n of a stored fit are the fit for n:
+        a stored decomposition is sliced, and a fit keeps `n_keep` components so that later calls
+        with a few more components need no refit either.
+
+        :param fit: callable, fit(n) returns the decomposition (dict of arrays) with n components
+        :param max_components: int, the most components the data allows (min of rows and columns)
+        :param model_key: str, model_store key of the data, None to always fit
+        :return: (dict, bool), the decomposition and whether it came from the model store
+        """
+        if model_key is not None:
+            stored = model_store.load(model_key)
+            if stored is not None and len(stored[PCA_COMPONENTS]) >= n_components:
+                return stored, True
+        n_fit = max(n_components, min(n_keep, max_components, PCA_MAX_STORED_COMPONENTS))
+        decomposition = fit(n_fit)
+        if model_key is not None:
+            model_store.save(model_key, decomposition)
+        return decomposition, False
+
+    @staticmethod
+    def project_pca(decomposition: dict, data: np.ndarray, n_components: int) -> np.ndarray:
+        """
+        Coordinates of `data` on the first `n_components` components of a decomposition
+        """
+        return (data - decomposition[PCA_MEAN]) @ decomposition[PCA_COMPONENTS][:n_components].T
+
+    @staticmethod
+    def pca_summary(decomposition: dict, n_components: int, cached: bool = False) -> dict:
+        """
+        Solver, explained variance (ratios) and singular values of the first `n_components` components
+        """
+        return {
+            "solver": str(decomposition[PCA_SOLVER]),
+            "cached_model": cached,
+            "explained_variance": decomposition[PCA_EXPLAINED_VARIANCE][:n_components].tolist(),
+            "explained_variance_ratio": decomposition[PCA_EXPLAINED_VARIANCE_RATIO][:n_components].tolist(),
+            "singular_values": decomposition[PCA_SINGULAR_VALUES][:n_components].tolist(),
+        }
+
+    @staticmethod
+    def apply_tsne(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, **options) -> pd.DataFrame:
+        """
+        Perform t-SNE dimensionality reduction, see reduce_tsne for the options
+        """
+        return Engine.reduce_tsne(data, n_components, **options)[0]
+
+    @staticmethod
+    def reduce_tsne(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, perplexity: float = None,
+                    gradient_method: str = TSNE_GRADIENT_AUTO, n_jobs: int = None,
+                    pca_components: int = TSNE_PCA_COMPONENTS, landmarks: int = None, strata=None,
+                    knn_inputs: list = None):
         """
-        Perform t-SNE dimensionality reduction
+        t-SNE that scales to large tables.
+
+        The input is first reduced to `pca_components` dimensions with PCA and the embedding starts
+        from the PCA layout. With landmarks, t-SNE runs on a stratified sample only and every other
+        row is placed at the distance weighted mean of its nearest landmarks (in the reduced input space).
+        The perplexities are computed on the shared neighbour graph of the rows t-SNE runs on (see knn_index).
+
+        :param perplexity: float, default 30, lowered to what the number of rows allows
+        :param gradient_method: str, "barnes_hut", "exact", "fft" (needs openTSNE) or "auto"
+        :param n_jobs: int, threads for the neighbour searches, None for one, -1 for all
+        :param pca_components: int, reduce wider inputs to this many dimensions first, 0 to keep them
+        :param landmarks: int, number of rows t-SNE runs on, 0 for all rows,
+            None for TSNE_DEFAULT_LANDMARKS once the table has more than TSNE_LANDMARK_MIN_ROWS rows
+        :param strata: array-like, optional label per row the landmarks are stratified by,
+            default: deciles of the first principal component
+        :param knn_inputs: list, column file keys of `data` the neighbour graph of all rows is kept under,
+            None to key it by content (a landmark sample is always keyed by content)
+        :return: (pandas.DataFrame, dict), the embedding and the settings that were used
         """
         try:
-            tsne = TSNE(n_components=n_components)
-            transformed_data = tsne.fit_transform(data)
+            values = data.to_numpy(dtype=np.float64)
+            num_rows = len(values)
+            reduced = bool(pca_components) and values.shape[COLUMN_INDEX] > pca_components
+            if reduced:
+                values = Engine.reduce_pca(data, pca_components)[0].to_numpy()
+
+            if landmarks is None:
+                landmarks = TSNE_DEFAULT_LANDMARKS if num_rows > TSNE_LANDMARK_MIN_ROWS else 0
+            sample = Engine.landmark_sample(values, landmarks, strata) if 0 < landmarks < num_rows else None
+            fit_values = values if sample is None else values[sample]
+
+            # t-SNE needs perplexity < number of rows, openTSNE even 3 * perplexity < number of rows
+            perplexity = min(TSNE_DEFAULT_PERPLEXITY if perplexity is None else float(perplexity),
+                             max(TSNE_MIN_PERPLEXITY, (len(fit_values) - 1) / TSNE_PERPLEXITY_ROWS_FACTOR))
+            gradient_method = Engine.choose_tsne_gradient(gradient_method, len(fit_values), n_components)
+
+            graph = None
+            if gradient_method != TSNE_GRADIENT_EXACT:
+                # 3 * perplexity neighbours per row besides the row itself, as both implementations use
+                graph = knn_index.neighbor_graph(
+                    fit_values, min(len(fit_values) - 1, int(TSNE_PERPLEXITY_ROWS_FACTOR * perplexity + 1)) + 1,
+                    inputs=knn_inputs if sample is None else None,
+                    params={"pca_components": pca_components} if reduced else None, n_jobs=n_jobs)
+            embedding = Engine._fit_tsne(fit_values, n_components, perplexity, gradient_method, n_jobs, graph)
+            if sample is not None:
+                embedding = Engine.place_by_neighbors(values, sample, embedding, n_jobs)
+
             columns = [COLUMN_NAME.format(i+COLUMN_INDEX) for i in range(n_components)]
-            return pd.DataFrame(transformed_data, columns=columns)
+            return pd.DataFrame(embedding, columns=columns), {
+                "gradient_method": gradient_method,
+                "perplexity": perplexity,
+                "pca_components": pca_components if reduced else None,
+                "landmarks": None if sample is None else len(sample),
+            }
         except Exception as e:
             raise ValueError(ERROR_INFORMATION.format(TSNE_METHOD,e))
 
     @staticmethod
-    def apply_umap(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR) -> pd.DataFrame:
+    def choose_tsne_gradient(gradient_method: str, num_rows: int, n_components: int) -> str:
+        """
+        Resolve "auto": FFT interpolation for large 1D / 2D embeddings when openTSNE is installed,
+        Barnes-Hut up to 3 dimensions, the exact gradient above
+        """
+        if gradient_method not in TSNE_GRADIENTS:
+            raise ValueError(UNSUPPORTED_TSNE_GRADIENT.format(gradient_method))
+        if gradient_method == TSNE_GRADIENT_FFT and not OPEN_TSNE_AVAILABLE:
+            raise ValueError(TSNE_FFT_UNAVAILABLE)
+        if gradient_method != TSNE_GRADIENT_AUTO:
+            return gradient_method
+        if OPEN_TSNE_AVAILABLE and n_components <= TSNE_FFT_MAX_COMPONENTS and num_rows > TSNE_FFT_MIN_ROWS:
+            return TSNE_GRADIENT_FFT
+        return TSNE_GRADIENT_BARNES_HUT if n_components <= TSNE_BARNES_HUT_MAX_COMPONENTS else TSNE_GRADIENT_EXACT
+
+    @staticmethod
+    def _fit_tsne(values: np.ndarray, n_components: int, perplexity: float, gradient_method: str, n_jobs: int,
+                  graph: dict = None) -> np.ndarray:
+        """
+        t-SNE embedding, on a precomputed neighbour graph (see knn_index.neighbor_graph) unless the gradient is exact
+        """
+        from sklearn.decomposition import PCA
+        from sklearn.manifold import TSNE
+
+        if gradient_method == TSNE_GRADIENT_FFT:
+            import openTSNE
+
+            indices, distances = knn_index.without_self(graph[knn_index.INDICES], graph[knn_index.DISTANCES])
+            affinities = openTSNE.affinity.PerplexityBasedNN(
+                perplexity=perplexity, n_jobs=n_jobs or 1, random_state=RANDOM_STATE,
+                knn_index=openTSNE.nearest_neighbors.PrecomputedNeighbors(indices, distances))
+            tsne = openTSNE.TSNE(n_components=n_components, negative_gradient_method="fft", n_jobs=n_jobs or 1,
+                                 random_state=RANDOM_STATE)
+            return np.asarray(tsne.fit(values, affinities=affinities, initialization="pca"))
+        if gradient_method == TSNE_GRADIENT_EXACT:
+            tsne = TSNE(n_components=n_components, perplexity=perplexity, method=gradient_method, init="pca",
+                        learning_rate="auto", n_jobs=n_jobs, random_state=RANDOM_STATE)
+            return tsne.fit_transform(values)
+        # sklearn refuses the PCA initialisation with precomputed neighbours, it is computed the same way here;
+        # the graph keeps the rows themselves, sklearn drops them like for its own graph
+        init = PCA(n_components=n_components, svd_solver="randomized", random_state=RANDOM_STATE).fit_transform(values)
+        init = (init / np.std(init[:, 0]) * TSNE_INIT_SCALE).astype(np.float32)
+        tsne = TSNE(n_components=n_components, perplexity=perplexity, method=gradient_method, init=init,
+                    metric="precomputed", learning_rate="auto", n_jobs=n_jobs, random_state=RANDOM_STATE)
+        return tsne.fit_transform(knn_index.distance_matrix(graph[knn_index.INDICES], graph[knn_index.DISTANCES]))
+
+    @staticmethod
+    def landmark_sample(values: np.ndarray, num_landmarks: int, strata=None) -> np.ndarray:
+        """
+        Positions of about `num_landmarks` rows, drawn from every stratum in proportion to its size
+        (at least one row per stratum)
+        """
+        num_rows = len(values)
+        if strata is None:
+            from sklearn.decomposition import PCA
+
+            # Without labels, stratify along the direction of largest variance
+            leading = PCA(n_components=1, random_state=RANDOM_STATE).fit_transform(values)[:, 0]
+            strata = pd.qcut(leading, TSNE_LANDMARK_STRATA, labels=False, duplicates="drop")
+        codes, uniques = pd.factorize(np.asarray(strata), use_na_sentinel=True)
+        codes = np.where(codes < 0, len(uniques), codes)  # missing labels form their own stratum
+
+        counts = np.bincount(codes)
+        quota = np.minimum(counts, np.maximum(1, np.round(counts * num_landmarks / num_rows))).astype(np.int64)
+        # Rows grouped by stratum in random order, the first `quota` of every group are taken
+        rng = np.random.default_rng(RANDOM_STATE)
+        order = np.lexsort((rng.random(num_rows), codes))
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        chosen = order[np.arange(num_rows) - starts < np.repeat(quota, counts)]
+        return np.sort(chosen)
+
+    @staticmethod
+    def place_by_neighbors(values: np.ndarray, sample: np.ndarray, embedding: np.ndarray, n_jobs: int = None) -> np.ndarray:
+        """
+        Embed every row: landmarks keep their position, the others get the inverse distance weighted
+        mean position of their TSNE_LANDMARK_NEIGHBORS nearest landmarks
         """
-        Perform UMAP dimensionality reduction
+        placed = np.empty((len(values), embedding.shape[COLUMN_INDEX]))
+        placed[sample] = embedding
+        others = np.setdiff1d(np.arange(len(values)), sample, assume_unique=True)
+        if len(others):
+            from sklearn.neighbors import NearestNeighbors
+
+            neighbors = NearestNeighbors(n_neighbors=min(TSNE_LANDMARK_NEIGHBORS, len(sample)), n_jobs=n_jobs)
+            distances, indices = neighbors.fit(values[sample]).kneighbors(values[others])
+            weights = 1.0 / np.maximum(distances, np.finfo(np.float64).eps)
+            weights /= weights.sum(axis=1, keepdims=True)
+            placed[others] = np.einsum("ij,ijk->ik", weights, embedding[indices])
+        return placed
+
+    @staticmethod
+    def apply_umap(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, **options) -> pd.DataFrame:
+        """
+        Perform UMAP dimensionality reduction, see reduce_umap for the options
+        """
+        return Engine.reduce_umap(data, n_components, **options)[0]
+
+    @staticmethod
+    def reduce_umap(data: pd.DataFrame, n_components: int = DEFAULT_DIMREDUCTION_FACTOR,
+                    n_neighbors: int = UMAP_DEFAULT_NEIGHBORS, model_keys=(), knn_inputs: list = None):
+        """
+        UMAP whose fitted model is kept in the model store.
+
+        A stored model fitted on the same rows, or on the leading rows of `data`, is reused: rows added
+        since are projected with transform() and all other rows keep their embedding. Otherwise the model
+        is fitted on the shared nearest neighbour graph of the rows (see knn_index), which an earlier fit
+        (e.g. with another n_components) or t-SNE may have built already, and saved under the first key.
+
+        :param model_keys: list of str, model_store keys to look for a model under, in order of preference
+            (e.g. the dataset, then its previous version); empty to fit without storing the model
+        :param knn_inputs: list, column file keys of `data` the neighbour graph is kept under, None to key it by content
+        :return: (pandas.DataFrame, dict), the embedding, whether a stored model was used,
+            the number of rows it was fitted on and the number of rows projected with transform()
         """
         try:
-            reducer = umap.UMAP(n_components=n_components)
-            transformed_data = reducer.fit_transform(data)
+            values = data.to_numpy(dtype=np.float64)
+            # Digests of the values as UMAP sees them, a column that became float on an append still matches
+            frame = pd.DataFrame(values, columns=data.columns)
+            digest = model_store.frame_digest(frame) if model_keys else None
+            record, known_rows, found_key = Engine._stored_umap(model_keys, frame, digest)
+
+            transformed_rows = 0
+            if record is None:
+                reducer = Engine._fit_umap(values, n_components, n_neighbors, knn_inputs)
+                embedding = reducer.embedding_
+                record = {UMAP_MODEL: reducer, UMAP_FITTED_ROWS: len(values), UMAP_FITTED_DIGEST: digest}
+            else:
+                embedding = record[UMAP_EMBEDDING][:known_rows]
+                if known_rows < len(values):
+                    new_rows = record[UMAP_MODEL].transform(values[known_rows:])
+                    embedding = np.concatenate([embedding, new_rows])
+                    transformed_rows = len(new_rows)
+
+            if model_keys and (found_key != model_keys[0] or transformed_rows or record[UMAP_DIGEST] != digest):
+                record[UMAP_EMBEDDING] = embedding
+                record[UMAP_DIGEST] = digest
+                model_store.save_object(model_keys[0], record)
+
             columns = [COLUMN_NAME.format(i+COLUMN_INDEX) for i in range(n_components)]
-            return pd.DataFrame(transformed_data, columns=columns)
+            return pd.DataFrame(embedding, columns=columns), {
+                "cached_model": found_key is not None,
+                "fitted_rows": record[UMAP_FITTED_ROWS],
+                "transformed_rows": transformed_rows,
+                "n_neighbors": record[UMAP_MODEL].n_neighbors,
+            }
         except Exception as e:
             raise ValueError(ERROR_INFORMATION.format(UMAP_METHOD,e))
 
     @staticmethod
-    def dimensional_reduction(data: pd.DataFrame, method: str, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, filename=DEFAULT_FILE_NAME) -> pd.DataFrame:
+    def _stored_umap(model_keys, frame: pd.DataFrame, digest: str):
+        """
+        First stored UMAP record that covers `frame` or its leading rows
+
+        :return: (dict, int, str), the record, how many leading rows of `frame` its embedding is valid for
+            and the key it was found under; (None, 0, None) without one
+        """
+        for key in model_keys:
+            record = model_store.load_object(key)
+            if record is None:
+                continue
+            if record[UMAP_DIGEST] == digest:
+                return record, len(frame), key
+            # Rows were appended since the last use of the model, or since it was fitted
+            for rows, row_digest in ((len(record[UMAP_EMBEDDING]), record[UMAP_DIGEST]),
+                                     (record[UMAP_FITTED_ROWS], record[UMAP_FITTED_DIGEST])):
+                if rows < len(frame) and model_store.frame_digest(frame.iloc[:rows]) == row_digest:
+                    return record, rows, key
+        return None, 0, None
+
+    @staticmethod
+    def _fit_umap(values: np.ndarray, n_components: int, n_neighbors: int, knn_inputs: list = None):
+        """
+        UMAP reducer fitted on the shared neighbour graph of `values`
+        """
+        knn = (None, None, None)
+        # Small inputs are embedded from their full distance matrix, UMAP needs no graph for them
+        if len(values) >= knn_index.KNN_APPROXIMATE_MIN_ROWS:
+            # transform() of appended rows queries the NN-descent index of the graph
+            graph = knn_index.neighbor_graph(values, n_neighbors, UMAP_METRIC, knn_inputs, searchable=True)
+            knn = (graph[knn_index.INDICES], graph[knn_index.DISTANCES], graph[knn_index.SEARCH_INDEX])
+        import umap.umap_ as umap
+
+        reducer = umap.UMAP(n_components=n_components, n_neighbors=n_neighbors, metric=UMAP_METRIC, precomputed_knn=knn)
+        return reducer.fit(values)
+
+    @staticmethod
+    def dimensional_reduction(data: pd.DataFrame, method: str, n_components: int = DEFAULT_DIMREDUCTION_FACTOR, filename=DEFAULT_FILE_NAME,
+                              solver: str = PCA_SOLVER_AUTO) -> pd.DataFrame:
         """
         Performs downscaling according to the specified method
+
+        :param solver: str, PCA solver (see apply_pca), ignored by the other methods
         """
         if not isinstance(data, pd.DataFrame):
             raise ValueError(INVALID_INPUT_INFORMATION)
@@ -177,7 +629,7 @@ class Engine:
         
         # Implementation of dimensionality reduction
         if method == PCA_METHOD:
-            return Engine.apply_pca(numeric_data, n_components)
+            return Engine.apply_pca(numeric_data, n_components, solver)
         elif method == TSNE_METHOD:
             return Engine.apply_tsne(numeric_data, n_components)
         elif method == UMAP_METHOD:
@@ -187,8 +639,14 @@ class Engine:
 
     @staticmethod
     def recommend_dim_reduction(dataset_df):
+        return Engine.recommend_dim_reduction_for(dataset_df.shape[COLUMN_INDEX])
+
+    @staticmethod
+    def recommend_dim_reduction_for(num_features: int):
+        """
+        Recommend dimensionality reduction methods and their parameters for a number of features
+        """
         try:
-            num_features = dataset_df.shape[COLUMN_INDEX]
             recommendations = []
             parameters = {}
 
@@ -254,6 +712,8 @@ class Engine:
             
             # Linear interpolation
             if kind == LINEAR_METHOD:
+                from scipy.interpolate import interp1d
+
                 interpolator = interp1d(x, y, kind=LINEAR_METHOD, fill_value=EXTRAPOLATION_PROCESS)
                 y_new = interpolator(x_new)
                 # Check if NaN values were generated during interpolation
@@ -269,6 +729,8 @@ class Engine:
 
             # Spline interpolation
             elif kind == SPLINE_METHOD:
+                from scipy.interpolate import UnivariateSpline
+
                 spline = UnivariateSpline(x, y, k=min(degree, len(x) - LIMIT), s=EXACT_INTERPOLATION_FACTOR)
                 y_new = spline(x_new)
 
@@ -311,6 +773,9 @@ class Engine:
         if x_feature not in data.columns or y_feature not in data.columns:
             raise ValueError(INVALID_FEATURES.format(x_feature,y_feature))
 
+        from sklearn.linear_model import LinearRegression
+        from scipy.interpolate import interp1d
+
         X = data[x_feature].values.reshape(AUTO, SINGLE_COLUMN)  # Extract x values
         y = data[y_feature].values  # Extract y values
         target_x = np.array(target_x)  # Convert to numpy array
@@ -375,6 +840,8 @@ class Engine:
             except ValueError:
                 raise ValueError(INVALID_DEGREE)
 
+            from scipy.optimize import curve_fit, OptimizeWarning
+
             # generate x
             x_fit = np.linspace(np.min(x), np.max(x), DEFAULT_POINT_NUMBER)
 
@@ -451,8 +918,9 @@ class Engine:
             else:
                 X = dataset[[x_feature]].values
                 y = dataset[y_feature].values
+                # One pass over the labels, the number of classes is the length of the counts
                 class_counts = dataset[y_feature].value_counts()
-                num_classes = dataset[y_feature].nunique()
+                num_classes = len(class_counts)
                 if num_classes == 2:
                     min_class = class_counts.idxmin()  # Get min class
                     max_class = class_counts.idxmax()  # Get max class
@@ -466,11 +934,15 @@ class Engine:
                     sampling_strategy = {cls: max(int(count * oversample_factor), count + 1) for cls, count in class_counts.items()}
 
 
+                from imblearn.over_sampling import SMOTE, RandomOverSampler
+
                 #Use SMOTE to oversample.
                 if method == SMOTE_METHOD:
                     min_samples = min(class_counts.values)
                     n_neighbors = max(1, min(5, min_samples - 1))
-                    oversampler = SMOTE(sampling_strategy=sampling_strategy, random_state=RANDOM_STATE, k_neighbors=n_neighbors)
+                    # The neighbours of every class come from the stored graph (the row itself included)
+                    oversampler = SMOTE(sampling_strategy=sampling_strategy, random_state=RANDOM_STATE,
+                                        k_neighbors=knn_index.GraphNeighbors(n_neighbors=n_neighbors + 1))
 
                 #Use random to oversample.
                 elif method == RANDOM_METHOD:
@@ -490,15 +962,17 @@ class Engine:
         except Exception as e:
             raise ValueError(ERROR_INFORMATION.format(OVERSAMPLE_PROCESS,e))
 
-    def suggest_feature_dropping(dataset: pd.DataFrame, correlation_threshold=FEATURE_DROPPING_CORRELATION_THRESHOLD, variance_threshold=FEATURE_DROPPING_VARIANCE_THRESHOLD):
+    def suggest_feature_dropping(dataset: pd.DataFrame, correlation_threshold=FEATURE_DROPPING_CORRELATION_THRESHOLD, variance_threshold=FEATURE_DROPPING_VARIANCE_THRESHOLD,
+                                 dtype=np.float64):
         """
         Identify features to be dropped based on:
         1. Low variance (below `variance_threshold`).
-        2. High correlation (above `correlation_threshold`).
+        2. High correlation (above `correlation_threshold`) with a feature further left.
 
         :param dataset: pandas.DataFrame, input dataset
         :param correlation_threshold: float, threshold for high correlation (default: 0.95)
         :param variance_threshold: float, threshold for low variance (default: 0.01)
+        :param dtype: numpy dtype the correlations are computed in, see correlation.correlated_pairs
         :return: List[str], list of features to drop.
         """
 
@@ -507,52 +981,42 @@ class Engine:
 
         features_to_drop = set()
 
+        from sklearn.feature_selection import VarianceThreshold
+
         # 1. low variance
         selector = VarianceThreshold(threshold=variance_threshold)
         selector.fit(dataset)
         low_variance_features = dataset.columns[~selector.get_support()].tolist()
         features_to_drop.update(low_variance_features)
 
-        # 2. high correlation
-        corr_matrix = dataset.corr().abs() 
-        upper_triangle = corr_matrix.where(np.triu(np.ones(corr_matrix.shape), k=1).astype(bool)) 
-
-        highly_correlated_features = [
-            column for column in upper_triangle.columns if any(upper_triangle[column] > correlation_threshold)
-        ]
-        features_to_drop.update(highly_correlated_features)
+        # 2. high correlation, block by block without the full correlation matrix
+        _, second, _ = correlation.correlated_pairs(dataset, correlation_threshold, dtype=dtype)
+        features_to_drop.update(dataset.columns[np.unique(second)].tolist())
 
         return list(features_to_drop)
         
 
-    def suggest_feature_combining(dataset: pd.DataFrame, correlation_threshold=FEATURE_COMBING_CORRELATION_THRESHOLD):
+    def suggest_feature_combining(dataset: pd.DataFrame, correlation_threshold=FEATURE_COMBING_CORRELATION_THRESHOLD,
+                                  top_k: int = None, dtype=np.float64):
         """
         Suggest feature combinations based on high correlation (correlation > `correlation_threshold`).
 
         :param dataset: pandas.DataFrame, input dataset
         :param correlation_threshold: float, threshold for high correlation (default: 0.9)
+        :param top_k: int, only the k most correlated pairs, strongest first; default: all pairs in column order
+        :param dtype: numpy dtype the correlations are computed in, see correlation.correlated_pairs
         :return: List[dict], suggested feature pairs for combining.
         """
         if not isinstance(dataset, pd.DataFrame):
             raise TypeError(INVALID_INPUT_INFORMATION)
 
-        suggested_combinations = []
-
-        # correlation matrix
-        corr_matrix = dataset.corr().abs()
-    
-        # all feature pairs
-        feature_pairs = combinations(dataset.columns, 2)
-
-        # chose high correlation pairs
-        for feature1, feature2 in feature_pairs:
-            correlation = corr_matrix.loc[feature1, feature2]
-            if correlation > correlation_threshold:
-                suggested_combinations.append({
-                    "features": [feature1, feature2],
-                    "correlation": correlation 
-                })
-        return suggested_combinations
+        # high correlation pairs, block by block without the full correlation matrix
+        first, second, correlations = correlation.correlated_pairs(dataset, correlation_threshold, top_k, dtype)
+        columns = dataset.columns
+        return [
+            {"features": [columns[i], columns[j]], "correlation": abs(float(value))}
+            for i, j, value in zip(first, second, correlations)
+        ]
 
     def compute_correlation(data: pd.DataFrame, feature_1: str, feature_2: str, method=PEARSON_METHOD) -> float:
         """
@@ -571,13 +1035,13 @@ class Engine:
             raise ValueError(INVALID_FEATURES.format(feature_1,feature_2))
 
         if method == PEARSON_METHOD:
-            correlation = data[feature_1].corr(data[feature_2], method=PEARSON_METHOD)
+            coefficient = data[feature_1].corr(data[feature_2], method=PEARSON_METHOD)
         elif method == SPEARMAN_METHOD:
-            correlation = data[feature_1].corr(data[feature_2], method=SPEARMAN_METHOD)
+            coefficient = data[feature_1].corr(data[feature_2], method=SPEARMAN_METHOD)
         elif method == KENDALL_METHOD:
-            correlation = data[feature_1].corr(data[feature_2], method=KENDALL_METHOD)
+            coefficient = correlation.kendall_tau(data[feature_1], data[feature_2])
         else:
             raise ValueError(INVALID_CORRELATION_METHOD_INFORMATION)
 
-        return correlation
+        return coefficient
     
@@ -0,0 +1,192 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from backend.api.models import Dataset, IngestionJob, UploadedFile
+from backend.server_handler import column_store
+from backend.server_handler.column_store import FrameWriter
+
+CSV_TYPE = "csv"
+XLSX_TYPE = "xlsx"
+
+DEFAULT_CHUNK_ROWS = 100_000
+DEFAULT_MAX_CHUNK_BYTES = 64 * 1024 * 1024
+# The first chunk is kept small, it is only used to measure how many bytes a parsed row takes
+PROBE_CHUNK_ROWS = 1_000
+MIN_CHUNK_ROWS = 1
+UNNAMED_COLUMN = "Unnamed: {}"
+DEFAULT_INGESTION_WORKERS = 2
+INGESTION_THREAD_PREFIX = "ingestion"
+
+INVALID_FILE_TYPE = "Unsupported file type: {}"
+JOB_FAILED_MESSAGE = "Ingestion job {} failed: {}"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ChunkSizer(object):
+    """
+    Pick the number of rows of the next chunk so that a parsed chunk stays under `max_chunk_bytes`
+    """
+
+    def __init__(self, chunk_rows=None, max_chunk_bytes=None):
+        self.chunk_rows = chunk_rows or getattr(settings, "UPLOAD_CHUNK_ROWS", DEFAULT_CHUNK_ROWS)
+        self.max_chunk_bytes = max_chunk_bytes or getattr(settings, "UPLOAD_MAX_CHUNK_BYTES", DEFAULT_MAX_CHUNK_BYTES)
+        self.next_rows = min(self.chunk_rows, PROBE_CHUNK_ROWS)
+
+    def update(self, chunk: pd.DataFrame):
+        if len(chunk) == 0:
+            return
+        bytes_per_row = max(1, int(chunk.memory_usage(index=False, deep=True).sum()) // len(chunk))
+        self.next_rows = max(MIN_CHUNK_ROWS, min(self.chunk_rows, self.max_chunk_bytes // bytes_per_row))
+
+
+def iter_csv_chunks(file_path: str, sizer: ChunkSizer):
+    """
+    Yield (chunk, bytes of the file consumed so far)
+    """
+    with open(file_path, "rb") as handle, pd.read_csv(handle, iterator=True) as reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(sizer.next_rows)
+            except StopIteration:
+                return
+            sizer.update(chunk)
+            yield chunk, handle.tell()
+
+
+def iter_xlsx_chunks(file_path: str, sizer: ChunkSizer):
+    """
+    Yield (chunk, None), the position in the compressed workbook says nothing about progress
+    """
+    # read_only mode streams the sheet row by row instead of loading the whole workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [UNNAMED_COLUMN.format(i) if name is None else str(name) for i, name in enumerate(header)]
+
+        batch = []
+        chunks_yielded = 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= sizer.next_rows:
+                chunk = pd.DataFrame(batch, columns=columns)
+                batch = []
+                sizer.update(chunk)
+                chunks_yielded += 1
+                yield chunk, None
+        # Also yield an empty chunk for a header-only sheet, so its columns are known
+        if batch or not chunks_yielded:
+            yield pd.DataFrame(batch, columns=columns), None
+    finally:
+        workbook.close()
+
+
+def iter_chunks(file_path: str, file_type: str, sizer: ChunkSizer):
+    if file_type == CSV_TYPE:
+        return iter_csv_chunks(file_path, sizer)
+    elif file_type == XLSX_TYPE:
+        return iter_xlsx_chunks(file_path, sizer)
+    raise ValueError(INVALID_FILE_TYPE.format(file_type))
+
+
+def ingest_file(file_path: str, file_type: str, chunk_rows: int = None, max_chunk_bytes: int = None, progress=None):
+    """
+    Parse a CSV / Excel file chunk by chunk straight into the column store.
+
+    At most one parsed chunk (bounded by `max_chunk_bytes`, settings.UPLOAD_MAX_CHUNK_BYTES)
+    is held in memory at a time; column dtypes are inferred per chunk and promoted as needed.
+
+    :param file_path: str, path of the uploaded file
+    :param file_type: str, "csv" or "xlsx"
+    :param chunk_rows: int, maximum number of rows per chunk (default: settings.UPLOAD_CHUNK_ROWS)
+    :param max_chunk_bytes: int, memory budget of one parsed chunk
+    :param progress: callable(bytes_parsed, rows_ingested, schema), called after every chunk
+    :return: tuple (features, manifest)
+    """
+    sizer = ChunkSizer(chunk_rows, max_chunk_bytes)
+    writer = FrameWriter()
+    try:
+        for chunk, bytes_parsed in iter_chunks(file_path, file_type, sizer):
+            writer.append(chunk)
+            if progress is not None:
+                progress(bytes_parsed, writer.num_rows, writer.schema())
+        manifest = writer.finish()
+    except Exception:
+        writer.abort()
+        raise
+    return writer.features or [], manifest
+
+
+def create_dataset_from_upload(file_path: str, name: str, file_type: str, content_hash: str, progress=None) -> Dataset:
+    """
+    Create the Dataset (and UploadedFile record) of an uploaded file.
+
+    When the same bytes were uploaded before, their parsed columns are reused instead of parsing again.
+    """
+    previous = UploadedFile.objects.filter(content_hash=content_hash, file_type=file_type).order_by("-id").first()
+    if previous is not None and previous.column_manifest and column_store.manifest_exists(previous.column_manifest):
+        features, manifest = previous.features, previous.column_manifest
+    else:
+        features, manifest = ingest_file(file_path, file_type, progress=progress)
+
+    # Stored in database Dataset
+    dataset = Dataset.objects.create(name=name, features=features, column_manifest=manifest)
+
+    # Deposit to UploadedFile record, later uploads of the same content are matched by its hash
+    UploadedFile.objects.create(
+        file_path=file_path, name=name, file_type=file_type,
+        content_hash=content_hash, features=features, column_manifest=manifest
+    )
+    return dataset
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, "INGESTION_WORKERS", DEFAULT_INGESTION_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=INGESTION_THREAD_PREFIX)
+        return _executor
+
+
+def submit_ingestion_job(job: IngestionJob):
+    """
+    Parse the file of `job` on the background worker pool
+    """
+    _get_executor().submit(run_ingestion_job, job.id)
+
+
+def run_ingestion_job(job_id: int):
+    # Worker threads get their own database connection, make sure it is usable and closed afterwards
+    close_old_connections()
+    try:
+        job = IngestionJob.objects.get(id=job_id)
+        IngestionJob.objects.filter(id=job_id).update(status=IngestionJob.RUNNING, updated_at=timezone.now())
+
+        def progress(bytes_parsed, rows_ingested, schema):
+            IngestionJob.objects.filter(id=job_id).update(
+                bytes_parsed=job.bytes_total if bytes_parsed is None else bytes_parsed,
+                rows_ingested=rows_ingested, schema=schema, updated_at=timezone.now()
+            )
+
+        dataset = create_dataset_from_upload(job.file_path, job.name, job.file_type, job.content_hash, progress=progress)
+        IngestionJob.objects.filter(id=job_id).update(
+            status=IngestionJob.DONE, dataset=dataset, bytes_parsed=job.bytes_total,
+            rows_ingested=dataset.num_rows, schema=column_store.manifest_schema(dataset.column_manifest),
+            updated_at=timezone.now()
+        )
+    except Exception as e:
+        print(JOB_FAILED_MESSAGE.format(job_id, e))
+        IngestionJob.objects.filter(id=job_id).update(status=IngestionJob.FAILED, error=str(e), updated_at=timezone.now())
+    finally:
+        connection.close()
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+from backend.server_handler import model_store
+
+# pynndescent (numba), scipy and sklearn are imported on first use, like in engine.py
+
+KNN_METHOD = "knn"
+DEFAULT_METRIC = "euclidean"
+# From this many rows the graph is built with NN-descent (UMAP switches at the same size), unless the
+# data is narrow enough for an exact tree search; smaller graphs are padded to KNN_MIN_STORED_NEIGHBORS
+# so that a later caller asking for a few more neighbours finds them stored
+KNN_APPROXIMATE_MIN_ROWS = 4096
+KNN_EXACT_MAX_DIMENSION = 10
+KNN_MIN_STORED_NEIGHBORS = 30
+KNN_MAX_CANDIDATES = 60
+KNN_RANDOM_STATE = 42
+
+INDICES = "indices"
+DISTANCES = "distances"
+SEARCH_INDEX = "search_index"
+EXACT = "exact"
+
+
+def graph_key(values: np.ndarray, metric: str = DEFAULT_METRIC, inputs: list = None, params: dict = None) -> str:
+    """
+    model_store key of the neighbour graph of `values`
+
+    :param inputs: list, column file keys the values were read from (dataset version and column set),
+        None to key the graph by the content of `values`
+    :param params: dict, anything else the values depend on, e.g. a PCA reduction applied to the columns
+    """
+    if inputs is None:
+        inputs = [model_store.frame_digest(pd.DataFrame(values))]
+    return model_store.model_key(KNN_METHOD, inputs, {"metric": metric, **(params or {})})
+
+
+def neighbor_graph(values: np.ndarray, n_neighbors: int, metric: str = DEFAULT_METRIC, inputs: list = None,
+                   params: dict = None, searchable: bool = False, n_jobs: int = None) -> dict:
+    """
+    k-nearest-neighbour graph of the rows of `values`, built once and kept in the model store.
+
+    Row i of the indices / distances lists its neighbours by increasing distance, the row itself
+    first (see without_self); a stored graph with more neighbours is cut to `n_neighbors`.
+
+    :param inputs: list, see graph_key
+    :param searchable: bool, the graph must come with an NN-descent index that new rows can be queried
+        against (UMAP transform), an exact graph is rebuilt approximately
+    :return: dict, INDICES, DISTANCES, SEARCH_INDEX (NNDescent or None) and EXACT
+    """
+    n_neighbors = min(n_neighbors, len(values))
+    key = graph_key(values, metric, inputs, params)
+    graph = model_store.load_object(key)
+    if graph is None or graph[INDICES].shape[1] < n_neighbors or (searchable and graph[SEARCH_INDEX] is None):
+        graph = build(values, max(n_neighbors, min(KNN_MIN_STORED_NEIGHBORS, len(values))), metric, searchable, n_jobs)
+        model_store.save_object(key, graph)
+    return {
+        INDICES: graph[INDICES][:, :n_neighbors],
+        DISTANCES: graph[DISTANCES][:, :n_neighbors],
+        SEARCH_INDEX: graph[SEARCH_INDEX],
+        EXACT: graph[EXACT],
+    }
+
+
+def build(values: np.ndarray, n_neighbors: int, metric: str = DEFAULT_METRIC, searchable: bool = False,
+          n_jobs: int = None) -> dict:
+    """
+    Neighbour graph from an exact tree search, or from NN-descent for large and wide data
+    (or when the graph has to be searchable)
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    num_rows, num_features = values.shape
+    if searchable or (num_rows >= KNN_APPROXIMATE_MIN_ROWS and num_features > KNN_EXACT_MAX_DIMENSION):
+        from pynndescent import NNDescent
+
+        # The settings UMAP uses for its own index
+        index = NNDescent(values, n_neighbors=n_neighbors, metric=metric, random_state=KNN_RANDOM_STATE,
+                          n_trees=min(64, 5 + int(round(num_rows ** 0.5 / 20.0))),
+                          n_iters=max(5, int(round(np.log2(num_rows)))),
+                          max_candidates=KNN_MAX_CANDIDATES, n_jobs=n_jobs, compressed=False)
+        indices, distances = index.neighbor_graph
+        return {INDICES: indices, DISTANCES: distances, SEARCH_INDEX: index, EXACT: False}
+    neighbors = NearestNeighbors(n_neighbors=n_neighbors, metric=metric, n_jobs=n_jobs).fit(values)
+    distances, indices = neighbors.kneighbors(values)
+    return {INDICES: indices, DISTANCES: distances, SEARCH_INDEX: None, EXACT: True}
+
+
+def without_self(indices: np.ndarray, distances: np.ndarray):
+    """
+    Drop every row itself from its neighbours (the last neighbour where a duplicate pushed it out),
+    leaving one neighbour less per row
+    """
+    is_self = indices == np.arange(len(indices))[:, None]
+    is_self[~is_self.any(axis=1), -1] = True
+    # Keep the first occurrence only, rows of equal values may list each other twice
+    is_self &= np.cumsum(is_self, axis=1) == 1
+    shape = (len(indices), indices.shape[1] - 1)
+    return indices[~is_self].reshape(shape), distances[~is_self].reshape(shape)
+
+
+def distance_matrix(indices: np.ndarray, distances: np.ndarray, num_columns: int = None):
+    """
+    Sparse n x n matrix of the neighbour distances, the form of a precomputed graph sklearn accepts
+
+    :param num_columns: int, number of rows the neighbours were searched among, default: n
+    :return: scipy.sparse.csr_matrix
+    """
+    from scipy.sparse import csr_matrix
+
+    num_rows, n_neighbors = indices.shape
+    indptr = np.arange(0, num_rows * n_neighbors + 1, n_neighbors)
+    return csr_matrix((distances.ravel(), indices.ravel(), indptr),
+                      shape=(num_rows, num_rows if num_columns is None else num_columns))
+
+
+class GraphNeighbors(object):
+    """
+    NearestNeighbors stand-in (e.g. for SMOTE's k_neighbors) that answers kneighbors() on the data it
+    was fitted on from the stored neighbour graph, and searches like NearestNeighbors for other data
+    """
+    PARAMS = ("n_neighbors", "metric", "n_jobs")
+
+    def __init__(self, n_neighbors=6, metric=DEFAULT_METRIC, n_jobs=None):
+        self.n_neighbors = n_neighbors
+        self.metric = metric
+        self.n_jobs = n_jobs
+
+    # get_params / set_params make it an estimator sklearn.clone can copy
+    def get_params(self, deep=True):
+        return {name: getattr(self, name) for name in self.PARAMS}
+
+    def set_params(self, **params):
+        for name, value in params.items():
+            setattr(self, name, value)
+        return self
+
+    def fit(self, X, y=None):
+        self._fitted = X
+        self._values = np.asarray(X, dtype=np.float64)
+        self._graph = neighbor_graph(self._values, self.n_neighbors, self.metric, n_jobs=self.n_jobs)
+        return self
+
+    def kneighbors(self, X=None, n_neighbors=None, return_distance=True):
+        n_neighbors = n_neighbors or self.n_neighbors
+        if X is None:
+            # Like NearestNeighbors: without query rows, the fitted rows are not their own neighbours
+            indices, distances = without_self(self._graph[INDICES], self._graph[DISTANCES])
+        elif X is self._fitted and n_neighbors <= self._graph[INDICES].shape[1]:
+            indices, distances = self._graph[INDICES], self._graph[DISTANCES]
+        else:
+            from sklearn.neighbors import NearestNeighbors
+
+            neighbors = NearestNeighbors(n_neighbors=n_neighbors, metric=self.metric, n_jobs=self.n_jobs)
+            distances, indices = neighbors.fit(self._values).kneighbors(np.asarray(X, dtype=np.float64))
+        indices, distances = indices[:, :n_neighbors], distances[:, :n_neighbors]
+        return (distances, indices) if return_distance else indices
+
+    def kneighbors_graph(self, X=None, n_neighbors=None, mode="connectivity"):
+        distances, indices = self.kneighbors(X, n_neighbors)
+        if mode == "connectivity":
+            distances = np.ones_like(distances)
+        return distance_matrix(indices, distances, len(self._values))
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+MODEL_SUFFIX = ".npz"
+OBJECT_SUFFIX = ".joblib"
+TEMP_SUFFIX = ".tmp"
+ENCODING = "utf-8"
+# Models are fitted on column files (or posted rows) that never change; a model nobody loaded for this long is deleted
+MODEL_MAX_IDLE_SECONDS = 7 * 24 * 3600
+
+
+def model_dir() -> str:
+    """
+    Directory holding the fitted models, created on first use
+    """
+    path = str(settings.MODEL_STORAGE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def model_key(method: str, inputs: list, params: dict = None) -> str:
+    """
+    Name of a fitted model: the method, what it was fitted on and the parameters that change the fit
+
+    :param inputs: list, column file keys (datasets) or frame digests (posted data), in column order,
+        or dataset ids for models that follow a dataset from version to version
+    """
+    content = json.dumps([method, list(inputs), params or {}], sort_keys=True, default=str)
+    return hashlib.sha1(content.encode(ENCODING)).hexdigest()
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """
+    Content digest of a DataFrame that is not in the column store, e.g. rows posted with a request
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode(ENCODING))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def model_path(key: str, suffix: str = MODEL_SUFFIX) -> str:
+    return os.path.join(model_dir(), key + suffix)
+
+
+def _write(path: str, write):
+    temp_path = path + "." + uuid.uuid4().hex + TEMP_SUFFIX
+    with open(temp_path, "wb") as f:
+        write(f)
+    os.replace(temp_path, path)
+
+
+def save(key: str, arrays: dict):
+    """
+    Store the arrays of a fitted model. A model is only ever replaced by a refit on the same data.
+    """
+    _write(model_path(key), lambda f: np.savez(f, **arrays))
+
+
+def load(key: str):
+    """
+    Arrays of a stored model as a dict, None when there is none
+    """
+    path = model_path(key)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+    except FileNotFoundError:
+        return None
+    # The modification time records the last use, see collect_garbage
+    os.utime(path)
+    return arrays
+
+
+def save_object(key: str, model):
+    """
+    Store a fitted model that is not just arrays, e.g. a UMAP reducer, pickled with joblib
+    """
+    import joblib
+
+    _write(model_path(key, OBJECT_SUFFIX), lambda f: joblib.dump(model, f))
+
+
+def load_object(key: str):
+    """
+    Model stored with save_object, None when there is none
+    """
+    import joblib
+
+    path = model_path(key, OBJECT_SUFFIX)
+    try:
+        with open(path, "rb") as f:
+            model = joblib.load(f)
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return model
+
+
+def collect_garbage(max_idle_seconds: float = MODEL_MAX_IDLE_SECONDS) -> int:
+    """
+    Delete models that were not used for `max_idle_seconds` and return how many were removed.
+    Models of deleted datasets are never loaded again, so they go this way too.
+    """
+    removed = 0
+    now = time.time()
+    for file_name in os.listdir(model_dir()):
+        path = os.path.join(model_dir(), file_name)
+        if now - os.path.getmtime(path) < max_idle_seconds:
+            continue
+        os.remove(path)
+        removed += 1
+    return removed
@@ -0,0 +1,187 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# 2**12 registers: a standard error of 1.04 / sqrt(4096), about 1.6%
+HLL_PRECISION = 12
+HLL_HASH_BITS = 64
+HLL_ERROR_FACTOR = 1.04
+# Below 2.5 * registers the estimate switches to linear counting (Flajolet et al.)
+HLL_SMALL_RANGE_FACTOR = 2.5
+
+# KLL compactor sizes: the top level holds k items, every level below 2/3 of the one above (Karnin, Lang, Liberty)
+KLL_K = 200
+KLL_MIN_CAPACITY = 8
+KLL_CAPACITY_DECAY = 2 / 3
+# Normalized rank error at 99% confidence for a given k, the empirical fit of the Apache DataSketches KLL sketch
+KLL_ERROR_FACTOR = 2.446
+KLL_ERROR_EXPONENT = 0.9433
+KLL_RANDOM_SEED = 0
+# Layout of a serialized KLL sketch: [k, n, number of levels, level sizes..., items...]
+KLL_HEADER_LENGTH = 3
+
+INCOMPATIBLE_SKETCHES = "Cannot merge {} sketches built with different parameters"
+INVALID_QUANTILE = "Quantiles must be between 0 and 1"
+
+
+def hash_values(values) -> np.ndarray:
+    """
+    64-bit hash of every value, the same value always gets the same hash within one dtype
+    """
+    if isinstance(values, np.ndarray) and values.dtype.kind != "O":
+        return pd.util.hash_array(values.view(np.int64) if values.dtype.kind == "M" else values)
+    # Python objects (JSON line columns) are hashed by their JSON text, so 1 and "1" stay different
+    # and lists / dicts can be hashed at all
+    return pd.util.hash_array(np.array([json.dumps(value, sort_keys=True, default=str) for value in values], dtype=object))
+
+
+class HyperLogLog(object):
+    """
+    Distinct count estimate in a fixed amount of memory (one byte per register).
+    Sketches of the same precision merge by taking the register-wise maximum.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: np.ndarray = None):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.num_registers, dtype=np.uint8)
+        self.registers = registers
+
+    @property
+    def relative_error(self) -> float:
+        return HLL_ERROR_FACTOR / np.sqrt(self.num_registers)
+
+    def add(self, values):
+        """
+        Add non-missing values (a numpy array or a list)
+        """
+        if len(values):
+            self.add_hashes(hash_values(values))
+
+    def add_hashes(self, hashes: np.ndarray):
+        hashes = hashes.astype(np.uint64, copy=False)
+        # The first `precision` bits pick the register, the rank is the position of the first 1 in the rest
+        index = (hashes >> np.uint64(HLL_HASH_BITS - self.precision)).astype(np.int64)
+        rest_bits = HLL_HASH_BITS - self.precision
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # frexp gives the exact bit length, `rest` has fewer bits than a float64 mantissa
+        _, bit_length = np.frexp(rest.astype(np.float64))
+        rank = (rest_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        if other.precision != self.precision:
+            raise ValueError(INCOMPATIBLE_SKETCHES.format(type(self).__name__))
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= HLL_SMALL_RANGE_FACTOR * m and zeros:
+            return m * np.log(m / zeros)
+        return float(raw)
+
+
+class KLLSketch(object):
+    """
+    Quantile estimate of numeric values in O(k log(n / k)) memory (Karnin, Lang and Liberty).
+
+    Level h keeps sorted samples that each stand for 2**h values. When a level is over its
+    capacity, every other item of it (from a random start) moves one level up. Any rank
+    is then off by at most `rank_error` * n with 99% confidence; sketches of the same k merge
+    level by level.
+    """
+
+    def __init__(self, k: int = KLL_K, levels: list = None, n: int = 0):
+        self.k = k
+        self.n = n
+        self.levels = [np.empty(0)] if not levels else levels
+        self._rng = np.random.default_rng(KLL_RANDOM_SEED)
+
+    @property
+    def rank_error(self) -> float:
+        return KLL_ERROR_FACTOR / self.k ** KLL_ERROR_EXPONENT
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(KLL_MIN_CAPACITY, int(np.ceil(self.k * KLL_CAPACITY_DECAY ** depth)))
+
+    def add(self, values: np.ndarray):
+        """
+        Add non-missing values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        if other.k != self.k:
+            raise ValueError(INCOMPATIBLE_SKETCHES.format(type(self).__name__))
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        while sum(len(items) for items in self.levels) > sum(self._capacity(h) for h in range(len(self.levels))):
+            level = next(h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h))
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays behind, the others are halved into the next level
+            kept, items = items[:len(items) % 2], items[len(items) % 2:]
+            promoted = items[self._rng.integers(2)::2]
+            self.levels[level] = kept
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantiles(self, fractions) -> np.ndarray:
+        """
+        Estimated values at the given fractions of the data, e.g. [0.25, 0.5, 0.75]; NaN when empty
+        """
+        fractions = np.asarray(fractions, dtype=np.float64)
+        if np.any((fractions < 0) | (fractions > 1)):
+            raise ValueError(INVALID_QUANTILE)
+        if not self.n:
+            return np.full(fractions.shape, np.nan)
+        items, cumulative = self._weighted()
+        positions = np.searchsorted(cumulative, fractions * cumulative[-1], side="left")
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def rank(self, value: float) -> float:
+        """
+        Estimated fraction of the values that are <= `value`
+        """
+        if not self.n:
+            return np.nan
+        items, cumulative = self._weighted()
+        position = np.searchsorted(items, value, side="right")
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def to_array(self) -> np.ndarray:
+        sizes = [len(items) for items in self.levels]
+        header = [self.k, self.n, len(self.levels)] + sizes
+        return np.concatenate([np.asarray(header, dtype=np.float64)] + self.levels)
+
+    @classmethod
+    def from_array(cls, data: np.ndarray):
+        data = np.asarray(data, dtype=np.float64)
+        k, n, num_levels = (int(value) for value in data[:KLL_HEADER_LENGTH])
+        sizes = data[KLL_HEADER_LENGTH:KLL_HEADER_LENGTH + num_levels].astype(np.int64)
+        bounds = KLL_HEADER_LENGTH + num_levels + np.concatenate([[0], np.cumsum(sizes)])
+        return cls(k, levels=[data[start:stop].copy() for start, stop in zip(bounds[:-1], bounds[1:])], n=n)
@@ -0,0 +1,103 @@
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# The analysis libraries engine.py and knn_index.py import on first use, slowest first
+HEAVY_MODULES = (
+    "umap.umap_",
+    "pynndescent",
+    "sklearn.manifold",
+    "sklearn.decomposition",
+    "sklearn.neighbors",
+    "sklearn.linear_model",
+    "sklearn.feature_selection",
+    "scipy.optimize",
+    "scipy.interpolate",
+    "imblearn.over_sampling",
+)
+# Size of the random table the numba kernels of NN-descent and UMAP are compiled on
+WARMUP_ROWS = 200
+WARMUP_FEATURES = 5
+WARMUP_NEIGHBORS = 15
+WARMUP_EPOCHS = 10
+WARMUP_THREAD_NAME = "engine-warmup"
+RUNSERVER_COMMAND = "runserver"
+MANAGE_SCRIPT = "manage.py"
+
+
+def preload():
+    """
+    Import the analysis libraries
+    """
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def compile_kernels():
+    """
+    Run NN-descent, a UMAP fit and a UMAP transform on a tiny table, so that numba compiles their
+    kernels now instead of during the first request (compiled kernels are not cached on disk)
+    """
+    import umap.umap_ as umap
+    from backend.server_handler import knn_index
+
+    values = np.random.default_rng(0).normal(size=(WARMUP_ROWS, WARMUP_FEATURES))
+    graph = knn_index.build(values, WARMUP_NEIGHBORS, searchable=True)
+    reducer = umap.UMAP(n_neighbors=WARMUP_NEIGHBORS, n_epochs=WARMUP_EPOCHS, precomputed_knn=(
+        graph[knn_index.INDICES], graph[knn_index.DISTANCES], graph[knn_index.SEARCH_INDEX]))
+    reducer.fit(values)
+    reducer.transform(values[:WARMUP_NEIGHBORS])
+
+
+def warm_up():
+    start = time.perf_counter()
+    try:
+        preload()
+        compile_kernels()
+    except Exception:
+        # Only a head start, the requests import and compile whatever is missing themselves
+        logger.exception("Engine warm-up failed")
+        return
+    logger.info("Engine warm-up done in %.1f s", time.perf_counter() - start)
+
+
+def is_server_process(argv=None) -> bool:
+    """
+    Whether this process serves requests: a WSGI / ASGI worker or the serving child of runserver,
+    not another management command (and not the runserver process that only watches for file changes)
+    """
+    argv = sys.argv if argv is None else argv
+    if not argv or os.path.basename(argv[0]) != MANAGE_SCRIPT:
+        return True
+    if len(argv) < 2 or argv[1] != RUNSERVER_COMMAND:
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv
+
+
+def launch_numba_threads():
+    """
+    Start numba's thread pool from the calling thread. A pool first started from another thread
+    (TBB layer) keeps the interpreter from exiting, which would also stop runserver from reloading.
+    """
+    try:
+        from numba.np.ufunc.parallel import _launch_threads
+    except ImportError:
+        return
+    _launch_threads()
+
+
+def start():
+    """
+    Warm up in a background thread, the process serves requests meanwhile. Call from the main thread.
+    """
+    launch_numba_threads()
+    thread = threading.Thread(target=warm_up, name=WARMUP_THREAD_NAME, daemon=True)
+    thread.start()
+    return thread
@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
+    # Compresses the finished response, so it sits above everything that produces or edits the body
+    "backend.api.middleware.compression_middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -89,6 +91,35 @@ DATABASES = {
     }
 }
 
+# Column files backing Dataset (one typed file per column, see server_handler/column_store.py)
+DATASET_STORAGE_DIR = BASE_DIR / 'dataset_storage'
+
+# Fitted models (e.g. PCA decompositions) reused while the columns they were fitted on do not change
+MODEL_STORAGE_DIR = BASE_DIR / 'model_storage'
+
+# Memory budget of the per-process cache of decoded dataset DataFrames
+DATAFRAME_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Uploads are parsed in chunks of at most UPLOAD_CHUNK_ROWS rows and UPLOAD_MAX_CHUNK_BYTES of parsed data
+UPLOAD_CHUNK_ROWS = 100_000
+UPLOAD_MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+# Rows per batch when streaming a dataset export
+EXPORT_BATCH_ROWS = 50_000
+
+# Threads parsing uploads posted with async=true
+INGESTION_WORKERS = 2
+
+# Responses smaller than this are not worth compressing (gzip, plus zstd / brotli when installed)
+COMPRESSION_MIN_BYTES = 1024
+
+# Import the analysis libraries and compile UMAP's numba kernels in a background thread when a server
+# process starts, instead of during the first request that needs them
+ENGINE_WARMUP = False
+
+# Seconds importing the API (views and URLs) may take in a fresh process, see manage.py check_import_time
+API_IMPORT_BUDGET_SECONDS = 1.0
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {